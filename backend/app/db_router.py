@@ -0,0 +1,176 @@
+import random
+import sqlite3
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Read replicas for safe-method requests.
+#
+# REPLICA_DATABASES names DATABASES aliases holding copies of default (see
+# POSTGRES_REPLICA_HOSTS and SQLITE_REPLICA_PATHS in settings).
+# ReplicaMiddleware picks one at random for each GET, HEAD or OPTIONS request
+# and ReadReplicaRouter sends that request's reads to it. Everything else
+# uses default: writes, reads in other requests, reads inside a transaction,
+# code outside a request (job worker, management commands), the bodies of
+# streaming responses, and the jobs app, whose rows the worker changes
+# behind the client's back. A safe request that writes (e.g. a portfolio
+# built on first read) reads from default from then on, so it sees the write
+# and does not compute what it writes from lagging data.
+#
+# Replicas lag behind default. A client that has just written reads from
+# default for REPLICA_STICKY_SECONDS so it sees its own writes: every
+# response to an unsafe request carries the pin's expiry in a db_pin cookie
+# and an X-DB-Pin header, and a request sending either back before then is
+# not routed to a replica. The frontend calls the API cross-origin without
+# credentials, so it relies on the header: settings expose and allow it
+# through CORS and frontend/lib/api.js sends it back. app.response_cache likewise does not store a
+# response read from a replica that soon after the resource last changed.
+
+PIN_COOKIE = 'db_pin'
+PIN_HEADER = 'X-DB-Pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_ONLY_APPS = frozenset({'jobs'})
+
+
+
+class _Route:
+    """
+    The replica of one request, or None. Mutable so that a write switching
+    the request to default is seen by the context the middleware set it in,
+    not only by a copy of it (sync_to_async runs code in a copied context).
+    """
+    __slots__ = ('alias',)
+
+    def __init__(self, alias):
+        self.alias = alias
+
+
+_route = ContextVar('replica_route', default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'REPLICA_DATABASES', ()))
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+def current_replica():
+    """The replica this request reads from, or None when it reads from default."""
+    route = _route.get()
+    return None if route is None else route.alias
+
+
+def use_replica(alias):
+    """Route reads in the current context to alias (None for default); returns the ContextVar token."""
+    return _route.set(_Route(alias))
+
+
+def pinned(request, now=None):
+    """Whether the request carries an unexpired pin to default (cookie or header)."""
+    now = time.time() if now is None else now
+    for value in (request.headers.get(PIN_HEADER), request.COOKIES.get(PIN_COOKIE)):
+        try:
+            expires = float(value)
+        except (TypeError, ValueError):
+            continue
+        # Ignore pins further out than one window, which we never hand out
+        if now < expires <= now + sticky_seconds() + 1:
+            return True
+    return False
+
+
+def pin(response, now=None):
+    """Pin the client to default for the next REPLICA_STICKY_SECONDS."""
+    seconds = sticky_seconds()
+    expires = f'{(time.time() if now is None else now) + seconds:.3f}'
+    response[PIN_HEADER] = expires
+    response.set_cookie(PIN_COOKIE, expires, max_age=seconds, httponly=True, samesite='Lax')
+    return response
+
+
+class ReplicaMiddleware:
+    """Route the reads of safe, unpinned requests to a replica; pin clients after writes."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _route(self, request):
+        if request.method in SAFE_METHODS and not pinned(request):
+            return use_replica(random.choice(replica_aliases()))
+        return use_replica(None)
+
+    def _finish(self, request, response):
+        if request.method not in SAFE_METHODS:
+            pin(response)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._route(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        token = self._route(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _route.reset(token)
+        return self._finish(request, response)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = current_replica()
+        if alias is None or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS  # read what the transaction is about to write
+        return alias
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is not None:
+            route.alias = None  # read this request's own writes
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # the same rows, wherever they were read from
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
+
+
+def copy_to_sqlite_replicas():
+    """
+    Stand-in for replication with SQLite: copy default over each replica
+    file with the online backup API. Returns the aliases copied to.
+    """
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    copied = []
+    for alias in replica_aliases():
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            source.connection.backup(target)
+        finally:
+            target.close()
+        copied.append(alias)
+    return copied
@@ -0,0 +1,151 @@
+import datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from app.profiling import serializing
+
+
+# Read-only fast path for many=True list responses.
+#
+# ValuesRepresentation reads rows with QuerySet.values() and formats each
+# column with a formatter picked once per field, rather than running every
+# field of a ModelSerializer for every instance. Properties are computed for
+# the whole page by the serializer's `computed_values`:
+#
+#     computed_values = {
+#         'full_name': (('first_name', 'last_name'), lambda rows: [...]),
+#     }
+#
+# mapping a field to the columns it needs and a function from the rows to
+# one value per row. The output matches serializer.data exactly (see the
+# parity tests); serializers with fields it cannot handle (nested or
+# method fields, dotted sources) are left on the regular path.
+
+
+def _decimal_formatter(field):
+    coerce = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce or field.localize or field.decimal_places is None:
+        return field.to_representation
+    exponent = -field.decimal_places
+
+    def format_decimal(value):
+        # Column values already carry the field's decimal places
+        if value.as_tuple().exponent == exponent:
+            return '{:f}'.format(value)
+        return field.to_representation(value)
+    return format_decimal
+
+
+def _datetime_formatter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    utc_output = (
+        output_format is not None and output_format.lower() == ISO_8601
+        and not hasattr(field, 'timezone') and timezone.get_current_timezone_name() == 'UTC'
+    )
+    if not utc_output:
+        return field.to_representation
+
+    def format_datetime(value):
+        if value.tzinfo is not datetime.timezone.utc:
+            return field.to_representation(value)
+        return value.isoformat()[:-6] + 'Z'
+    return format_datetime
+
+
+def _formatter(field):
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_formatter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_formatter(field)
+    if isinstance(field, (serializers.CharField, serializers.IntegerField)):
+        return field.to_representation
+    if isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None:
+        return None  # values() already returns the pk
+    if isinstance(field, (serializers.RelatedField, serializers.Serializer, serializers.ListSerializer,
+                          serializers.SerializerMethodField)):
+        raise LookupError(field.field_name)
+    return field.to_representation
+
+
+class ValuesRepresentation:
+    def __init__(self, serializer):
+        model = serializer.Meta.model
+        computed = getattr(serializer, 'computed_values', {})
+        self.columns = []
+        self.plan = []  # (output name, column or None, formatter)
+        self.computed = []  # (output name, function)
+        for field in serializer._readable_fields:
+            if field.source in computed:
+                depends_on, function = computed[field.source]
+                self.columns.extend(depends_on)
+                self.computed.append((field.field_name, function))
+                self.plan.append((field.field_name, None, _formatter(field)))
+                continue
+            if '.' in field.source or field.source == '*':
+                raise LookupError(field.field_name)
+            model_field = model._meta.get_field(field.source)
+            if not model_field.concrete or model_field.many_to_many:
+                raise LookupError(field.field_name)
+            self.columns.append(field.source)
+            self.plan.append((field.field_name, field.source, _formatter(field)))
+        self.columns = list(dict.fromkeys(self.columns))
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        """The representation for a serializer instance, or None if it needs the regular path."""
+        try:
+            return cls(serializer)
+        except (LookupError, FieldDoesNotExist):
+            return None
+
+    def values(self, queryset, *extra_columns):
+        return queryset.values(*dict.fromkeys([*self.columns, *extra_columns]))
+
+    def represent(self, rows):
+        with serializing():
+            rows = list(rows)
+            computed = {name: function(rows) for name, function in self.computed}
+            data = []
+            for index, row in enumerate(rows):
+                item = {}
+                for name, column, formatter in self.plan:
+                    value = computed[name][index] if column is None else row[column]
+                    item[name] = value if value is None or formatter is None else formatter(value)
+                data.append(item)
+        return data
+
+
+def values_list_data(serializer, queryset):
+    """serializer.data for many=True over queryset, through .values() when possible."""
+    representation = ValuesRepresentation.for_serializer(serializer)
+    if representation is None:
+        return type(serializer)(queryset, many=True, context=serializer.context).data
+    return representation.represent(representation.values(queryset))
+
+
+class ValuesListMixin:
+    """
+    ViewSet mixin serving list() through ValuesRepresentation. Falls back to
+    the regular list() when the (projected) serializer needs it.
+    """
+
+    def list(self, request, *args, **kwargs):
+        representation = ValuesRepresentation.for_serializer(self.get_serializer())
+        if representation is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Cursor pagination reads its position from the row's ordering column
+        ordering = getattr(self.paginator, 'get_ordering', None)
+        ordering = ordering(request, queryset, self) if ordering else ()
+        rows = representation.values(queryset, *(name.lstrip('-') for name in ordering))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(representation.represent(page))
+        return Response(representation.represent(rows))
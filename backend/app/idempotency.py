@@ -0,0 +1,146 @@
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# Idempotency-Key support for POST endpoints that create rows.
+#
+# The first request with a key claims it with cache.add(), runs the view and
+# stores a compact (fingerprint, status, data) entry for IDEMPOTENCY_KEY_TTL
+# seconds; the cache's own expiry and culling do the eviction. Retries get
+# the stored response back without touching the database. A retry that
+# arrives while the first request is still running waits for it, up to
+# IDEMPOTENCY_LOCK_TIMEOUT seconds.
+#
+# The claim is only as good as add(): atomic within a process in locmem and
+# across processes in redis, but the file backend checks and then writes,
+# so two processes can both claim a key. Several worker processes need redis.
+#
+# The pending claim lasts as long as its request: it is renewed every third
+# of IDEMPOTENCY_LOCK_TIMEOUT while the view runs and replaced or deleted
+# when it returns, so a slow request is never run twice. If the process
+# dies, the claim expires IDEMPOTENCY_LOCK_TIMEOUT later and a retry takes over.
+
+CACHE_ALIAS = 'idempotency'
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def clear():
+    _cache().clear()
+
+
+def _fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], cls=JSONEncoder, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+
+def _wait_for(key, timeout):
+    """The finished entry for key, or None if it is still pending after timeout."""
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+    while True:
+        entry = _cache().get(key)
+        if entry is None or entry[1] is not None:
+            return entry
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+
+@contextmanager
+def _renewed(key, lock_timeout):
+    """Keep the pending claim on key from expiring while the block runs."""
+    cache = _cache()  # caches[] is per thread; renew through this thread's connection
+    done = threading.Event()
+
+    def renew():
+        while not done.wait(lock_timeout / 3):
+            cache.touch(key, lock_timeout)
+
+    renewer = threading.Thread(target=renew, name=f'renew {key}', daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        done.set()
+        renewer.join()
+
+
+def _replay(entry):
+    _, status_code, data = entry
+    response = Response(data, status=status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """
+    Honour an Idempotency-Key header on a viewset action. Responses below 500
+    are stored and replayed; errors release the key so the client can retry.
+    Requests without the header are not affected.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            idempotency_key = request.headers.get(HEADER)
+            if idempotency_key is None:
+                return view(self, request, *args, **kwargs)
+            if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)
+            lock_timeout = getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 30)
+            digest = hashlib.blake2b(f'{request.path}\n{idempotency_key}'.encode(), digest_size=16).hexdigest()
+            key = f'idem:{scope}:{digest}'
+            fingerprint = _fingerprint(request)
+
+            while not _cache().add(key, (fingerprint, None, None), lock_timeout):
+                entry = _wait_for(key, lock_timeout)
+                if entry is None:
+                    if _cache().get(key) is None:
+                        continue  # released or expired meanwhile; try to claim it
+                    return Response(
+                        {'error': f'A request with this {HEADER} is still in progress'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                if entry[0] != fingerprint:
+                    return Response(
+                        {'error': f'{HEADER} was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                return _replay(entry)
+
+            try:
+                with _renewed(key, lock_timeout):
+                    response = view(self, request, *args, **kwargs)
+            except BaseException:
+                _cache().delete(key)
+                raise
+            if response.status_code >= 500 or not hasattr(response, 'data'):
+                _cache().delete(key)
+            else:
+                _cache().set(key, (fingerprint, response.status_code, response.data), ttl)
+            return response
+        return wrapper
+    return decorator
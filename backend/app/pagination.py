@@ -0,0 +1,30 @@
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (-created_at, -id), newest first as in the models'
+    Meta.ordering. Both keys descend, so each page is a backward range scan
+    of the (created_at, id) index with no sort, and latency does not grow
+    with table size.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class TieBreakingOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that ends every ordering with id, in the direction of its
+    first field. CursorPagination takes its ordering from this filter, and
+    without a unique last key, rows sharing a value (a rate grid inserted at
+    one created_at, equal monthly payments) have no fixed order across pages.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or ())
+        if ordering and not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
@@ -0,0 +1,23 @@
+import codecs
+import csv
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class CSVParser(BaseParser):
+    """Parses a text/csv request body into a list of dicts keyed by the header row."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            return read_csv_rows(stream, encoding)
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ParseError(f'CSV parse error - {exc}')
+
+
+def read_csv_rows(stream, encoding='utf-8'):
+    reader = csv.DictReader(codecs.iterdecode(stream, encoding))
+    return [dict(row) for row in reader]
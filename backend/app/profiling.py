@@ -0,0 +1,276 @@
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework import serializers
+
+
+# Opt-in request instrumentation (REQUEST_PROFILING=True).
+#
+# ProfilingMiddleware records, per resolved route and method, the wall time,
+# SQL query count and time (through a connection execute wrapper), time spent
+# producing serializer .data or app.fast_lists rows, and response size. The
+# histograms are plain cumulative Prometheus histograms kept in process
+# memory; render() formats them for GET /api/_metrics, and
+# rate()/histogram_quantile() on the Prometheus side give the rolling windows.
+#
+# With DEBUG on, ?_profile=1 runs a single request under cProfile and
+# returns the pstats report instead of the response (?_profile=raw returns
+# the binary dump for snakeviz / pstats.Stats).
+#
+# The middleware runs natively under ASGI too. There the ORM runs in the
+# thread sync_to_async hands it, not in the request's, so the SQL wrapper is
+# installed on that thread's connections and finds the request's timings
+# through a ContextVar, which sync_to_async copies over.
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+METRICS = (
+    # name, help, buckets, RequestTimings attribute
+    ('api_request_duration_seconds', 'Wall time of the request', SECONDS_BUCKETS, 'wall'),
+    ('api_request_sql_queries', 'SQL queries executed per request', QUERY_COUNT_BUCKETS, 'sql_count'),
+    ('api_request_sql_duration_seconds', 'Time spent in SQL per request', SECONDS_BUCKETS, 'sql_time'),
+    ('api_request_serializer_duration_seconds', 'Time spent in serializer .data per request',
+     SECONDS_BUCKETS, 'serializer_time'),
+    ('api_response_size_bytes', 'Response body size (streaming responses excluded)', SIZE_BUCKETS, 'size'),
+)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, timings):
+        with self._lock:
+            for name, _, buckets, attribute in METRICS:
+                value = getattr(timings, attribute)
+                if value is None:
+                    continue
+                histogram = self._histograms.get((name, route, method))
+                if histogram is None:
+                    histogram = self._histograms[(name, route, method)] = Histogram(buckets)
+                histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """All histograms in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, help_text, buckets, _ in METRICS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, route, method), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    labels = f'route="{_escape(route)}",method="{method}"'
+                    cumulative = 0
+                    for bound, count in zip((*buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+class RequestTimings:
+    def __init__(self):
+        self.wall = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.size = None
+        self._serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.sql_count += 1
+
+
+_current = ContextVar('request_timings', default=None)
+
+
+def _record_sql(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+def _install_sql_timing():
+    """Wrap the calling thread's connections with _record_sql, once each."""
+    for connection in connections.all():
+        if _record_sql not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_record_sql)
+
+
+@contextmanager
+def serializing():
+    """
+    Count the enclosed block as serializer time of the profiled request.
+    Only the outermost block is timed; SQL run inside it (lazy querysets)
+    is counted as SQL as well.
+    """
+    timings = _current.get()
+    if timings is None or timings._serializer_depth:
+        yield
+        return
+    timings._serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serializer_time += time.perf_counter() - start
+        timings._serializer_depth -= 1
+
+
+def _timed_data(data_property):
+    def data(self):
+        with serializing():
+            return data_property.fget(self)
+    data._request_timing = True
+    return property(data)
+
+
+def _install_serializer_timing():
+    base = serializers.BaseSerializer
+    if not getattr(base.data.fget, '_request_timing', False):
+        base.data = _timed_data(base.data)
+
+
+def route_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+class ProfilingMiddleware:
+    """
+    Records RequestTimings for each request into the metrics registry.
+    Disabled unless settings.REQUEST_PROFILING is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        _install_serializer_timing()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if settings.DEBUG and request.GET.get('_profile'):
+            return self.profile(request)
+
+        _install_sql_timing()
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings.wall = time.perf_counter() - start
+            _current.reset(token)
+        return self._record(request, response, timings)
+
+    async def __acall__(self, request):
+        if settings.DEBUG and request.GET.get('_profile'):
+            return await self.aprofile(request)
+
+        await sync_to_async(_install_sql_timing)()
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings.wall = time.perf_counter() - start
+            _current.reset(token)
+        return self._record(request, response, timings)
+
+    def _record(self, request, response, timings):
+        if route_label(request) == 'api-metrics':
+            return response
+        if not response.streaming:
+            timings.size = len(response.content)
+        registry.observe(route_label(request), request.method, timings)
+        return response
+
+    def profile(self, request):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            self.get_response(request)
+        finally:
+            profiler.disable()
+        return self._profile_response(request, profiler)
+
+    async def aprofile(self, request):
+        # cProfile follows one thread: this covers the event loop, not the
+        # sync code the request hands to sync_to_async
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.get_response(request)
+        finally:
+            profiler.disable()
+        return self._profile_response(request, profiler)
+
+    def _profile_response(self, request, profiler):
+        if request.GET['_profile'] == 'raw':
+            profiler.create_stats()
+            response = HttpResponse(marshal.dumps(profiler.stats), content_type='application/octet-stream')
+            response['Content-Disposition'] = 'attachment; filename="request.prof"'
+            return response
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(60)
+        return HttpResponse(report.getvalue(), content_type='text/plain; charset=utf-8')
+
+
+def metrics_response():
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
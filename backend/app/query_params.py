@@ -0,0 +1,36 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+
+TRUE_VALUES = {'true', '1', 'yes'}
+FALSE_VALUES = {'false', '0', 'no'}
+RANGE_LOOKUPS = ('gte', 'gt', 'lte', 'lt')
+
+
+def boolean_param(request, name):
+    """Read ?name=true|false from the query string; None when absent."""
+    value = request.query_params.get(name)
+    if value is None or value == '':
+        return None
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValidationError({name: ['Must be true or false.']})
+
+
+def range_filter(request, queryset, fields):
+    """Apply ?<field>__gte/__gt/__lte/__lt for the given numeric fields."""
+    for name in fields:
+        field = queryset.model._meta.get_field(name)
+        for lookup in RANGE_LOOKUPS:
+            param = f'{name}__{lookup}'
+            raw = request.query_params.get(param)
+            if raw is None:
+                continue
+            try:
+                value = field.to_python(raw)
+            except DjangoValidationError:
+                raise ValidationError({param: ['A valid number is required.']})
+            queryset = queryset.filter(**{param: value})
+    return queryset
@@ -0,0 +1,37 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional; JSONRenderer's json.dumps is used instead
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed. The bytes
+    are the same as JSONRenderer's compact output except for floats: orjson
+    writes non-zero magnitudes below 1e-4 without an exponent (0.00001, not
+    1e-05; the same value once parsed) and NaN and Infinity as null, where
+    STRICT_JSON makes the stdlib raise. API fields are Decimals rendered as
+    strings, so only computed float fields (ratios, simulation results) can
+    differ. Indented output (Accept: application/json; indent=4) and
+    non-default UNICODE_JSON or STRICT_JSON settings go through the stdlib
+    path.
+    """
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self._encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError:
+            # e.g. integers beyond 64 bits, or a default() that returned an unsupported type
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, so the output stays a strict JavaScript subset
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from app import db_router
+
+
+# Per-resource cache for hot GET responses, with ETag / If-None-Match support.
+#
+# Every cached resource (e.g. one partner's customer list) has a generation
+# token. Entries are stored under the token that was current when the view
+# started, and invalidate() replaces the token, so entries written around a
+# concurrent write can never be served afterwards. Tokens made by invalidate()
+# carry their time, so a response read from a replica that may not have the
+# write yet (app.db_router) is served but not stored.
+
+CACHE_ALIAS = 'responses'
+
+
+class ResponseCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.not_modified = 0
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+stats = ResponseCacheStats()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def backend_name():
+    return type(_cache()).__name__
+
+
+def _generation_key(resource, object_id):
+    return f'gen:{resource}:{object_id}'
+
+
+def _current_generation(resource, object_id):
+    cache = _cache()
+    key = _generation_key(resource, object_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump(resource, object_ids):
+    generation = f'{uuid.uuid4().hex}:{time.time():.3f}'
+    _cache().set_many({_generation_key(resource, object_id): generation for object_id in object_ids}, None)
+
+
+def _replica_may_lag(generation):
+    """Whether this request reads from a replica within the sticky window of the generation's write."""
+    if db_router.current_replica() is None:
+        return False
+    _, _, changed_at = generation.partition(':')
+    return bool(changed_at) and time.time() - float(changed_at) < db_router.sticky_seconds()
+
+
+def invalidate(resource, *object_ids):
+    """
+    Drop every cached response for these objects. Runs now and again when the
+    surrounding transaction commits, so a reader cannot cache data from
+    before the commit under the new generation.
+    """
+    object_ids = [object_id for object_id in object_ids if object_id is not None]
+    if not object_ids:
+        return
+    _bump(resource, object_ids)
+    transaction.on_commit(lambda: _bump(resource, object_ids))
+
+
+def clear():
+    _cache().clear()
+    stats.reset()
+
+
+def compute_etag(data):
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _not_modified(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    return etag in (tag.strip() for tag in header.split(',')) or header.strip() == '*'
+
+
+def cached_response(resource, lookup='pk'):
+    """
+    Cache the data of a viewset action's successful GET responses per object
+    (kwargs[lookup]) and query string. Other methods pass straight through.
+    """
+    timeout = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(self, request, *args, **kwargs)
+
+            object_id = kwargs[lookup]
+            generation = _current_generation(resource, object_id)
+            path = hashlib.blake2b(request.get_full_path().encode(), digest_size=16).hexdigest()
+            key = f'resp:{resource}:{object_id}:{generation}:{path}'
+
+            entry = _cache().get(key)
+            if entry is None:
+                stats.record('misses')
+                response = view(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                etag = compute_etag(response.data)
+                if not _replica_may_lag(generation):
+                    _cache().set(key, (etag, response.data), timeout)
+            else:
+                stats.record('hits')
+                etag, data = entry
+                response = Response(data)
+
+            if _not_modified(request, etag):
+                stats.record('not_modified')
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
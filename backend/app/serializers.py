@@ -0,0 +1,18 @@
+class FieldProjectionMixin:
+    """
+    Lets GET callers pick the fields they need with ?fields=id,email,...
+    Dropped fields are never read, so computed properties behind them are
+    not evaluated either.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        requested = request.query_params.get('fields')
+        if not requested:
+            return
+        keep = {name.strip() for name in requested.split(',') if name.strip()}
+        for name in set(self.fields) - keep:
+            self.fields.pop(name)
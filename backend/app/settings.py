@@ -10,11 +10,27 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Values from backend/.env (see .env.example); real environment variables win
+load_dotenv(BASE_DIR / '.env')
+
+
+def env_bool(name, default=False):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+def env_list(name):
+    return [item.strip() for item in os.environ.get(name, '').split(',') if item.strip()]
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -46,10 +62,14 @@ INSTALLED_APPS = [
     #Apps
     "loans",
     "customers",
-    "partners"
+    "partners",
+    "benchmarks",
+    "jobs",
 ] 
 
 MIDDLEWARE = [
+    'app.profiling.ProfilingMiddleware',  # no-op unless REQUEST_PROFILING
+    'app.db_router.ReplicaMiddleware',  # no-op without REPLICA_DATABASES
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -74,6 +94,11 @@ CORS_ALLOWED_ORIGINS = [
 # Remove this in production and use CORS_ALLOWED_ORIGINS above
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Read-your-writes from the browser (app.db_router): the frontend reads the
+# X-DB-Pin header of write responses and sends it back on later requests
+CORS_EXPOSE_HEADERS = ['X-DB-Pin']
+CORS_ALLOW_HEADERS = (*default_headers, 'x-db-pin')
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -97,11 +122,150 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=sqlite (default, for development) or DB_ENGINE=postgres
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'beesnbears'),
+            'USER': os.environ.get('POSTGRES_USER', 'beesnbears'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # Reuse connections across requests instead of reconnecting each time
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+            'OPTIONS': {},
+        }
+    }
+    if env_bool('DB_POOL'):
+        # Needs psycopg 3 with the pool extra, psycopg[binary,pool] in requirements.txt.
+        # Pooling replaces persistent connections, so CONN_MAX_AGE must be 0.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '20')),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # WAL lets readers run alongside the single writer; IMMEDIATE takes
+                # the write lock up front so concurrent writers queue on the busy
+                # timeout instead of failing with "database is locked"
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
+    }
+
+# Read replicas (app.db_router): GET requests read from one of these, at random,
+# unless the client wrote in the last REPLICA_STICKY_SECONDS. Each becomes a
+# DATABASES alias replica1, replica2, ... with the settings of default.
+# PostgreSQL: POSTGRES_REPLICA_HOSTS=host[:port],... of streaming replicas.
+# SQLite stand-in: SQLITE_REPLICA_PATHS=path,... of files that
+# sync_sqlite_replicas copies default into; connections to them refuse writes.
+if DB_ENGINE == 'postgres':
+    REPLICA_SETTINGS = [
+        {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+        for host, _, port in (entry.partition(':') for entry in env_list('POSTGRES_REPLICA_HOSTS'))
+    ]
+else:
+    REPLICA_SETTINGS = [
+        {'NAME': path, 'OPTIONS': {
+            **DATABASES['default']['OPTIONS'],
+            'transaction_mode': 'DEFERRED',
+            'init_command': DATABASES['default']['OPTIONS']['init_command'] + 'PRAGMA query_only=ON;',
+        }}
+        for path in env_list('SQLITE_REPLICA_PATHS')
+    ]
+for number, replica in enumerate(REPLICA_SETTINGS, 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        **replica,
+        'TEST': {'MIRROR': 'default'},
     }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['app.db_router.ReadReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '10'))
+
+
+# Request instrumentation (app.profiling): per-route histograms at /api/_metrics,
+# and ?_profile=1 cProfile reports when DEBUG is also on. Async views are run
+# through the sync middleware chain while this is enabled.
+REQUEST_PROFILING = env_bool('REQUEST_PROFILING', False)
+
+# Processes per Monte Carlo stress test (loans.simulation). 0 divides the CPUs
+# among the job worker's pool processes (jobs.worker.cpu_share): one each with
+# the default --processes (one per CPU), all of them for a worker started with
+# --processes 1, which suits a host that mostly runs stress tests.
+STRESS_TEST_PROCESSES = int(os.environ.get('STRESS_TEST_PROCESSES', '0')) or None
+
+# Default retention of loan offers for archive_loans (loans.archive), in days
+LOAN_RETENTION_DAYS = int(os.environ.get('LOAN_RETENTION_DAYS', '365'))
+
+
+# Caches
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# 'responses' backs app.response_cache. RESPONSE_CACHE_BACKEND picks locmem
+# (per process, default), file (shared by processes on one host) or redis
+# (needs the redis package; a local redis-server works as a stand-in).
+
+RESPONSE_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'locmem')
+RESPONSE_CACHE_LOCATION = os.environ.get('RESPONSE_CACHE_LOCATION', {
+    'locmem': 'responses',
+    'file': os.path.join(tempfile.gettempdir(), 'beesnbears-responses'),
+    'redis': 'redis://127.0.0.1:6379/1',
+}[RESPONSE_CACHE_BACKEND])
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', '300'))
+
+# 'idempotency' backs app.idempotency (Idempotency-Key on POSTs) on the same
+# kind of backend. It claims keys with cache.add(), which only redis makes
+# atomic across processes: use redis when several worker processes serve the
+# API (file is shared but can let two processes claim the same key).
+# IDEMPOTENCY_LOCK_TIMEOUT is how long a retry waits for a running request,
+# and how long a claim outlives a worker that died holding it.
+IDEMPOTENCY_CACHE_LOCATION = os.environ.get('IDEMPOTENCY_CACHE_LOCATION', {
+    'locmem': 'idempotency',
+    'file': os.path.join(tempfile.gettempdir(), 'beesnbears-idempotency'),
+    'redis': 'redis://127.0.0.1:6379/2',
+}[RESPONSE_CACHE_BACKEND])
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', '86400'))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', '30'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': RESPONSE_CACHE_BACKENDS[RESPONSE_CACHE_BACKEND],
+        'LOCATION': RESPONSE_CACHE_LOCATION,
+        'OPTIONS': {'MAX_ENTRIES': 10000} if RESPONSE_CACHE_BACKEND != 'redis' else {},
+    },
+    'idempotency': {
+        'BACKEND': RESPONSE_CACHE_BACKENDS[RESPONSE_CACHE_BACKEND],
+        'LOCATION': IDEMPOTENCY_CACHE_LOCATION,
+        'TIMEOUT': IDEMPOTENCY_KEY_TTL,
+        'OPTIONS': {'MAX_ENTRIES': 50000} if RESPONSE_CACHE_BACKEND != 'redis' else {},
+    },
 }
 
 
@@ -140,3 +304,20 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'app.pagination.CreatedAtCursorPagination',
+    # orjson-backed when installed (pip install orjson); same bytes as JSONRenderer
+    # except for tiny and non-finite floats (see app.renderers)
+    'DEFAULT_RENDERER_CLASSES': [
+        'app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'PAGE_SIZE': 50,
+}
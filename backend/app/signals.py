@@ -0,0 +1,27 @@
+from django.db import router, transaction
+from django.dispatch import Signal
+
+# Sent by the custom querysets around bulk_create()/bulk_update(), which skip
+# pre_save/post_save: bulk_changing before the write and bulk_changed after
+# it, in the same transaction. Arguments: sender (the model class),
+# instances, created (True for bulk_create; with ignore_conflicts some
+# instances may not have been inserted) and state, a dict shared by the two
+# sends where receivers keep what they captured before the write.
+bulk_changing = Signal()
+bulk_changed = Signal()
+
+
+def bulk_write(queryset, instances, created, write):
+    """
+    Call write() between bulk_changing and bulk_changed for instances, in
+    one transaction on the queryset's write database. Returns what write()
+    returns; bulk_changed gets that list for bulk_create.
+    """
+    state = {}
+    using = queryset._db or router.db_for_write(queryset.model)
+    with transaction.atomic(using=using, savepoint=False):
+        bulk_changing.send(sender=queryset.model, instances=instances, created=created, state=state)
+        result = write()
+        bulk_changed.send(sender=queryset.model, instances=result if created else instances,
+                          created=created, state=state)
+    return result
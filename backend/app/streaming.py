@@ -0,0 +1,25 @@
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+async def stream_json_array(rows, to_representation):
+    """
+    Encode an async iterable of model instances as a JSON array, one row at a
+    time, so the response never holds the whole list in memory.
+    """
+    encoder = JSONEncoder()
+    yield '['
+    first = True
+    async for row in rows:
+        yield ('' if first else ',') + encoder.encode(to_representation(row))
+        first = False
+    yield ']'
+
+
+def json_body(request):
+    """Parse a JSON request body; None if it is not valid JSON."""
+    try:
+        return json.loads(request.body or b'null')
+    except (ValueError, UnicodeDecodeError):
+        return None
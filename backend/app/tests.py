@@ -0,0 +1,276 @@
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db import OperationalError, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from app import db_router, profiling, response_cache
+from customers.models import Customer
+from jobs.models import Job
+from loans.models import Loan
+from partners.models import Partner, PartnerPortfolio
+
+
+class DbPinCorsTests(APITestCase):
+    """The frontend runs on another origin; it must be able to read and send back the pin."""
+    origin = 'http://localhost:3000'
+
+    def test_pin_header_is_exposed(self):
+        response = self.client.post('/api/customers/', {}, format='json', HTTP_ORIGIN=self.origin)
+        exposed = [name.strip().lower() for name in response['Access-Control-Expose-Headers'].split(',')]
+        self.assertIn(db_router.PIN_HEADER.lower(), exposed)
+
+    def test_pin_header_may_be_sent(self):
+        response = self.client.options('/api/customers/', HTTP_ORIGIN=self.origin,
+                                       HTTP_ACCESS_CONTROL_REQUEST_METHOD='GET',
+                                       HTTP_ACCESS_CONTROL_REQUEST_HEADERS='x-db-pin')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('x-db-pin', response['Access-Control-Allow-Headers'])
+
+
+class AsyncReadPathTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                                income=Decimal('4000.00'), credit_score=300)
+        self.partner = Partner.objects.create(company_name='Async Solar', address='1 Await St')
+        self.partner.customers.add(self.customer)
+        for term in (12, 24):
+            Loan.objects.create(customer=self.customer, loan_amount=Decimal('1000.00'),
+                                annual_rate=Decimal('5.00'), term_months=term)
+
+    async def read_streamed_json(self, response):
+        chunks = [chunk async for chunk in response.streaming_content]
+        return json.loads(b''.join(chunks))
+
+    async def test_customer_loan_offers_match_sync_endpoint(self):
+        sync_rows = await sync_to_async(
+            lambda: self.client.get(f'/api/customers/{self.customer.id}/loanoffers/').json()
+        )()
+        response = await self.async_client.get(f'/api/async/customers/{self.customer.id}/loanoffers/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await self.read_streamed_json(response), sync_rows)
+
+    async def test_partner_customers_match_sync_endpoint(self):
+        sync_rows = await sync_to_async(
+            lambda: self.client.get(f'/api/partners/{self.partner.id}/customers/').json()
+        )()
+        response = await self.async_client.get(f'/api/async/partners/{self.partner.id}/customers/')
+        self.assertEqual(await self.read_streamed_json(response), sync_rows)
+
+    async def test_missing_objects_and_methods(self):
+        self.assertEqual((await self.async_client.get('/api/async/customers/999999/loanoffers/')).status_code, 404)
+        self.assertEqual((await self.async_client.post(f'/api/async/partners/{self.partner.id}/customers/')).status_code,
+                         405)
+
+    async def test_quote(self):
+        payload = {'loan_amount': '6000.00', 'annual_rate': '12.00', 'term_months': 12, 'customer': self.customer.id}
+        response = await self.async_client.post('/api/async/loanoffers/quote/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['monthly_payments'], '533.09')
+        # A 300 credit score
+        self.assertTrue(response.json()['has_sufficient_income'])
+        self.assertFalse(response.json()['qualifies'])
+        response = await self.async_client.post('/api/async/loanoffers/quote/', {'loan_amount': '-5'},
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ReadReplicaTests(TransactionTestCase):
+    """A SQLite file standing in for a replica, refreshed only by copy_to_sqlite_replicas()."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Registered after the test runner has set up its databases: the file
+        # is the replica's, not a test copy of default
+        cls.directory = tempfile.TemporaryDirectory()
+        default = connections.settings['default']
+        connections.settings['replica'] = {
+            **default,
+            'NAME': os.path.join(cls.directory.name, 'replica.sqlite3'),
+            'OPTIONS': {**default['OPTIONS'], 'transaction_mode': 'DEFERRED',
+                        'init_command': 'PRAGMA query_only=ON;'},
+            'TEST': {**default['TEST'], 'MIRROR': 'default'},  # not flushed between tests
+        }
+        cls.databases = {*cls.databases, 'replica'}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.directory.cleanup()
+
+    def setUp(self):
+        override = override_settings(REPLICA_DATABASES=['replica'], REPLICA_STICKY_SECONDS=10)
+        override.enable()
+        self.addCleanup(override.disable)
+        response_cache.clear()
+        self.customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                                income=Decimal('4000.00'), credit_score=300)
+        db_router.copy_to_sqlite_replicas()
+
+    def test_safe_requests_read_from_the_replica(self):
+        Customer.objects.create(first_name='Late', last_name='L', email='late@example.com',
+                                income=Decimal('4000.00'), credit_score=700)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(len(self.client.get('/api/customers/').json()['results']), 1)
+        self.assertTrue(replica.captured_queries)
+        db_router.copy_to_sqlite_replicas()
+        self.assertEqual(len(self.client.get('/api/customers/').json()['results']), 2)
+
+    def test_writes_never_go_to_the_replica(self):
+        url = f'/api/customers/{self.customer.pk}/'
+        with CaptureQueriesContext(connections['replica']) as replica:
+            created = self.client.post('/api/customers/', {
+                'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'grace@example.com',
+                'income': '5000.00', 'credit_score': 720,
+            }, format='json')
+            self.assertEqual(created.status_code, 201)
+            self.assertEqual(self.client.patch(url, {'credit_score': 640}, format='json').status_code, 200)
+            self.assertEqual(self.client.delete(f"/api/customers/{created.json()['id']}/").status_code, 204)
+        self.assertEqual(replica.captured_queries, [])
+        self.assertEqual(Customer.objects.get(pk=self.customer.pk).credit_score, 640)
+        self.assertEqual(Customer.objects.using('replica').get(pk=self.customer.pk).credit_score,
+                         self.customer.credit_score)
+        with self.assertRaises(OperationalError):
+            Customer.objects.using('replica').update(credit_score=1)
+
+    def test_writer_reads_its_own_writes(self):
+        response = self.client.post('/api/customers/', {
+            'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'grace@example.com',
+            'income': '5000.00', 'credit_score': 720,
+        }, format='json')
+        url = f"/api/customers/{response.json()['id']}/"
+        pin = response[db_router.PIN_HEADER]
+        self.assertEqual(response.cookies[db_router.PIN_COOKIE].value, pin)
+
+        self.assertEqual(self.client.get(url).status_code, 200)  # pinned by the cookie
+        other = APIClient()
+        self.assertEqual(other.get(url).status_code, 404)  # the replica has not caught up
+        self.assertEqual(other.get(url, HTTP_X_DB_PIN=pin).status_code, 200)
+        self.assertEqual(other.get(url, HTTP_X_DB_PIN=str(time.time() + 3600)).status_code, 404)
+        with mock.patch('app.db_router.time.time', return_value=float(pin) + 1):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_stale_replica_reads_are_not_cached(self):
+        url = f'/api/customers/{self.customer.pk}/loanoffers/'
+        self.assertEqual(self.client.get(url).json(), [])
+        Loan.objects.create(customer=self.customer, loan_amount=Decimal('1000.00'),
+                            annual_rate=Decimal('5.00'), term_months=12)
+        self.assertEqual(APIClient().get(url).json(), [])  # lagging replica, inside the window
+        db_router.copy_to_sqlite_replicas()
+        self.assertEqual(len(APIClient().get(url).json()), 1)
+
+    def test_safe_request_reads_its_own_writes(self):
+        partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        partner.customers.add(self.customer)
+        PartnerPortfolio.objects.all().delete()
+        db_router.copy_to_sqlite_replicas()
+        # A missing portfolio is not built on read, so the request stays on the replica
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.client.get(f'/api/partners/{partner.pk}/portfolio/').status_code, 404)
+        self.assertTrue(replica.captured_queries)
+        self.assertFalse(PartnerPortfolio.objects.exists())
+
+        # A write during a safe request moves the rest of it to default
+        route = db_router.use_replica('replica')
+        try:
+            self.assertEqual(db_router.current_replica(), 'replica')
+            Customer.objects.filter(pk=self.customer.pk).update(credit_score=700)
+            self.assertIsNone(db_router.current_replica())
+        finally:
+            db_router._route.reset(route)
+
+    def test_jobs_and_transactions_read_from_default(self):
+        router = db_router.ReadReplicaRouter()
+        token = db_router.use_replica('replica')
+        try:
+            self.assertEqual(router.db_for_read(Customer), 'replica')
+            self.assertEqual(router.db_for_read(Job), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Customer), 'default')
+            self.assertEqual(router.db_for_write(Customer), 'default')
+        finally:
+            db_router._route.reset(token)
+        self.assertEqual(router.db_for_read(Customer), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'customers'))
+
+
+@override_settings(REQUEST_PROFILING=True, DEBUG=True)
+class RequestProfilingTests(APITestCase):
+    def setUp(self):
+        profiling.registry.clear()
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        self.customer = Customer.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com',
+            income=Decimal('5000.00'), credit_score=700, address='1 Main St')
+        self.partner.customers.add(self.customer)
+        Loan.objects.create(customer=self.customer, loan_amount=Decimal('1000.00'),
+                            annual_rate=Decimal('5.00'), term_months=12)
+        self.url = f'/api/partners/{self.partner.id}/customers/{self.customer.id}/loanoffers/'
+
+    def sample(self, metrics, name, route='partner-list-loan-offers', suffix='_count'):
+        prefix = f'{name}{suffix}{{route="{route}",method="GET"}} '
+        for line in metrics.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return None
+
+    def test_metrics_per_route(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        response = self.client.get('/api/_metrics')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        metrics = response.content.decode()
+
+        self.assertEqual(self.sample(metrics, 'api_request_duration_seconds'), 3)
+        # membership check + loans, every time
+        self.assertEqual(self.sample(metrics, 'api_request_sql_queries', suffix='_sum'), 6)
+        self.assertIn('api_request_sql_queries_bucket{route="partner-list-loan-offers",method="GET",le="1"} 0',
+                      metrics)
+        self.assertIn('api_request_sql_queries_bucket{route="partner-list-loan-offers",method="GET",le="2"} 3',
+                      metrics)
+        self.assertGreater(self.sample(metrics, 'api_request_serializer_duration_seconds', suffix='_sum'), 0)
+        self.assertEqual(self.sample(metrics, 'api_response_size_bytes', suffix='_sum'),
+                         3 * len(self.client.get(self.url).content))
+        self.assertIsNone(self.sample(metrics, 'api_request_duration_seconds', route='api-metrics'))
+
+    async def test_async_requests(self):
+        async def get_response(request):
+            pass
+        # Runs in the async chain without a thread hop
+        self.assertTrue(iscoroutinefunction(profiling.ProfilingMiddleware(get_response)))
+
+        payload = {'loan_amount': '6000.00', 'annual_rate': '12.00', 'term_months': 12, 'customer': self.customer.id}
+        for _ in range(2):
+            response = await self.async_client.post('/api/async/loanoffers/quote/', payload,
+                                                    content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        metrics = profiling.registry.render()
+        prefix = 'api_request_sql_queries_sum{route="async-loanoffer-quote",method="POST"} '
+        # The customer lookup, run by the async ORM in another thread
+        self.assertIn(f'{prefix}2\n', metrics)
+        self.assertIn('api_request_duration_seconds_count{route="async-loanoffer-quote",method="POST"} 2', metrics)
+
+    def test_profile_mode(self):
+        response = self.client.get(self.url, {'_profile': '1'})
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('list_loan_offers', response.content.decode())
+
+        raw = self.client.get(self.url, {'_profile': 'raw'})
+        self.assertEqual(raw['Content-Type'], 'application/octet-stream')
+
+    @override_settings(DEBUG=False)
+    def test_profile_mode_needs_debug(self):
+        response = self.client.get(self.url, {'_profile': '1'})
+        self.assertEqual(response['Content-Type'], 'application/json')
@@ -20,14 +20,30 @@ from rest_framework.routers import DefaultRouter
 from partners.views import PartnerViewSet
 from customers.views import CustomerViewSet
 from loans.views import LoanOfferViewSet
+from jobs.views import JobViewSet
+from customers.async_views import customer_loan_offers
+from partners.async_views import partner_customers
+from loans.async_views import loan_quote
+from app.views import metrics, response_cache_stats
 # Add this temporarily for debugging
 
 router = DefaultRouter()
 router.register(r'partners', PartnerViewSet, basename='partner')
 router.register(r'customers', CustomerViewSet, basename='customer')
 router.register(r'loanoffers', LoanOfferViewSet, basename='loanoffer')
+router.register(r'jobs', JobViewSet, basename='job')
+
+# Async-native read paths, served without a worker thread under ASGI (app/asgi.py)
+async_urlpatterns = [
+    path('customers/<int:pk>/loanoffers/', customer_loan_offers, name='async-customer-loanoffers'),
+    path('partners/<int:pk>/customers/', partner_customers, name='async-partner-customers'),
+    path('loanoffers/quote/', loan_quote, name='async-loanoffer-quote'),
+]
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/_metrics', metrics, name='api-metrics'),
+    path('api/cache/stats/', response_cache_stats, name='response-cache-stats'),
     path('api/', include(router.urls)),
+    path('api/async/', include(async_urlpatterns)),
 ]
@@ -0,0 +1,25 @@
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from app import profiling, response_cache
+
+
+@api_view(['GET'])
+def response_cache_stats(request):
+    """
+    Hit/miss counters for the response cache of this process.
+    Endpoint: GET /api/cache/stats/
+    """
+    return Response({
+        'backend': response_cache.backend_name(),
+        **response_cache.stats.as_dict(),
+    })
+
+
+def metrics(request):
+    """
+    Request histograms in Prometheus text format (empty unless
+    REQUEST_PROFILING is on).
+    Endpoint: GET /api/_metrics
+    """
+    return profiling.metrics_response()
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from loans import simulation
+from loans.amortization import batch_monthly_payments
+
+
+def synthetic_portfolio(loans, seed=0):
+    """Seeded portfolio arrays shaped like simulation.portfolio_arrays(), without the database."""
+    rng = np.random.default_rng(seed)
+    principal = rng.uniform(1_000, 100_000, loans).round(2)
+    annual_rate = rng.uniform(3, 20, loans).round(2)
+    term = rng.choice([12, 24, 36, 48, 60, 120, 240, 360], loans).astype(np.float64)
+    return {
+        'principal': principal,
+        'rate': annual_rate / 1200.0,
+        'term': term,
+        'payment': batch_monthly_payments(principal, annual_rate, term),
+        'pd': simulation.annual_default_probability(rng.integers(300, 851, loans)),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Time loans.simulation.run_stress_test on a synthetic portfolio at each process count, "
+        "reporting seconds and the speedup over the first count. Does not touch the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loans", type=int, default=10_000)
+        parser.add_argument("--paths", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--processes", type=int, nargs="+", default=None,
+                            help="Process counts to time (default: 1 and os.cpu_count())")
+
+    def handle(self, *args, **options):
+        processes = options["processes"] or sorted({1, os.cpu_count() or 1})
+        if options["loans"] <= 0 or options["paths"] <= 0 or min(processes) <= 0:
+            raise CommandError("--loans, --paths and --processes must be positive")
+
+        portfolio = synthetic_portfolio(options["loans"], options["seed"])
+        self.stdout.write(f"{options['loans']} loans x {options['paths']} paths, "
+                          f"{os.cpu_count()} CPUs available")
+        first = None
+        for count in processes:
+            result = simulation.run_stress_test(portfolio, paths=options["paths"],
+                                                seed=options["seed"], processes=count)
+            if first is None:
+                first = result
+            elif result["loss_percentiles"] != first["loss_percentiles"]:
+                raise CommandError(f"processes={count} changed the loss percentiles")
+            seconds = max(result["seconds"], 0.001)  # rounded to the millisecond
+            self.stdout.write(f"processes={count:<3} {seconds:8.2f}s  "
+                              f"{options['paths'] / seconds:10.0f} paths/s  "
+                              f"x{max(first['seconds'], 0.001) / seconds:.2f}")
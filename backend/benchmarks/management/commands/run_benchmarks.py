@@ -0,0 +1,78 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from benchmarks import suite
+from benchmarks.seeding import seed_lending_data
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / "baseline.json"
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the micro-benchmarks and drive every router endpoint in-process, write the "
+        "results as JSON and flag regressions against a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--existing", action="store_true",
+                            help="Benchmark the data already in the database instead of seeding "
+                                 "a throwaway data set inside a rolled-back transaction")
+        parser.add_argument("--partners", type=int, default=10)
+        parser.add_argument("--customers", type=int, default=2_000)
+        parser.add_argument("--loans-per-customer", type=float, default=3)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint")
+        parser.add_argument("--repeat", type=int, default=5, help="Repeats per micro-benchmark")
+        parser.add_argument("--output", type=Path, help="Write the results JSON here")
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument("--threshold", type=float, default=0.25,
+                            help="Flag benchmarks whose p50 is this much slower than the baseline")
+        parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+
+    def handle(self, *args, **options):
+        if options["existing"]:
+            results, seeded = self.run(options), None
+        else:
+            with transaction.atomic():
+                seeded = seed_lending_data(
+                    options["partners"], options["customers"], options["loans_per_customer"],
+                    seed=options["seed"], prefix="bench",
+                )
+                results = self.run(options)
+                transaction.set_rollback(True)
+
+        report = {"environment": suite.environment(), "seeded": seeded, "results": results}
+        if options["output"]:
+            options["output"].write_text(json.dumps(report, indent=2) + "\n")
+        if options["save_baseline"]:
+            options["baseline"].write_text(json.dumps(report, indent=2) + "\n")
+            self.stdout.write(f"Baseline saved to {options['baseline']}")
+
+        baseline = {}
+        if options["baseline"].exists() and not options["save_baseline"]:
+            baseline = json.loads(options["baseline"].read_text())["results"]
+        rows, regressions = suite.compare(results, baseline, options["threshold"])
+        self.write_table(rows, regressions)
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} benchmark(s) regressed by more than {options['threshold']:.0%}: "
+                + ", ".join(regressions)
+            )
+
+    def run(self, options):
+        results = suite.run_micro(options["repeat"])
+        http, skipped = suite.run_http(options["requests"])
+        results.update(http)
+        if skipped:
+            self.stdout.write(f"Not driven (writes): {', '.join(skipped)}")
+        return results
+
+    def write_table(self, rows, regressions):
+        self.stdout.write(f"{'benchmark':<58} {'baseline p50':>13} {'p50 ms':>10} {'change':>8}")
+        for name, previous, current, change in rows:
+            line = (f"{name:<58} {'-' if previous is None else f'{previous:.3f}':>13} "
+                    f"{current:>10.3f} {'new' if change is None else f'{change:+.0%}':>8}")
+            self.stdout.write(self.style.ERROR(line) if name in regressions else line)
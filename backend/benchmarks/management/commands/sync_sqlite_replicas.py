@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app import db_router
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite database over the SQLITE_REPLICA_PATHS files, a local stand-in for "
+        "replication. With --every, keep copying so the replicas lag by up to that many seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=float, default=None, metavar="SECONDS",
+                            help="Copy again every SECONDS until interrupted")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Only for DB_ENGINE=sqlite; PostgreSQL replicas use streaming replication")
+        if not db_router.replica_aliases():
+            raise CommandError("No replicas configured; set SQLITE_REPLICA_PATHS")
+        if options["every"] is not None and options["every"] <= 0:
+            raise CommandError("--every must be positive")
+
+        while True:
+            start = time.perf_counter()
+            copied = db_router.copy_to_sqlite_replicas()
+            self.stdout.write(f"Copied to {', '.join(copied)} in {time.perf_counter() - start:.2f}s")
+            if options["every"] is None:
+                return
+            try:
+                time.sleep(options["every"])
+            except KeyboardInterrupt:
+                return
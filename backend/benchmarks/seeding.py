@@ -0,0 +1,90 @@
+from decimal import Decimal
+
+import numpy as np
+
+from customers.models import Customer
+from loans.models import Loan
+from partners.models import Partner
+
+
+# Synthetic lending data with roughly realistic shapes:
+# - monthly income is log-normal around 4,500
+# - credit scores are normal around 690, clipped to 300-850
+# - partner sizes follow a Zipf-like curve, so a few partners are large
+# - 15% of customers belong to a second partner
+# - loan amounts are log-normal around 12,000 with common terms
+# - rates are priced off the credit score, with some noise
+# The same seed always produces the same rows.
+
+TERMS = np.array([12, 24, 36, 48, 60, 72, 84, 120, 180, 240])
+TERM_WEIGHTS = np.array([8, 12, 18, 12, 22, 10, 6, 6, 3, 3]) / 100
+SECOND_PARTNER_SHARE = 0.15
+LOAN_CHUNK_SIZE = 50_000
+
+
+def _cents(values):
+    return [Decimal(int(value)).scaleb(-2) for value in np.rint(values * 100)]
+
+
+def seed_lending_data(partners, customers, loans_per_customer=3, seed=42, prefix='seed', batch_size=5000):
+    """
+    Insert partners, customers and loans in bulk and return the row counts.
+    Emails and names carry the prefix so seeded rows are easy to find.
+    """
+    rng = np.random.default_rng(seed)
+
+    partner_rows = Partner.objects.bulk_create(
+        [Partner(company_name=f'{prefix} Partner {i}', address=f'{i} Seed Park') for i in range(partners)],
+        batch_size=batch_size,
+    )
+
+    incomes = _cents(np.clip(rng.lognormal(np.log(4500), 0.5, customers), 800, 50_000))
+    scores = np.clip(rng.normal(690, 75, customers), 300, 850).astype(int).tolist()
+    customer_rows = Customer.objects.bulk_create([
+        Customer(
+            first_name=f'{prefix}{i}', last_name='Seeded', email=f'{prefix}-{i}@example.com',
+            income=incomes[i], credit_score=scores[i], address=f'{i} Seed St',
+        )
+        for i in range(customers)
+    ], batch_size=batch_size)
+
+    weights = 1 / np.arange(1, partners + 1) ** 1.1
+    primary = rng.choice(partners, size=customers, p=weights / weights.sum())
+    secondary = rng.integers(0, partners, size=customers)
+    has_second = rng.random(customers) < SECOND_PARTNER_SHARE
+    Membership = Partner.customers.through
+    memberships = [
+        Membership(partner_id=partner_rows[p].pk, customer_id=customer.pk)
+        for customer, p in zip(customer_rows, primary.tolist())
+    ] + [
+        Membership(partner_id=partner_rows[s].pk, customer_id=customer.pk)
+        for customer, p, s, second in zip(customer_rows, primary.tolist(), secondary.tolist(), has_second.tolist())
+        if second and s != p
+    ]
+    Membership.objects.bulk_create(memberships, batch_size=batch_size)
+
+    counts = rng.poisson(loans_per_customer, customers) if loans_per_customer else np.zeros(customers, int)
+    owners = np.repeat(np.arange(customers), counts)
+    amounts = _cents(np.round(np.clip(rng.lognormal(np.log(12_000), 0.8, owners.size), 500, 500_000), -2))
+    terms = rng.choice(TERMS, size=owners.size, p=TERM_WEIGHTS).tolist()
+    owner_scores = np.asarray(scores)[owners] if owners.size else np.zeros(0)
+    rates = np.clip(4 + (850 - owner_scores) / 550 * 20 + rng.normal(0, 1.5, owners.size), 1, 35)
+    rates = [Decimal(str(rate)) for rate in (np.round(rates * 4) / 4).tolist()]
+
+    loan_count = 0
+    seen = set()
+    loans = []
+    for owner, amount, rate, term in zip(owners.tolist(), amounts, rates, terms):
+        key = (owner, amount, rate, term)
+        if key in seen:  # unique_together on the loan terms
+            continue
+        seen.add(key)
+        loans.append(Loan(customer_id=customer_rows[owner].pk, loan_amount=amount, annual_rate=rate, term_months=term))
+        if len(loans) == LOAN_CHUNK_SIZE:
+            loan_count += len(Loan.objects.bulk_create(loans, batch_size=batch_size))
+            loans = []
+    if loans:
+        loan_count += len(Loan.objects.bulk_create(loans, batch_size=batch_size))
+
+    return {'partners': len(partner_rows), 'customers': len(customer_rows),
+            'memberships': len(memberships), 'loans': loan_count}
@@ -0,0 +1,168 @@
+import json
+import platform
+import re
+import statistics
+import time
+
+import django
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from customers.models import Customer
+from customers.serializers import CustomerSerializer
+from loans.models import Loan
+from loans.serializers import LoanSerializer
+from partners.models import Partner
+
+
+# Micro-benchmarks and an in-process HTTP driver for the router endpoints.
+# Every benchmark produces a dict of timings in milliseconds; compare() checks
+# them against a stored baseline run.
+
+MICRO_SAMPLE = 1000
+GROUP = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+
+# Read-only POST endpoints worth driving; other writes are left to
+# loans' loadtest_loan_creation, which measures them against a real database.
+POST_PAYLOADS = {
+    'loanoffer-quote': lambda ids: {'loan_amount': '15000.00', 'annual_rate': '7.50', 'term_months': 60,
+                                    'customer': ids['customer']},
+    'loanoffer-quote-batch': lambda ids: [
+        {'loan_amount': f'{amount}.00', 'annual_rate': '7.50', 'term_months': term}
+        for amount in range(5000, 30000, 5000) for term in (24, 36, 60)
+    ],
+}
+
+
+def summarize(samples, per=1):
+    """Timing stats in milliseconds for a list of seconds, each covering `per` operations."""
+    samples = sorted(samples)
+    ms = [sample * 1000 / per for sample in samples]
+    return {
+        'n': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 6),
+        'p50_ms': round(statistics.median(ms), 6),
+        'p95_ms': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 6),
+        'max_ms': round(ms[-1], 6),
+        'ops_per_sec': round(1000 / statistics.fmean(ms), 2) if sum(ms) else None,
+    }
+
+
+def repeat(fn, times):
+    samples = []
+    for _ in range(times):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_micro(repeats=5):
+    loans = list(Loan.objects.order_by('pk')[:MICRO_SAMPLE])
+    customers = list(Customer.objects.order_by('pk')[:MICRO_SAMPLE])
+    results = {}
+    if loans:
+        results['micro.loan.monthly_payments'] = summarize(
+            repeat(lambda: [loan.monthly_payments for loan in loans], repeats), per=len(loans))
+        results[f'micro.LoanSerializer(many=True) x{len(loans)}'] = summarize(
+            repeat(lambda: LoanSerializer(loans, many=True).data, repeats))
+    if customers:
+        results['micro.CustomerSerializer'] = summarize(
+            repeat(lambda: [CustomerSerializer(customer).data for customer in customers], repeats),
+            per=len(customers))
+    return results
+
+
+def sample_ids():
+    """A partner, one of its customers with loans, and one of that customer's loans."""
+    loan = Loan.objects.filter(customer__partners__isnull=False).order_by('pk').first()
+    if loan is None:
+        return None
+    partner_id = Partner.customers.through.objects.filter(customer_id=loan.customer_id).values_list(
+        'partner_id', flat=True).first()
+    return {'partner': partner_id, 'customer': loan.customer_id, 'loanoffer': loan.pk}
+
+
+def router_endpoints(ids):
+    """(label, method, path, payload) for every router route that can be driven safely."""
+    from app.urls import router
+
+    endpoints, skipped = [], []
+    for pattern in router.urls:
+        regex, actions = pattern.pattern.regex.pattern, getattr(pattern.callback, 'actions', None)
+        if not actions or '<format>' in regex:
+            continue
+        resource = pattern.name.split('-')[0]
+        if resource not in ids and '<pk>' in regex:
+            skipped.append(pattern.name)  # no sample object to address
+            continue
+        values = {'pk': ids.get(resource), 'customer_id': ids['customer']}
+        path = '/api/' + GROUP.sub(lambda m: str(values[m.group(1)]), regex).strip('^$')
+        for method in actions:
+            if method == 'get':
+                endpoints.append((f'GET {pattern.name}', 'get', path, None))
+            elif method == 'post' and pattern.name in POST_PAYLOADS:
+                endpoints.append((f'POST {pattern.name}', 'post', path, POST_PAYLOADS[pattern.name](ids)))
+            else:
+                skipped.append(f'{method.upper()} {pattern.name}')
+    return endpoints, skipped
+
+
+def _request(client, method, path, payload):
+    if method == 'get':
+        response = client.get(path)
+    else:
+        response = client.post(path, json.dumps(payload), content_type='application/json')
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response.status_code
+
+
+def run_http(requests=50, warmup=2):
+    ids = sample_ids()
+    if ids is None:
+        return {}, []
+    client = Client(HTTP_HOST='localhost')
+    endpoints, skipped = router_endpoints(ids)
+    results = {}
+    for label, method, path, payload in endpoints:
+        for _ in range(warmup):
+            _request(client, method, path, payload)
+        statuses = set()
+        samples = repeat(lambda: statuses.add(_request(client, method, path, payload)), requests)
+        with CaptureQueriesContext(connection) as queries:
+            _request(client, method, path, payload)
+        results[f'http.{label}'] = {
+            **summarize(samples), 'queries': len(queries), 'statuses': sorted(statuses),
+        }
+    return results, skipped
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def compare(current, baseline, threshold=0.25, metric='p50_ms'):
+    """
+    Rows of (name, baseline, current, change) for every benchmark in both runs,
+    plus the names that regressed by more than threshold (0.25 = 25% slower).
+    """
+    rows, regressions = [], []
+    for name, result in sorted(current.items()):
+        previous = baseline.get(name)
+        if previous is None or not previous.get(metric):
+            rows.append((name, None, result[metric], None))
+            continue
+        change = result[metric] / previous[metric] - 1
+        rows.append((name, previous[metric], result[metric], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
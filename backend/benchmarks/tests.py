@@ -0,0 +1,84 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from benchmarks.seeding import seed_lending_data
+from benchmarks.suite import compare
+from customers.models import Customer
+from loans.models import Loan
+from partners.models import Partner, PartnerPortfolio
+
+
+class SeedingTests(TestCase):
+    def test_counts_and_ranges(self):
+        counts = seed_lending_data(5, 300, loans_per_customer=2, seed=7)
+        self.assertEqual((counts['partners'], counts['customers']), (5, 300))
+        self.assertEqual(Loan.objects.count(), counts['loans'])
+        self.assertGreater(counts['loans'], 400)
+        self.assertTrue(all(300 <= score <= 850 for score in Customer.objects.values_list('credit_score', flat=True)))
+        self.assertFalse(Customer.objects.filter(partners__isnull=True).exists())
+        self.assertFalse(Loan.objects.filter(monthly_payment__isnull=True).exists())
+        # Zipf-like partner sizes: the first partner is the biggest
+        sizes = [partner.customers.count() for partner in Partner.objects.order_by('pk')]
+        self.assertEqual(max(sizes), sizes[0])
+        self.assertEqual(PartnerPortfolio.objects.count(), 5)
+
+    def test_same_seed_same_data(self):
+        seed_lending_data(2, 50, seed=3, prefix='a')
+        seed_lending_data(2, 50, seed=3, prefix='b')
+        rows = lambda prefix: list(Customer.objects.filter(email__startswith=f'{prefix}-').order_by('pk')
+                                   .values_list('income', 'credit_score'))
+        self.assertEqual(rows('a'), rows('b'))
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_compare_flags_regressions(self):
+        baseline = {'fast': {'p50_ms': 1.0}, 'slow': {'p50_ms': 1.0}}
+        current = {'fast': {'p50_ms': 1.1}, 'slow': {'p50_ms': 1.5}, 'added': {'p50_ms': 2.0}}
+        rows, regressions = compare(current, baseline, threshold=0.25)
+        self.assertEqual(regressions, ['slow'])
+        self.assertIn(('added', None, 2.0, None), rows)
+
+    def test_run_benchmarks_end_to_end(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output, baseline = Path(tmp) / 'results.json', Path(tmp) / 'baseline.json'
+            options = dict(partners=2, customers=20, requests=1, repeat=1, baseline=baseline, stdout=StringIO())
+            call_command('run_benchmarks', output=output, save_baseline=True, **options)
+            results = json.loads(output.read_text())['results']
+            self.assertTrue(baseline.exists())
+
+            for name in ('micro.loan.monthly_payments', 'micro.CustomerSerializer',
+                         'http.GET partner-list-loan-offers', 'http.POST loanoffer-quote'):
+                self.assertIn(name, results)
+            for name, result in results.items():
+                if name.startswith('http.'):
+                    self.assertEqual(result['statuses'], [200], name)
+
+            # Seeded rows are rolled back
+            self.assertFalse(Customer.objects.exists())
+
+            report = json.loads(baseline.read_text())
+            for result in report['results'].values():
+                result['p50_ms'] /= 100
+            baseline.write_text(json.dumps(report))
+            with self.assertRaisesMessage(CommandError, 'regressed by more than 25%'):
+                call_command('run_benchmarks', **options)
+
+
+class StressTestBenchmarkTests(TestCase):
+    def test_reports_each_process_count(self):
+        out = StringIO()
+        call_command('benchmark_stress_test', loans=50, paths=600, processes=[1, 2], stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(',')[0], '50 loans x 600 paths')
+        self.assertTrue(lines[1].startswith('processes=1 '))
+        self.assertTrue(lines[2].startswith('processes=2 '))
+
+    def test_rejects_non_positive_sizes(self):
+        with self.assertRaisesMessage(CommandError, 'must be positive'):
+            call_command('benchmark_stress_test', loans=0, stdout=StringIO())
@@ -0,0 +1,24 @@
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_GET
+
+from app.streaming import stream_json_array
+from customers.models import Customer
+from loans.models import Loan
+from loans.serializers import LoanSerializer
+
+
+@require_GET
+async def customer_loan_offers(request, pk):
+    """
+    Async, streamed version of CustomerViewSet.get_loan_offers.
+    Endpoint: GET /async/customers/{id}/loanoffers
+    """
+    customer = await aget_object_or_404(Customer.objects.only('id'), pk=pk)
+    loans = Loan.objects.filter(customer=customer).aiterator(chunk_size=500)
+    # One serializer for every row; loans carry customer_id so it does no queries
+    serializer = LoanSerializer()
+    return StreamingHttpResponse(
+        stream_json_array(loans, serializer.to_representation),
+        content_type='application/json',
+    )
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+
+from customers.models import Customer
+from loans.models import Loan
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests/sec for GET customers/{id}/loanoffers: the WSGI CustomerViewSet action "
+        "on a thread per connection versus the async view, at the given concurrency. Runs against "
+        "a throwaway test database created from default's settings, never the configured one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=500)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--loans", type=int, default=50, help="Loan offers on the benchmark customer")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == "sqlite":
+                # A file rather than the shared in-memory test database, which
+                # serializes the threads on its table locks
+                connection.settings_dict["TEST"] = {
+                    **connection.settings_dict["TEST"], "NAME": os.path.join(directory, "benchmark.sqlite3"),
+                }
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                # Replicas are copies of the configured database, not of this one
+                with override_settings(REPLICA_DATABASES=[]):
+                    self.run_benchmark(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_benchmark(self, options):
+        customer = Customer.objects.create(
+            first_name="Async", last_name="Benchmark", email=f"async-bench-{time.time_ns()}@example.com",
+            income=Decimal("100000.00"), credit_score=800, address="Benchmark",
+        )
+        Loan.objects.bulk_create([
+            Loan(customer=customer, loan_amount=Decimal(1000 + i), annual_rate=Decimal("6.00"), term_months=60)
+            for i in range(options["loans"])
+        ])
+        sync_url = f"/api/customers/{customer.id}/loanoffers/"
+        async_url = f"/api/async/customers/{customer.id}/loanoffers/"
+        # The in-process test clients send Host: testserver
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            self.report("WSGI  CustomerViewSet.get_loan_offers", self.run_threads(sync_url, options))
+            self.report("ASGI  CustomerViewSet.get_loan_offers", asyncio.run(self.run_async(sync_url, options)))
+            self.report("ASGI  async customer_loan_offers", asyncio.run(self.run_async(async_url, options)))
+
+    def report(self, label, result):
+        seconds, statuses = result
+        total = sum(statuses.values())
+        self.stdout.write(f"{label:<40} {total / seconds:8.1f} req/s  {seconds:6.2f}s  statuses {statuses}")
+
+    def run_threads(self, url, options):
+        def fetch(_):
+            try:
+                return Client().get(url).status_code
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            codes = list(pool.map(fetch, range(options["requests"])))
+        return time.perf_counter() - start, self.count(codes)
+
+    async def run_async(self, url, options):
+        client = AsyncClient()
+        gate = asyncio.Semaphore(options["concurrency"])
+
+        async def fetch():
+            async with gate:
+                response = await client.get(url)
+                if response.streaming:
+                    async for _ in response.streaming_content:
+                        pass
+                return response.status_code
+
+        start = time.perf_counter()
+        codes = await asyncio.gather(*(fetch() for _ in range(options["requests"])))
+        return time.perf_counter() - start, self.count(codes)
+
+    @staticmethod
+    def count(codes):
+        statuses = {}
+        for code in codes:
+            statuses[code] = statuses.get(code, 0) + 1
+        return statuses
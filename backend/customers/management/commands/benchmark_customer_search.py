@@ -0,0 +1,124 @@
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+
+from app import response_cache
+from benchmarks.suite import summarize
+from customers import search
+from customers.models import Customer
+from partners.models import Partner
+
+
+FIRST_NAMES = (
+    'james mary robert patricia john jennifer michael linda david elizabeth william barbara richard susan '
+    'joseph jessica thomas sarah charles karen maria ana jose luis carmen wei li hiroshi yuki amara kwame '
+    'fatima omar priya arjun olga ivan sofia lucas emma noah mia liam chloe ethan grace mateo zoe'
+).split()
+SYLLABLES = 'an ber car del en fer gar hol in jo ka lor man nor os per quin ros sel tan ul vas wen xi yor zel'.split()
+STREETS = 'oak maple cedar pine elm main solar sunset river lake hill park mill church market station'.split()
+DOMAINS = ('gmail.com', 'yahoo.com', 'outlook.com', 'icloud.com', 'example.org')
+DOMAIN_WEIGHTS = (0.5, 0.2, 0.15, 0.1, 0.05)
+QUERIES = 200
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed --customers customers with varied names, emails, phones and addresses over --partners "
+        "partners (prefix 'search'), then time GET /partners/{id}/customers/?q= on the largest "
+        "partner and on a partner with --small-partner customers or fewer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=1_000_000)
+        parser.add_argument("--partners", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--small-partner", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        existing = Customer.objects.filter(partners__company_name__startswith="search ").distinct().count()
+        if existing < options["customers"]:
+            start = time.perf_counter()
+            self.seed(rng, existing, options["customers"], options["partners"])
+            search.optimize()
+            self.stdout.write(f"seeded {options['customers'] - existing} customers in "
+                              f"{time.perf_counter() - start:.1f}s")
+
+        partners = (Partner.objects.filter(company_name__startswith="search ")
+                    .annotate(members=Count("customers")).order_by("-members").values_list("id", "members"))
+        largest = partners.first()
+        small = partners.filter(members__lte=options["small_partner"]).first()
+        client = Client()
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            for partner_id, members in dict.fromkeys(p for p in (largest, small) if p):
+                self.stdout.write(f"{connection.vendor}, {Customer.objects.count()} customers, "
+                                  f"partner {partner_id} with {members} of them")
+                self.run_cases(client, partner_id)
+
+    def run_cases(self, client, partner_id):
+        sample = list(Customer.objects.filter(partners=partner_id).order_by("?")
+                      .values("first_name", "last_name", "email", "phone_number", "address")[:QUERIES])
+        cases = {
+            "full name": [f"{row['first_name']} {row['last_name']}" for row in sample],
+            "last name prefix (3)": [row["last_name"][:3] for row in sample],
+            "first name prefix (2)": [row["first_name"][:2] for row in sample],
+            "first + last prefix": [f"{row['first_name']} {row['last_name'][:4]}" for row in sample],
+            "email prefix": [row["email"][:8] for row in sample],
+            "full email": [row["email"] for row in sample],
+            "phone suffix": [row["phone_number"].split("-")[-1] for row in sample],
+            "street + number": [" ".join(row["address"].split()[:2]) for row in sample],
+            "last name, credit_score >= 700": [(row["last_name"], {"credit_score__gte": 700}) for row in sample],
+        }
+        for label, queries in cases.items():
+            samples, rows = [], 0
+            for query in queries:
+                query, filters = query if isinstance(query, tuple) else (query, {})
+                response_cache.clear()  # time the search, not the response cache
+                start = time.perf_counter()
+                response = client.get(f"/api/partners/{partner_id}/customers/", {"q": query, **filters})
+                samples.append(time.perf_counter() - start)
+                rows += len(response.json())
+            stats = summarize(samples)
+            self.stdout.write(f"  {label:<32} p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  "
+                              f"max {stats['max_ms']:7.2f} ms  {rows / len(queries):6.1f} rows")
+
+    def seed(self, rng, start, count, partners):
+        partner_rows = list(Partner.objects.filter(company_name__startswith="search "))
+        if not partner_rows:
+            partner_rows = Partner.objects.bulk_create(
+                [Partner(company_name=f"search Partner {i}", address=f"{i} Search Park") for i in range(partners)])
+        weights = 1 / np.arange(1, len(partner_rows) + 1) ** 1.1
+        Membership = Partner.customers.through
+        batch = 20_000
+        for offset in range(start, count, batch):
+            size = min(batch, count - offset)
+            first = rng.choice(FIRST_NAMES, size)
+            last = [''.join(parts).capitalize() for parts in rng.choice(SYLLABLES, (size, 3))]
+            streets = rng.choice(STREETS, size)
+            domains = rng.choice(DOMAINS, size, p=DOMAIN_WEIGHTS)
+            numbers = rng.integers(1, 9999, size)
+            phones = rng.integers(0, 10**10, size)
+            incomes = np.clip(rng.lognormal(np.log(4500), 0.5, size), 800, 50_000)
+            scores = np.clip(rng.normal(690, 75, size), 300, 850).astype(int)
+            owners = rng.choice(len(partner_rows), size=size, p=weights / weights.sum())
+            with transaction.atomic():
+                customers = Customer.objects.bulk_create([
+                    Customer(
+                        first_name=first[i].capitalize(), last_name=last[i],
+                        email=f"{first[i]}.{last[i].lower()}{offset + i}@{domains[i]}",
+                        phone_number=f"+1 {phones[i] // 10**7:03d}-{phones[i] // 10**4 % 1000:03d}-"
+                                     f"{phones[i] % 10**4:04d}",
+                        address=f"{numbers[i]} {streets[i].capitalize()} St #{offset + i}",
+                        income=Decimal(int(incomes[i] * 100)).scaleb(-2), credit_score=int(scores[i]),
+                    )
+                    for i in range(size)
+                ], batch_size=5000)
+                Membership.objects.bulk_create([
+                    Membership(partner_id=partner_rows[owner].pk, customer_id=customer.pk)
+                    for customer, owner in zip(customers, owners.tolist())
+                ], batch_size=5000)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from customers import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-create the SQLite customer search index from customer_table, e.g. after writes that "
+        "bypass the model signals (QuerySet.update(), raw SQL), and refresh the planner statistics."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--analyze-only", action="store_true",
+                            help="Only refresh the statistics and merge the index segments")
+
+    def handle(self, *args, **options):
+        if not search.uses_fts():
+            self.stdout.write("Nothing to do: the PostgreSQL trigram index needs no rebuilding.")
+            return
+        if options["analyze_only"]:
+            search.optimize()
+            self.stdout.write("Statistics refreshed.")
+            return
+        self.stdout.write(f"Indexed {search.rebuild()} customers.")
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 16:05
+
+from django.db import migrations
+
+from customers.search import FILL_SQL, FTS_TABLE_SQL, SEARCH_TABLE, TRIGRAM_INDEX_SQL
+
+
+# The search index is database specific (see customers.search), so the SQL
+# is picked for the connection the migration runs on.
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(FTS_TABLE_SQL)
+        schema_editor.execute(FILL_SQL)
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(TRIGRAM_INDEX_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS customer_search_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,6 +1,39 @@
-from django.db import models
+from functools import partial
+
+from django.db import models, router, transaction
+from django.db.models import F, Value
+from django.db.models.lookups import GreaterThanOrEqual
+from app.signals import bulk_write
 # Create your models 
 
+# Loan eligibility rules, shared by Loan.qualify_for_loan and the SQL versions below
+INCOME_TO_LOAN_MULTIPLE = 2  # annual income must be at least twice the loan amount
+MIN_CREDIT_SCORE = 500
+
+
+class CustomerQuerySet(models.QuerySet):
+    def eligible_for(self, loan_amount=None):
+        """
+        Customers who would qualify for a loan of loan_amount, evaluated in SQL.
+        Without an amount every customer's max_loan_amount meets the income
+        rule, so only the credit rule applies.
+        """
+        queryset = self.filter(credit_score__gte=MIN_CREDIT_SCORE)
+        if loan_amount is not None:
+            queryset = queryset.filter(GreaterThanOrEqual(
+                F('income') * 12, Value(loan_amount * INCOME_TO_LOAN_MULTIPLE)
+            ))
+        return queryset
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        return bulk_write(self, objs, True, partial(super().bulk_create, objs, *args, **kwargs))
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        return bulk_write(self, objs, False, partial(super().bulk_update, objs, fields, *args, **kwargs))
+
+
 class Customer(models.Model):
     first_name = models.CharField(max_length=60)
     last_name = models.CharField(max_length=60)
@@ -11,6 +44,8 @@ class Customer(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
+
+    objects = CustomerQuerySet.as_manager()
     
    #try using ManyToManyField(Loan)
 
@@ -21,10 +56,18 @@ class Customer(models.Model):
         unique_together = ('first_name','last_name','address')  # Unique constraint
         indexes = [
             models.Index(fields=['email',"created_at"]),
+            models.Index(fields=['created_at', 'id']),  # cursor pagination
         ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} {self.email}"
+
+    def save(self, *args, **kwargs):
+        # The portfolio signals read the old totals in pre_save and apply the
+        # difference in post_save; both belong in the write's transaction
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
     
 
     @property
@@ -0,0 +1,172 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from customers.models import Customer
+
+
+# Indexed ?q= search over customer name, email, phone and address.
+#
+# SQLite: an FTS5 table, customer_search, holds one row per customer with the
+# customer's id as its rowid. Every word of the query must prefix-match a word
+# of the document ("ada lov" finds Ada Lovelace, "555 01" her phone number);
+# the prefix indexes on 2 and 3 characters keep short prefixes cheap. Matches
+# are read newest first from the index itself, so a search stops as soon as
+# it has enough rows in the requested scope (e.g. one partner); with ANALYZE
+# statistics (see optimize()) the planner checks the scope on the membership
+# index before touching customer_table. The table is not Django-managed, so
+# customers/signals.py keeps it in sync on save, delete, bulk_create and
+# bulk_update; rebuild_customer_search re-creates it after other writes.
+#
+# PostgreSQL: a pg_trgm GIN index on the lower-cased document expression,
+# on customer_table itself, so it needs no syncing. Every word must occur in
+# the document (trigram-accelerated ILIKE) or be similar to one of its words
+# (word_similarity, for typos); rows are ordered by that similarity.
+#
+# Both are created by migration 0004_customer_search, for the database in use.
+
+SEARCH_TABLE = 'customer_search'
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'phone_number', 'address')
+MAX_TERMS = 8
+BATCH_SIZE = 500  # ids per statement when syncing
+WORD = re.compile(r'\w+')
+
+
+def _sources(prefix=''):
+    return [f"coalesce({prefix}{field}, '')" for field in SEARCH_FIELDS]
+
+
+def document_sql(table=''):
+    """The indexed expression on PostgreSQL; queries must repeat it for the index to apply."""
+    return 'lower({})'.format(" || ' ' || ".join(_sources(f'{table}.' if table else '')))
+
+
+FTS_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+    f"{', '.join(SEARCH_FIELDS)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+FILL_SQL = (
+    f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) "
+    f"SELECT id, {', '.join(_sources())} FROM customer_table"
+)
+REFRESH_SQL = FILL_SQL.replace('INSERT INTO', 'INSERT OR REPLACE INTO', 1)
+TRIGRAM_INDEX_SQL = f'CREATE INDEX customer_search_trgm ON customer_table USING gin (({document_sql()}) gin_trgm_ops)'
+
+
+def parse_query(query):
+    """
+    The lower-cased words of a search query (at most MAX_TERMS), and its
+    email-like chunks. Only the part of an email before the @ is searched
+    as words; a domain shared by most customers would match nearly every
+    row, so the whole chunk is checked against email on the matches instead.
+    """
+    words, emails = [], []
+    for chunk in query.lower().split():
+        if '@' in chunk:
+            emails.append(chunk)
+            chunk = chunk.partition('@')[0]
+        words.extend(WORD.findall(chunk))
+    return words[:MAX_TERMS], emails
+
+
+def uses_fts():
+    return connection.vendor == 'sqlite'
+
+
+def search(queryset, query, limit=None):
+    """
+    The rows of a Customer queryset matching query, at most limit of them:
+    newest first with FTS5, most similar first on PostgreSQL. An empty
+    query matches nothing.
+    """
+    words, emails = parse_query(query)
+    for email in emails:
+        queryset = queryset.filter(email__icontains=email)
+    if not words:
+        return queryset.none() if not emails else queryset[:limit]
+    if uses_fts():
+        # Walk the matches newest first straight off the index and keep those
+        # in the queryset, so a broad prefix stops after `limit` hits instead
+        # of collecting every match. Quoting keeps words from being read as
+        # FTS5 operators.
+        match = ' '.join(f'"{word}"*' for word in words)
+        scope = queryset.filter(pk=RawSQL(f'{SEARCH_TABLE}.rowid', ())).order_by().values('pk')
+        scope, params = scope.query.sql_with_params()
+        matches = RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND EXISTS ({scope}) '
+            f'ORDER BY rowid DESC LIMIT %s',
+            (match, *params, -1 if limit is None else limit),
+        )
+        return Customer.objects.filter(pk__in=matches).order_by('-pk')
+    if connection.vendor == 'postgresql':
+        document = document_sql(Customer._meta.db_table)
+        for word in words:
+            queryset = queryset.filter(RawSQL(
+                f'({document} LIKE %s OR %s <%% {document})', (f'%{_escape_like(word)}%', word),
+                output_field=BooleanField(),
+            ))
+        similarity = RawSQL(f'word_similarity(%s, {document})', (' '.join(words),))
+        return queryset.annotate(search_similarity=similarity).order_by('-search_similarity', 'id')[:limit]
+    # No index on other databases; fall back to a scan
+    for word in words:
+        queryset = queryset.filter(_any_field_contains(word))
+    return queryset[:limit]
+
+
+def _escape_like(word):
+    return word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _any_field_contains(word):
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__icontains': word})
+    return condition
+
+
+def index(customer_ids):
+    """Add or refresh the search rows of these customers from customer_table (FTS5 only)."""
+    customer_ids = [pk for pk in customer_ids if pk is not None]
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(customer_ids), BATCH_SIZE):
+            batch = customer_ids[start:start + BATCH_SIZE]
+            cursor.execute(f'{REFRESH_SQL} WHERE id IN ({", ".join(["%s"] * len(batch))})', batch)
+
+
+def unindex(customer_ids):
+    """Drop the search rows of these customers (FTS5 only)."""
+    if not uses_fts():
+        return
+    customer_ids = list(customer_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(customer_ids), BATCH_SIZE):
+            batch = customer_ids[start:start + BATCH_SIZE]
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(batch))})', batch)
+
+
+def rebuild():
+    """Re-create every search row from customer_table (FTS5 only). Returns the row count."""
+    if not uses_fts():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(FILL_SQL)
+        rows = cursor.rowcount
+    optimize()
+    return rows
+
+
+def optimize():
+    """
+    Refresh SQLite's planner statistics (ANALYZE) and merge the FTS5 index
+    segments. Worth running after loading many customers.
+    """
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        cursor.execute('ANALYZE')
@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from app import response_cache
+from app.signals import bulk_changed
+from customers import search
+from customers.models import Customer
+
+
+def invalidate_customers(customer_ids):
+    response_cache.invalidate('customer-loanoffers', *customer_ids)
+    # Customer rows are embedded in each of their partners' customer lists
+    partner_ids = Customer.partners.through.objects.filter(
+        customer_id__in=customer_ids
+    ).values_list('partner_id', flat=True).distinct()
+    response_cache.invalidate('partner-customers', *partner_ids)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(pre_delete, sender=Customer)  # before the cascade removes the memberships
+def invalidate_customer_responses(sender, instance, **kwargs):
+    invalidate_customers([instance.pk])
+
+
+@receiver(bulk_changed, sender=Customer)
+def invalidate_bulk_customer_responses(sender, instances, created, **kwargs):
+    if created:
+        return  # nothing can have cached a customer that did not exist
+    invalidate_customers([customer.pk for customer in instances])
+
+
+@receiver(post_save, sender=Customer)
+def index_customer(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(search.SEARCH_FIELDS).intersection(update_fields):
+        return
+    search.index([instance.pk])
+
+
+@receiver(post_delete, sender=Customer)
+def unindex_customer(sender, instance, **kwargs):
+    search.unindex([instance.pk])
+
+
+@receiver(bulk_changed, sender=Customer)
+def index_bulk_customers(sender, instances, **kwargs):
+    search.index([customer.pk for customer in instances])
@@ -1,3 +1,128 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from unittest import mock
+
+from django.db import connections
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from app import renderers
+from app.pagination import CreatedAtCursorPagination
+from app.fast_lists import ValuesRepresentation, values_list_data
+from app.renderers import FastJSONRenderer
+from customers.models import Customer
+from customers.serializers import CustomerSerializer
+from jobs.models import Job
+from loans.models import Loan
+from partners.models import Partner
+
+
+def make_customers(count, **overrides):
+    return Customer.objects.bulk_create([
+        Customer(
+            first_name=f'First{i}', last_name=f'Last{i}', email=f'customer{i}@example.com',
+            income=Decimal('4000.00') + i, credit_score=300 + i % 551, address=f'{i} Main St',
+            **overrides,
+        )
+        for i in range(count)
+    ])
+
+
+class CustomerListTests(APITestCase):
+    def setUp(self):
+        make_customers(7)
+
+    def test_cursor_pagination_walks_every_row_once(self):
+        seen = []
+        url = '/api/customers/?page_size=3'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 3)
+            seen.extend(row['id'] for row in page['results'])
+            url = page['next']
+        self.assertEqual(sorted(seen), sorted(Customer.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_pages_are_read_in_index_order(self):
+        if connections['default'].vendor != 'sqlite':
+            self.skipTest('reads SQLite query plans')
+        for model in (Customer, Loan, Partner, Job):
+            page = model.objects.filter(created_at__lt=timezone.now()).order_by(*CreatedAtCursorPagination.ordering)
+            plan = page[:51].explain()
+            self.assertIn('_created_', plan, model)
+            self.assertNotIn('TEMP B-TREE', plan, model)
+
+    def test_fields_projection(self):
+        response = self.client.get('/api/customers/?fields=id,email')
+        self.assertEqual(response.status_code, 200)
+        for row in response.json()['results']:
+            self.assertEqual(set(row), {'id', 'email'})
+
+    def test_projection_does_not_apply_to_writes(self):
+        payload = {'first_name': 'New', 'last_name': 'Person', 'email': 'NEW@example.com',
+                   'income': '3000.00', 'credit_score': 700, 'address': 'Somewhere'}
+        response = self.client.post('/api/customers/?fields=id', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['email'], 'new@example.com')
+
+
+class FastListParityTests(APITestCase):
+    """The .values() list path must produce the same bytes as CustomerSerializer."""
+
+    def setUp(self):
+        make_customers(20)
+        Customer.objects.create(
+            first_name='Zoë', last_name='O\'Brien \u2028"quoted"', email='zoe@example.com',
+            income=Decimal('1234.57'), credit_score=850, phone_number='+44 20 7946 0958', address=None,
+        )
+        Customer.objects.create(first_name='Min', last_name='Income', email='min@example.com',
+                                income=Decimal('0.01'), credit_score=300)
+
+    def expected(self, queryset, fields=None):
+        serializer = CustomerSerializer(queryset, many=True)
+        data = serializer.data
+        if fields:
+            data = [{name: row[name] for name in row if name in fields} for row in data]
+        return JSONRenderer().render(data)
+
+    def test_rows_render_identically(self):
+        queryset = Customer.objects.all()
+        fast = values_list_data(CustomerSerializer(), queryset)
+        self.assertEqual(JSONRenderer().render(fast), self.expected(queryset))
+        self.assertEqual(FastJSONRenderer().render(fast), self.expected(queryset))
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(fast), self.expected(queryset))
+
+    def test_floats(self):
+        same = {'ratio': 0.5, 'small': 0.0001234, 'big': 1.5e300, 'whole': 100.0, 'negative': -0.0}
+        self.assertEqual(FastJSONRenderer().render(same), JSONRenderer().render(same))
+        # Below 1e-4 only the notation differs
+        tiny = {'loss': 1e-05, 'rate': -9.99e-05, 'least': 5e-324}
+        fast = FastJSONRenderer().render(tiny)
+        self.assertEqual(json.loads(fast), tiny)
+        if renderers.orjson is not None:
+            self.assertEqual(fast, b'{"loss":0.00001,"rate":-0.0000999,"least":5e-324}')
+            self.assertEqual(FastJSONRenderer().render([float('nan'), float('inf')]), b'[null,null]')
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(tiny), JSONRenderer().render(tiny))
+
+    def test_list_endpoint_matches_serializer(self):
+        response = self.client.get('/api/customers/?page_size=1000')
+        results = JSONRenderer().render(response.json()['results'])
+        self.assertEqual(results, self.expected(Customer.objects.order_by('-created_at', '-id')))
+
+        response = self.client.get('/api/customers/?page_size=1000&fields=id,full_name,max_loan_amount')
+        results = JSONRenderer().render(response.json()['results'])
+        self.assertEqual(results, self.expected(Customer.objects.order_by('-created_at', '-id'),
+                                                fields={'id', 'full_name', 'max_loan_amount'}))
+
+    def test_list_is_one_query_per_page(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/customers/?page_size=10')
+
+    def test_unsupported_serializers_use_the_regular_path(self):
+        from partners.serializers import PartnerSerializer
+        self.assertIsNotNone(ValuesRepresentation.for_serializer(CustomerSerializer()))
+        self.assertIsNone(ValuesRepresentation.for_serializer(PartnerSerializer()))
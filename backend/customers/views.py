@@ -1,14 +1,24 @@
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import viewsets, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from app.exports import ExportMixin
+from app.fast_lists import ValuesListMixin, values_list_data
+from app.query_params import boolean_param
+from app.response_cache import cached_response
 from .models import Customer
 from .serializers import CustomerSerializer
-from loans.models import Loan
-from loans.serializers import LoanSerializer
+from loans import affordability, archive
+from loans.models import ArchivedLoan, Loan
+from loans.serializers import (
+    AffordabilityResultSerializer, AffordabilitySerializer, ArchivedLoanSerializer, LoanSerializer,
+)
 from django.shortcuts import get_object_or_404
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(ExportMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing customers.
     Provides standard CRUD operations.
@@ -16,13 +26,64 @@ class CustomerViewSet(viewsets.ModelViewSet):
     serializer_class = CustomerSerializer
     queryset = Customer.objects.all()# show all customers
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        qualified = boolean_param(self.request, 'qualified')
+        if qualified is not None:
+            # ?loan_amount= narrows the check to a specific loan size
+            loan_amount = self.request.query_params.get('loan_amount')
+            try:
+                loan_amount = Decimal(loan_amount) if loan_amount else None
+            except InvalidOperation:
+                loan_amount = Decimal('NaN')
+            if loan_amount is not None and not loan_amount.is_finite():
+                raise ValidationError({'loan_amount': ['A valid number is required.']})
+            if qualified:
+                queryset = queryset.eligible_for(loan_amount)
+            else:
+                eligible = Customer.objects.eligible_for(loan_amount)
+                queryset = queryset.exclude(pk__in=eligible.values('pk'))
+        return queryset
+
+    @action(detail=False, methods=['get'], url_path='export', streaming_export=True)
+    def export(self, request, *args, **kwargs):
+        """
+        Stream every customer as CSV (default) or NDJSON, in id order.
+        Endpoint: GET /customers/export?format=csv|ndjson
+        Filters: created_at__gte/__lte/__gt/__lt, qualified, ?fields=
+        """
+        return self.export_response(self.get_queryset(), self.get_serializer(), 'customers')
+
+    @action(detail=False, methods=['post'], url_path='affordability')
+    def customer_affordability(self, request, *args, **kwargs):
+        """
+        Largest affordable loan per term for a list of customers, from a monthly
+        payment ceiling (payment_to_income of their income, or max_monthly_payment).
+        Endpoint: POST /customers/affordability
+        Expected data: customer_ids, optional annual_rate, term_months,
+        payment_to_income, max_monthly_payment and loan_amount (adds min_term_months)
+        """
+        serializer = AffordabilitySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if 'customer_ids' not in serializer.validated_data:
+            return Response({'customer_ids': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        results = affordability.for_customers(Customer.objects.all(), serializer.validated_data)
+        return Response(AffordabilityResultSerializer(results, many=True).data)
+
     @action(detail=True, methods=['get'], url_path='loanoffers')
+    @cached_response('customer-loanoffers')
     def get_loan_offers(self, request, pk=None):
         """
         Get al loan offers for a specific customer.
         Endpoint: GET /customers/{id}/loanoffers
+        (the frontend reads the async, streamed GET /async/customers/{id}/loanoffers)
+        ?include_archived=true also returns the offers moved to the archive
+        (loans.archive), newest first among the rest, with archived_at and reason.
         """
         customer = self.get_object()
         loans = Loan.objects.filter(customer=customer)
-        serializer = LoanSerializer(loans, many=True)
-        return Response(serializer.data)
+        if boolean_param(request, 'include_archived'):
+            return Response(archive.with_archived(
+                loans, ArchivedLoan.objects.filter(customer=customer), LoanSerializer(), ArchivedLoanSerializer()))
+        return Response(values_list_data(LoanSerializer(), loans))
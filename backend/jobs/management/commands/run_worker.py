@@ -0,0 +1,36 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.queue import DEFAULT_VISIBILITY_TIMEOUT
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs on a local process pool. Start as many workers as you like; "
+        "SIGTERM/SIGINT finish the running jobs and exit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=None,
+                            help="Pool size (default: CPU count; 0 runs jobs in this process)")
+        parser.add_argument("--visibility-timeout", type=int, default=DEFAULT_VISIBILITY_TIMEOUT,
+                            help="Seconds before another worker may reclaim a job whose lease was not renewed")
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument("--burst", action="store_true", help="Exit once no job is due")
+        parser.add_argument("--max-jobs", type=int, default=None, help="Exit after this many jobs")
+
+    def handle(self, *args, **options):
+        if options["processes"] is not None and options["processes"] < 0:
+            raise CommandError("--processes must be 0 or more")
+        if options["visibility_timeout"] < 3:
+            raise CommandError("--visibility-timeout must be at least 3 seconds")
+
+        worker = Worker(options["processes"], options["visibility_timeout"], options["poll_interval"],
+                        stdout=self.stdout)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(f"Worker {worker.worker_id} started with {worker.processes} process(es)")
+        processed = worker.run(burst=options["burst"], max_jobs=options["max_jobs"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)"))
@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    One unit of background work, run by `manage.py run_worker` (see jobs.queue).
+    A running job belongs to the worker named in locked_by until locked_until;
+    after that any worker may claim it again, so handlers must be safe to rerun.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)  # registered handler, e.g. 'partners.requote_loans'
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        db_table = 'job_table'
+        verbose_name = 'Job'
+        indexes = [
+            models.Index(fields=['status', 'run_after']),  # claiming queued jobs
+            models.Index(fields=['status', 'locked_until']),  # reclaiming expired leases
+            models.Index(fields=['created_at', 'id']),  # cursor pagination
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} {self.name} ({self.status})"
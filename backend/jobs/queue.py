@@ -0,0 +1,116 @@
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from jobs.models import Job
+
+
+# A database-backed job queue; no broker needed.
+#
+# Workers claim a job with a conditional UPDATE (status and lease checked in
+# the WHERE clause), so exactly one of several competing workers wins on any
+# database. A claim is a lease: the worker extends locked_until while the job
+# runs, and a job whose lease ran out (the worker crashed or was killed) is
+# claimed again by the next worker. Delivery is therefore at-least-once;
+# completion is only recorded by the worker that still holds the lease.
+#
+# Handlers are plain functions registered by name and called with the job's
+# payload as keyword arguments; their return value (JSON) becomes the result.
+
+DEFAULT_VISIBILITY_TIMEOUT = 300
+RETRY_DELAY = 30  # seconds, doubled for every failed attempt
+
+handlers = {}
+
+
+def register(name):
+    """Register a function as the handler for jobs called `name`."""
+    def decorator(function):
+        handlers[name] = function
+        return function
+    return decorator
+
+
+def enqueue(name, max_attempts=3, **payload):
+    """Queue a job. Inside a transaction, workers see it once that commits."""
+    if name not in handlers:
+        raise KeyError(f"No job handler registered for {name!r}")
+    job = Job(name=name, payload=payload, max_attempts=max_attempts)
+    job.save()
+    return job
+
+
+def _claimable(now):
+    return (
+        Q(status=Job.QUEUED, run_after__lte=now)
+        | Q(status=Job.RUNNING, locked_until__lt=now)
+    )
+
+
+def claim(worker_id, limit=1, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+    """Lease up to `limit` due jobs to worker_id. Returns the claimed Job rows."""
+    now = timezone.now()
+    claimed = []
+    candidates = Job.objects.filter(_claimable(now)).order_by('run_after', 'id').values_list('id', flat=True)
+    for job_id in candidates[:limit * 4]:
+        won = Job.objects.filter(_claimable(now), pk=job_id).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_until=now + timedelta(seconds=visibility_timeout),
+            attempts=F('attempts') + 1, started_at=now,
+        )
+        if won:
+            job = Job.objects.get(pk=job_id)
+            if job.attempts > job.max_attempts:
+                # Lease expired on its last attempt; the worker died mid-run
+                _finish(job, worker_id, Job.FAILED, error=job.error or 'Lease expired; worker lost')
+                continue
+            claimed.append(job)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def extend(job_ids, worker_id, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+    """Renew the leases this worker still holds. Returns the number renewed."""
+    return Job.objects.filter(pk__in=job_ids, status=Job.RUNNING, locked_by=worker_id).update(
+        locked_until=timezone.now() + timedelta(seconds=visibility_timeout)
+    )
+
+
+def _finish(job, worker_id, status, **fields):
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=worker_id).update(
+        status=status, locked_by='', locked_until=None, finished_at=timezone.now(), **fields
+    )
+
+
+def complete(job, worker_id, result):
+    return _finish(job, worker_id, Job.SUCCEEDED, result=result, error='')
+
+
+def fail(job, worker_id, error):
+    """Requeue with backoff while attempts remain, otherwise mark the job failed."""
+    if job.attempts < job.max_attempts:
+        return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=worker_id).update(
+            status=Job.QUEUED, locked_by='', locked_until=None, error=error,
+            run_after=timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1)),
+        )
+    return _finish(job, worker_id, Job.FAILED, error=error)
+
+
+def execute(job_id):
+    """
+    Run one claimed job's handler and return its result. Called in the worker's
+    pool processes, so it reloads the job rather than receiving the instance.
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        return handlers[job.name](**job.payload)
+    finally:
+        close_old_connections()
+
+
+def format_error(exc):
+    return ''.join(traceback.format_exception_only(type(exc), exc)).strip()
@@ -0,0 +1,17 @@
+from rest_framework import serializers
+from jobs.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'name', 'status', 'payload', 'result', 'error', 'attempts', 'max_attempts',
+                  'created_at', 'started_at', 'finished_at', 'status_url')
+        read_only_fields = fields
+
+    def get_status_url(self, obj):
+        request = self.context.get('request')
+        path = f'/api/jobs/{obj.pk}/'
+        return request.build_absolute_uri(path) if request is not None else path
@@ -0,0 +1,146 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from customers.models import Customer
+from jobs import queue, worker
+from jobs.models import Job
+from jobs.worker import Worker
+from loans.models import Loan
+from partners.models import Partner
+
+calls = []
+
+
+@queue.register('tests.echo')
+def echo(**payload):
+    calls.append(payload)
+    return payload
+
+
+@queue.register('tests.flaky')
+def flaky(failures):
+    calls.append(failures)
+    if len(calls) <= failures:
+        raise ValueError(f'attempt {len(calls)} failed')
+    return 'ok'
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_runs_queued_jobs(self):
+        jobs = [queue.enqueue('tests.echo', n=n) for n in range(3)]
+        self.assertEqual(Worker(processes=0).run(burst=True), 3)
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.result, job.attempts), (Job.SUCCEEDED, job.payload, 1))
+            self.assertEqual(job.locked_by, '')
+        self.assertEqual(calls, [{'n': 0}, {'n': 1}, {'n': 2}])
+
+    @mock.patch('jobs.worker.os.cpu_count', return_value=8)
+    @mock.patch('jobs.worker.connections')
+    def test_pool_processes_share_the_cpus(self, connections, cpu_count):
+        self.assertEqual(worker.cpu_share(), 8)
+        try:
+            for processes, share in ((8, 1), (3, 2), (1, 8), (16, 1)):
+                worker._init_process(processes)
+                self.assertEqual(worker.cpu_share(), share)
+        finally:
+            worker.pool_processes = 1
+
+    def test_unknown_handler_is_rejected(self):
+        with self.assertRaises(KeyError):
+            queue.enqueue('tests.missing')
+
+    @mock.patch.object(queue, 'RETRY_DELAY', 0)
+    def test_failures_are_retried_then_marked_failed(self):
+        job = queue.enqueue('tests.flaky', failures=1)
+        Worker(processes=0).run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts), (Job.SUCCEEDED, 'ok', 2))
+
+        calls.clear()
+        job = queue.enqueue('tests.flaky', max_attempts=2, failures=5)
+        Worker(processes=0).run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('attempt 2 failed', job.error)
+
+    def test_failed_attempt_backs_off(self):
+        job = queue.enqueue('tests.flaky', failures=1)
+        Worker(processes=0).run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_after, timezone.now())
+
+    def test_expired_lease_is_reclaimed(self):
+        job = queue.enqueue('tests.echo')
+        [claimed] = queue.claim('crashed-worker')
+        self.assertEqual(queue.claim('other-worker'), [])
+
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(queue.extend([job.pk], 'other-worker'), 0)
+        [reclaimed] = queue.claim('other-worker')
+        self.assertEqual(reclaimed.attempts, 2)
+        # The crashed worker's late result is dropped; the new lease holder's counts
+        self.assertEqual(queue.complete(claimed, 'crashed-worker', 'stale'), 0)
+        self.assertEqual(queue.complete(reclaimed, 'other-worker', 'fresh'), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.SUCCEEDED, 'fresh'))
+
+    def test_lease_lost_on_last_attempt_fails_the_job(self):
+        job = queue.enqueue('tests.echo', max_attempts=1)
+        queue.claim('crashed-worker')
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(queue.claim('other-worker'), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('Lease expired', job.error)
+
+
+class JobEndpointTests(APITestCase):
+    def setUp(self):
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        self.customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                                income=Decimal('9000.00'), credit_score=720)
+        self.partner.customers.add(self.customer)
+
+    def test_job_status(self):
+        job = queue.enqueue('tests.echo', n=1)
+        response = self.client.get(f'/api/jobs/{job.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'queued')
+        self.assertEqual(self.client.get('/api/jobs/999999/').status_code, 404)
+        self.assertEqual(len(self.client.get('/api/jobs/?status=succeeded').json()['results']), 0)
+
+    def test_requote_runs_in_the_background(self):
+        loans = Loan.objects.bulk_create([
+            Loan(customer=self.customer, loan_amount=Decimal('1000.00'), annual_rate=Decimal(rate), term_months=12)
+            for rate in ('5.00', '7.25')
+        ])
+        Loan.objects.filter(pk=loans[0].pk).update(monthly_payment=Decimal('1.00'))
+
+        response = self.client.post(f'/api/partners/{self.partner.pk}/loanoffers/requote/')
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response['Location'].endswith(f"/api/jobs/{response.json()['id']}/"))
+        Worker(processes=0).run(burst=True)
+
+        job = self.client.get(response['Location']).json()
+        self.assertEqual((job['status'], job['result']), ('succeeded', {'loans': 2, 'updated': 1}))
+        self.assertEqual(Loan.objects.get(pk=loans[0].pk).monthly_payment, Decimal('85.61'))
+
+    def test_generate_in_the_background(self):
+        response = self.client.post(f'/api/partners/{self.partner.pk}/loanoffers/generate/', {
+            'annual_rates': ['5.00', '7.50'], 'term_months': [12, 24], 'loan_amount': '1000.00', 'background': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Loan.objects.exists())
+        Worker(processes=0).run(burst=True)
+        self.assertEqual(Job.objects.get().result, {'offers': 4, 'created': 4})
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 4)
@@ -0,0 +1,27 @@
+from rest_framework import mixins, status, viewsets
+from rest_framework.response import Response
+from .models import Job
+from .serializers import JobSerializer
+
+
+class JobViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Status of background jobs.
+    Endpoint: GET /jobs, GET /jobs/{id} (?status=queued|running|succeeded|failed, ?name=)
+    """
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for field in ('status', 'name'):
+            value = self.request.query_params.get(field)
+            if value is not None:
+                queryset = queryset.filter(**{field: value})
+        return queryset
+
+
+def accepted(job, request):
+    """202 response for an action that queued `job`."""
+    data = JobSerializer(job, context={'request': request}).data
+    return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['status_url']})
@@ -0,0 +1,138 @@
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.apps import apps
+from django.db import connections
+
+from jobs import queue
+
+
+# Processes in the pool of the worker this process belongs to; 1 outside a
+# pool (the worker itself with --processes 0, the web server, the shell)
+pool_processes = 1
+
+
+def cpu_share():
+    """
+    The CPUs a job here may use for its own process pool: all of them
+    outside a worker pool, an equal share per pool process inside one, so
+    jobs running side by side do not start cores x cores processes.
+    """
+    return max(1, (os.cpu_count() or 1) // pool_processes)
+
+
+def _init_process(processes=1):
+    # Pool processes may be spawned rather than forked; either way they open
+    # their own database connections
+    global pool_processes
+    pool_processes = processes
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+class Worker:
+    """
+    Claims jobs and runs them on a process pool of `processes` workers
+    (0 runs them inline, in this process). Leases of running jobs are renewed
+    every visibility_timeout / 3 seconds, so only a dead worker loses them.
+    """
+
+    def __init__(self, processes=None, visibility_timeout=queue.DEFAULT_VISIBILITY_TIMEOUT, poll_interval=1.0,
+                 stdout=None):
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.stdout = stdout
+        self.stopping = False
+        self.processed = 0
+        self._pool = None
+        self._running = {}  # future -> Job
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def stop(self, *args):
+        """Finish the running jobs, claim no more."""
+        self.stopping = True
+
+    def _submit(self, job):
+        if self.processes == 0:
+            future = Future()
+            try:
+                future.set_result(queue.execute(job.pk))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+        if self._pool is None:
+            # Children must not inherit the parent's open connections
+            connections.close_all()
+            self._pool = ProcessPoolExecutor(self.processes, initializer=_init_process,
+                                             initargs=(self.processes,))
+        return self._pool.submit(queue.execute, job.pk)
+
+    def _record(self, future, job):
+        try:
+            result = future.result()
+        except BrokenProcessPool as exc:
+            if self._pool is not None:  # a pool process died; start a fresh pool for the next job
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            queue.fail(job, self.worker_id, queue.format_error(exc))
+            self.log(f'job {job.pk} {job.name}: pool process died')
+        except Exception as exc:
+            queue.fail(job, self.worker_id, queue.format_error(exc))
+            self.log(f'job {job.pk} {job.name}: attempt {job.attempts} failed: {queue.format_error(exc)}')
+        else:
+            if queue.complete(job, self.worker_id, result):
+                self.log(f'job {job.pk} {job.name}: done')
+            else:
+                self.log(f'job {job.pk} {job.name}: lease lost, result dropped')
+        self.processed += 1
+
+    def run(self, burst=False, max_jobs=None):
+        """
+        Process jobs until stop() is called, or, with burst=True, until no job
+        is due. Returns the number of jobs processed.
+        """
+        renew_every = self.visibility_timeout / 3
+        renewed_at = time.monotonic()
+        try:
+            while True:
+                for future in [future for future in self._running if future.done()]:
+                    self._record(future, self._running.pop(future))
+
+                if self._running and time.monotonic() - renewed_at >= renew_every:
+                    queue.extend([job.pk for job in self._running.values()], self.worker_id,
+                                  self.visibility_timeout)
+                    renewed_at = time.monotonic()
+
+                capacity = max(self.processes, 1) - len(self._running)
+                if max_jobs is not None:
+                    capacity = min(capacity, max_jobs - self.processed - len(self._running))
+                claimed = []
+                if capacity > 0 and not self.stopping:
+                    claimed = queue.claim(self.worker_id, capacity, self.visibility_timeout)
+                for job in claimed:
+                    self.log(f'job {job.pk} {job.name}: attempt {job.attempts}')
+                    self._running[self._submit(job)] = job
+
+                if not self._running:
+                    if self.stopping or (burst and not claimed) or (max_jobs is not None
+                                                                    and self.processed >= max_jobs):
+                        return self.processed
+                    if not claimed:
+                        time.sleep(self.poll_interval)
+                    continue
+                wait(self._running, timeout=min(self.poll_interval, renew_every), return_when=FIRST_COMPLETED)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
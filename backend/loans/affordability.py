@@ -0,0 +1,145 @@
+import functools
+from decimal import ROUND_FLOOR, Decimal
+
+import numpy as np
+
+from customers.models import INCOME_TO_LOAN_MULTIPLE, MIN_CREDIT_SCORE
+from loans.amortization import CENT
+
+
+# Affordability: the inverse of the amortization formula.
+#
+# With a monthly payment ceiling M, an offer of principal P at monthly rate r
+# over n months is affordable when P <= M * a(r, n), a(r, n) being the annuity
+# factor (1 - (1 + r)^-n) / r. So the largest principal for a term is
+# M * a(r, n), and the shortest term for a principal is the smallest n with
+# a(r, n) >= P / M:
+#
+#     n = ceil(-log(1 - P * r / M) / log(1 + r))     (P / M months at r = 0)
+#
+# Rates are validated to two decimals between 0 and 100 and terms to
+# 1..600 months, so a(r, n) for every allowed pair sits in one precomputed
+# table; a whole customer list is then a few array operations.
+
+RATE_SCALE = 100  # table rows per percentage point: rates have two decimals
+MAX_RATE = 100
+MAX_TERM = 600
+
+# Default ceiling on the monthly payment as a share of monthly income
+PAYMENT_TO_INCOME = Decimal('0.35')
+
+
+@functools.cache
+def annuity_factors():
+    """
+    The read-only (MAX_RATE * RATE_SCALE + 1) x MAX_TERM table of a(r, n):
+    row i is an annual rate of i / RATE_SCALE percent, column j a term of
+    j + 1 months. Built once per process, on first use.
+    """
+    monthly = np.arange(MAX_RATE * RATE_SCALE + 1, dtype=np.float64) / (RATE_SCALE * 1200)
+    terms = np.arange(1, MAX_TERM + 1, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table = -np.expm1(-np.log1p(monthly)[:, None] * terms) / monthly[:, None]
+    table[0] = terms
+    table.flags.writeable = False
+    return table
+
+
+def _rate_rows(annual_rates):
+    return np.rint(np.asarray(annual_rates, dtype=np.float64) * RATE_SCALE).astype(np.intp)
+
+
+def _cents(amounts):
+    """Floats rounded down to the cent (a hair of float error is forgiven) as Decimals."""
+    cents = np.floor(np.asarray(amounts, dtype=np.float64) * 100 + 1e-6).astype(np.int64)
+    return [Decimal(c).scaleb(-2) for c in cents.tolist()]
+
+
+def payment_ceiling(income, payment_to_income=PAYMENT_TO_INCOME):
+    """Highest monthly payment a monthly income allows, to the cent."""
+    return (income * payment_to_income).quantize(CENT, rounding=ROUND_FLOOR)
+
+
+def max_principals(payments, annual_rate, term_months):
+    """
+    Largest principal each payment ceiling affords at one rate for each term:
+    a len(payments) x len(term_months) array of floats.
+    """
+    factors = annuity_factors()[_rate_rows(annual_rate), np.asarray(term_months, dtype=np.intp) - 1]
+    return np.asarray(payments, dtype=np.float64)[:, None] * factors
+
+
+def min_terms(principals, payments, annual_rate):
+    """
+    Shortest term in months at which each principal's payment stays within
+    its ceiling, or 0 where no term up to MAX_TERM does.
+    """
+    principals = np.asarray(principals, dtype=np.float64)
+    payments = np.asarray(payments, dtype=np.float64)
+    rate_row = _rate_rows(annual_rate)
+    row = annuity_factors()[rate_row]
+    monthly = rate_row / (RATE_SCALE * 1200)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        needed = principals / payments
+        if monthly:
+            terms = -np.log1p(-needed * monthly) / np.log1p(monthly)
+        else:
+            terms = needed
+    terms = np.ceil(np.nan_to_num(terms, nan=MAX_TERM + 1, posinf=MAX_TERM + 1))
+    terms = np.clip(terms, 1, MAX_TERM + 1).astype(np.intp)
+    # The closed form can land one month off in float; settle it on the table
+    padded = np.concatenate([[0.0], row, [np.inf]])
+    terms += padded[terms] < needed
+    terms -= (terms > 1) & (padded[terms - 1] >= needed)
+    return np.where(terms > MAX_TERM, 0, terms)
+
+
+def affordability(customers, annual_rate, term_months, payment_to_income=PAYMENT_TO_INCOME,
+                  max_monthly_payment=None, loan_amount=None):
+    """
+    What each customer can borrow, from rows of (id, monthly income, credit
+    score). The payment ceiling is payment_to_income of the income, or
+    max_monthly_payment when given. Each result has the ceiling, the largest
+    principal per term, qualifies_up_to (that largest principal also capped
+    by the income and credit rules of Loan.qualify_for_loan) and, with a
+    loan_amount, the shortest term that fits it (None if none does).
+    """
+    customers = list(customers)
+    if max_monthly_payment is not None:
+        ceilings = [max_monthly_payment] * len(customers)
+    else:
+        ceilings = [payment_ceiling(income, payment_to_income) for _, income, _ in customers]
+    term_months = list(term_months)
+    principals = max_principals(ceilings, annual_rate, term_months)
+    rule_caps = np.array([float(income) * 12 / INCOME_TO_LOAN_MULTIPLE if score >= MIN_CREDIT_SCORE else 0.0
+                          for _, income, score in customers])
+    caps = _cents(np.minimum(principals.max(axis=1, initial=0.0), rule_caps))
+    amounts = _cents(principals.ravel())
+    width = len(term_months)
+    if loan_amount is not None:
+        shortest = min_terms([loan_amount] * len(customers), ceilings, annual_rate).tolist()
+
+    results = []
+    for i, (customer_id, _, _) in enumerate(customers):
+        result = {
+            'customer': customer_id,
+            'max_monthly_payment': ceilings[i],
+            'max_loan_amount': {str(term): amount for term, amount in zip(term_months, amounts[i * width:(i + 1) * width])},
+            'qualifies_up_to': caps[i],
+        }
+        if loan_amount is not None:
+            result['min_term_months'] = shortest[i] or None
+        results.append(result)
+    return results
+
+
+def for_customers(customers, options):
+    """
+    affordability() for a Customer queryset, narrowed to options['customer_ids']
+    if present, with the other options of a validated AffordabilitySerializer.
+    """
+    options = dict(options)
+    if 'customer_ids' in options:
+        customers = customers.filter(id__in=options.pop('customer_ids'))
+    rows = customers.order_by('id').values_list('id', 'income', 'credit_score')
+    return affordability(rows.iterator(chunk_size=2000), **options)
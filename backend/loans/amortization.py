@@ -0,0 +1,107 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+import numpy as np
+
+
+# Amortization math shared by Loan.monthly_payments and the list serializers.
+
+CENT = Decimal('0.01')
+TWELVE_HUNDRED = Decimal('1200')
+
+# A float payment whose cent fraction lands this close to .5 is re-done in Decimal
+ROUNDING_TOLERANCE = 1e-6
+
+
+def _to_decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def monthly_payment(loan_amount, annual_rate, term_months):
+    """Calculate monthly payment using standard amortization formula."""
+    try:
+        P = _to_decimal(loan_amount)
+        r = _to_decimal(annual_rate) / TWELVE_HUNDRED
+        n = int(term_months)
+
+        if r == 0:
+            # If interest rate is 0, simply divide loan by term
+            return P / n
+
+        # Standard amortization formula: M = P * (r * (1 + r)^n) / ((1 + r)^n - 1)
+        growth = (1 + r) ** n
+        return P * (r * growth / (growth - 1))
+    except (ZeroDivisionError, ValueError, TypeError, InvalidOperation):
+        return Decimal('0.00')
+
+
+def batch_monthly_payments(loan_amounts, annual_rates, term_months):
+    """
+    Calculate monthly payments for many loans in one NumPy pass.
+    Returns a float64 array; rows with an invalid term get 0.
+    """
+    P = np.asarray(loan_amounts, dtype=np.float64)
+    r = np.asarray(annual_rates, dtype=np.float64) / 1200.0
+    n = np.asarray(term_months, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        growth = np.power(1.0 + r, n)
+        payments = np.where(r == 0, P / n, P * r * growth / (growth - 1.0))
+    return np.where(np.isfinite(payments) & (n > 0), payments, 0.0)
+
+
+def batch_monthly_payments_rounded(loan_amounts, annual_rates, term_months):
+    """
+    Calculate monthly payments rounded to the cent, matching what
+    serializers.DecimalField(decimal_places=2) renders for monthly_payment().
+    Rows whose float result is too close to a half cent to round safely
+    are recomputed exactly in Decimal.
+    """
+    loan_amounts = list(loan_amounts)
+    annual_rates = list(annual_rates)
+    term_months = list(term_months)
+    if not loan_amounts:
+        return []
+
+    count = len(loan_amounts)
+    P = np.fromiter(map(float, loan_amounts), dtype=np.float64, count=count)
+    rates = np.fromiter(map(float, annual_rates), dtype=np.float64, count=count)
+    n = np.fromiter((t or 0 for t in term_months), dtype=np.float64, count=count)
+
+    cents = batch_monthly_payments(P, rates, n) * 100
+    fraction = cents - np.floor(cents)
+    ambiguous = np.abs(fraction - 0.5) <= ROUNDING_TOLERANCE + 1e-12 * np.abs(cents)
+
+    results = [Decimal(c).scaleb(-2) for c in np.rint(cents).astype(np.int64).tolist()]
+    for i in np.flatnonzero(ambiguous).tolist():
+        exact = monthly_payment(loan_amounts[i], annual_rates[i], term_months[i])
+        results[i] = exact.quantize(CENT, rounding=ROUND_HALF_EVEN)
+    return results
+
+
+def amortization_schedule(loan_amount, annual_rate, term_months):
+    """
+    Yield the month-by-month schedule as dicts of month, payment, principal,
+    interest and balance, all rounded to the cent. The last payment absorbs
+    the rounding residue so the balance ends at exactly zero.
+    """
+    balance = _to_decimal(loan_amount).quantize(CENT, rounding=ROUND_HALF_EVEN)
+    r = _to_decimal(annual_rate) / TWELVE_HUNDRED
+    n = int(term_months)
+    payment = monthly_payment(loan_amount, annual_rate, n).quantize(CENT, rounding=ROUND_HALF_EVEN)
+
+    for month in range(1, n + 1):
+        interest = (balance * r).quantize(CENT, rounding=ROUND_HALF_EVEN)
+        if month == n:
+            principal = balance
+        else:
+            principal = min(payment - interest, balance)
+        balance -= principal
+        yield {
+            'month': month,
+            'payment': principal + interest,
+            'principal': principal,
+            'interest': interest,
+            'balance': balance,
+        }
@@ -0,0 +1,133 @@
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Case, CharField, DateTimeField, Exists, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from app import response_cache
+from app.fast_lists import ValuesRepresentation
+from loans.models import ArchivedLoan, Loan
+from partners import portfolio
+
+
+# Retention of loan offers.
+#
+# loan_table only grows, so offers that are no longer live move to
+# loan_archive_table (ArchivedLoan) in id-ordered chunks:
+#
+#   - age: created more than older_than_days ago;
+#   - superseded: the customer was offered the same amount over the same
+#     term again more than SUPERSEDED_GRACE later (a requote). Offers
+#     generated together, e.g. one grid of rates, do not supersede each
+#     other.
+#
+# Each chunk is copied, deleted from loan_table and taken out of the partner
+# portfolios in one transaction, so an interrupted run leaves every offer in
+# exactly one of the two tables and the next run carries on. The hot table
+# then holds about the last older_than_days of offers, whatever the history.
+#
+# Archived offers keep their ids. GET /customers/{id}/loanoffers reads them
+# back with ?include_archived=true (see with_archived).
+
+CHUNK_SIZE = 5000
+SUPERSEDED_GRACE = timedelta(days=1)
+COLUMNS = ('id', 'customer_id', 'loan_amount', 'annual_rate', 'term_months', 'monthly_payment',
+           'issue_date', 'created_at', 'updated_at')
+
+
+def candidates(older_than_days=None, superseded=False, grace=SUPERSEDED_GRACE, now=None):
+    """
+    The Loan queryset of offers to archive, annotated with archive_reason
+    (ArchivedLoan.AGE wins when both apply). Neither criterion matches nothing.
+    """
+    now = now or timezone.now()
+    reasons = []
+    if older_than_days is not None:
+        reasons.append((Q(created_at__lt=now - timedelta(days=older_than_days)), ArchivedLoan.AGE))
+    if superseded:
+        requoted = Loan.objects.filter(
+            customer_id=OuterRef('customer_id'), loan_amount=OuterRef('loan_amount'),
+            term_months=OuterRef('term_months'), created_at__gt=OuterRef('created_at') + grace,
+        )
+        reasons.append((Q(Exists(requoted)), ArchivedLoan.SUPERSEDED))
+    if not reasons:
+        return Loan.objects.none()
+    matching = Q()
+    for condition, _ in reasons:
+        matching |= condition
+    return Loan.objects.filter(matching).annotate(archive_reason=Case(
+        *(When(condition, then=Value(reason)) for condition, reason in reasons), output_field=CharField(),
+    ))
+
+
+def _archive_chunk(loans, ids, now):
+    """Move the offers of loans (a candidates() queryset) among ids. Returns their reasons."""
+    with transaction.atomic():
+        # Read again inside the transaction: what is copied is what gets deleted
+        rows = list(loans.filter(pk__in=ids).select_for_update().order_by()
+                    .values_list('id', 'customer_id', 'archive_reason'))
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+        totals = portfolio.loan_totals_by_partner(Loan.objects.filter(pk__in=ids))
+        # Copied in the database with INSERT ... SELECT; building ArchivedLoan
+        # instances for bulk_create costs more than the rest of the chunk
+        select = loans.filter(pk__in=ids).order_by().annotate(
+            archived=Value(now, output_field=DateTimeField()),
+        ).values(*COLUMNS, 'archived', 'archive_reason')
+        sql, params = select.query.sql_with_params()
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(column) for column in (*COLUMNS, 'archived_at', 'reason'))
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {quote(ArchivedLoan._meta.db_table)} ({columns}) {sql}', params)
+            # One DELETE, not QuerySet.delete(): its pre_delete signals would take
+            # every loan out of the portfolios again, one query at a time. Nothing
+            # references loans with a constraint; portfolios and caches are done here
+            cursor.execute(f'DELETE FROM {quote(Loan._meta.db_table)} WHERE {quote("id")} IN '
+                           f'({", ".join(["%s"] * len(ids))})', ids)
+        portfolio.apply_deltas(totals, sign=-1)
+    response_cache.invalidate('customer-loanoffers', *{row[1] for row in rows})
+    return [row[2] for row in rows]
+
+
+def archive(older_than_days=None, superseded=False, grace=SUPERSEDED_GRACE, chunk_size=CHUNK_SIZE,
+            progress=None):
+    """
+    Move the candidates() offers to the archive. progress, if given, is
+    called with the counts so far after every chunk. Returns the counts of
+    offers archived per reason and the rate.
+    """
+    now = timezone.now()
+    loans = candidates(older_than_days, superseded, grace, now)
+    counts = {ArchivedLoan.AGE: 0, ArchivedLoan.SUPERSEDED: 0}
+    start = time.perf_counter()
+    last_id = 0
+    while True:
+        ids = list(loans.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        for reason in _archive_chunk(loans, ids, now):
+            counts[reason] += 1
+        if progress is not None:
+            progress(counts)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    return {**counts, 'archived': total, 'rows_per_second': round(total / elapsed, 1) if elapsed else None}
+
+
+def with_archived(loans, archived, serializer, archived_serializer):
+    """
+    serializer's list data for a Loan queryset merged, newest first, with
+    archived_serializer's for an ArchivedLoan queryset.
+    """
+    merged = [*_dated(serializer, loans), *_dated(archived_serializer, archived)]
+    merged.sort(key=lambda pair: pair[0], reverse=True)
+    return [item for _, item in merged]
+
+
+def _dated(serializer, queryset):
+    representation = ValuesRepresentation(serializer)
+    rows = list(representation.values(queryset, 'created_at'))
+    return zip([row['created_at'] for row in rows], representation.represent(rows))
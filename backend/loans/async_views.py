@@ -0,0 +1,37 @@
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.utils.encoders import JSONEncoder
+
+from app.streaming import json_body
+from customers.models import Customer
+from loans.quotes import build_quote, quote_monthly_payments
+from loans.serializers import LoanQuoteResultSerializer, LoanQuoteSerializer
+
+
+@csrf_exempt  # same as the DRF views, which are exempt when unauthenticated
+@require_POST
+async def loan_quote(request):
+    """
+    Async version of LoanOfferViewSet.quote. The customer lookup is the only
+    database access and goes through the async ORM.
+    Endpoint: POST /async/loanoffers/quote
+    """
+    data = json_body(request)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+
+    customer_id = data.pop('customer', None)
+    serializer = LoanQuoteSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400, encoder=JSONEncoder)
+    quote = dict(serializer.validated_data)
+    if customer_id is not None:
+        try:
+            quote['customer'] = await Customer.objects.aget(pk=customer_id)
+        except (Customer.DoesNotExist, ValueError, TypeError):
+            return JsonResponse({'customer': [f'Invalid pk "{customer_id}" - object does not exist.']},
+                                status=400)
+
+    [payment] = quote_monthly_payments([(quote['loan_amount'], quote['annual_rate'], quote['term_months'])])
+    return JsonResponse(LoanQuoteResultSerializer(build_quote(quote, payment)).data, encoder=JSONEncoder)
@@ -0,0 +1,13 @@
+from jobs.queue import register
+from loans.models import RepricingRun
+from loans.repricing import reprice
+from loans.serializers import RepricingRunSerializer
+
+
+# Background handlers for loan-wide work (see jobs.queue).
+
+
+@register('loans.reprice')
+def reprice_loans(run_id):
+    """Apply a queued RepricingRun; a rerun resumes where the last attempt stopped."""
+    return RepricingRunSerializer(reprice(RepricingRun.objects.get(pk=run_id))).data
@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from loans import archive
+from loans.models import ArchivedLoan
+
+
+class Command(BaseCommand):
+    help = (
+        "Move loan offers older than --older-than-days (default LOAN_RETENTION_DAYS) and, with "
+        "--superseded, offers requoted for the same amount and term, from loan_table to the archive "
+        "in chunks. GET /customers/{id}/loanoffers?include_archived=true still returns them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=settings.LOAN_RETENTION_DAYS)
+        parser.add_argument("--no-age", action="store_true", help="Only archive superseded offers")
+        parser.add_argument("--superseded", action="store_true",
+                            help="Also archive offers requoted more than --grace-hours later")
+        parser.add_argument("--grace-hours", type=float, default=archive.SUPERSEDED_GRACE.total_seconds() / 3600)
+        parser.add_argument("--chunk-size", type=int, default=archive.CHUNK_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the offers to archive")
+
+    def handle(self, *args, **options):
+        older_than_days = None if options["no_age"] else options["older_than_days"]
+        if older_than_days is not None and older_than_days < 0:
+            raise CommandError("--older-than-days must be zero or more")
+        if older_than_days is None and not options["superseded"]:
+            raise CommandError("Nothing to archive: --no-age needs --superseded")
+        criteria = {
+            "older_than_days": older_than_days,
+            "superseded": options["superseded"],
+            "grace": timedelta(hours=options["grace_hours"]),
+        }
+
+        if options["dry_run"]:
+            counts = dict.fromkeys((ArchivedLoan.AGE, ArchivedLoan.SUPERSEDED), 0)
+            for reason in archive.candidates(**criteria).values_list("archive_reason", flat=True).iterator():
+                counts[reason] += 1
+            self.stdout.write(f"{sum(counts.values())} offer(s) to archive: {counts[ArchivedLoan.AGE]} by age, "
+                              f"{counts[ArchivedLoan.SUPERSEDED]} superseded")
+            return
+
+        start = time.perf_counter()
+
+        def progress(counts):
+            self.stdout.write(f"  {sum(counts.values())} archived", ending="\r")
+            self.stdout.flush()
+
+        result = archive.archive(**criteria, chunk_size=options["chunk_size"], progress=progress)
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result['archived']} offer(s): {result[ArchivedLoan.AGE]} by age, "
+            f"{result[ArchivedLoan.SUPERSEDED]} superseded, in {time.perf_counter() - start:.1f}s "
+            f"({result['rows_per_second'] or 0:,.0f} rows/s)"
+        ))
@@ -0,0 +1,55 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from loans.amortization import batch_monthly_payments_rounded
+from loans.models import Loan
+
+
+class Command(BaseCommand):
+    help = "Compare Loan.monthly_payments with the batch amortization engine."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[1_000, 100_000, 1_000_000],
+            help="Number of loans to price per run",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        for size in options["sizes"]:
+            # Unsaved instances: this measures the math, not the database
+            loans = [
+                Loan(
+                    loan_amount=Decimal(rng.randint(10_000, 10_000_000)).scaleb(-2),
+                    annual_rate=Decimal(rng.randint(0, 3000)).scaleb(-2),
+                    term_months=rng.choice([12, 24, 36, 60, 120, 240, 360, 600]),
+                )
+                for _ in range(size)
+            ]
+
+            start = time.perf_counter()
+            per_row = [loan.monthly_payments for loan in loans]
+            property_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            batched = batch_monthly_payments_rounded(
+                [loan.loan_amount for loan in loans],
+                [loan.annual_rate for loan in loans],
+                [loan.term_months for loan in loans],
+            )
+            batch_seconds = time.perf_counter() - start
+
+            mismatches = sum(
+                1 for exact, fast in zip(per_row, batched)
+                if exact.quantize(Decimal("0.01")) != fast
+            )
+            self.stdout.write(
+                f"{size:>9} loans  property {property_seconds:8.3f}s  "
+                f"batch {batch_seconds:8.3f}s  "
+                f"speedup {property_seconds / batch_seconds:6.1f}x  "
+                f"mismatches {mismatches}"
+            )
@@ -0,0 +1,54 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from customers.models import Customer
+from loans.models import Loan
+
+
+class Command(BaseCommand):
+    help = "Compare per-loan qualify_for_loan() with Loan.objects.with_eligibility()."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1_000, 10_000])
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        for size in options["sizes"]:
+            # Seed inside a transaction that is rolled back afterwards
+            with transaction.atomic():
+                customers = Customer.objects.bulk_create([
+                    Customer(
+                        first_name=f"Bench{i}", last_name="Eligibility", email=f"bench{i}@example.com",
+                        income=Decimal(rng.randint(100_000, 1_500_000)).scaleb(-2),
+                        credit_score=rng.randint(300, 850), address=f"{i} Benchmark St",
+                    )
+                    for i in range(size)
+                ])
+                Loan.objects.bulk_create([
+                    Loan(customer=customer, loan_amount=Decimal(rng.randint(100_000, 10_000_000)).scaleb(-2))
+                    for customer in customers
+                ])
+
+                with CaptureQueriesContext(connection) as python_queries:
+                    start = time.perf_counter()
+                    python_count = sum(1 for loan in Loan.objects.all() if loan.qualify_for_loan())
+                    python_seconds = time.perf_counter() - start
+
+                with CaptureQueriesContext(connection) as sql_queries:
+                    start = time.perf_counter()
+                    sql_count = Loan.objects.qualified().count()
+                    sql_seconds = time.perf_counter() - start
+
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{size:>7} loans  python {python_seconds:7.3f}s {len(python_queries):>6} queries  "
+                f"sql {sql_seconds:7.3f}s {len(sql_queries):>2} queries  "
+                f"qualified {python_count}/{sql_count}"
+            )
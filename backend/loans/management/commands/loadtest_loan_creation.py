@@ -0,0 +1,73 @@
+import statistics
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from customers.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent POST /api/loanoffers requests at the configured database "
+        "and report throughput, latency and errors. Run once per DB_ENGINE to compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=50, help="Requests per thread")
+
+    def handle(self, *args, **options):
+        threads, per_thread = options["threads"], options["requests"]
+        customer = Customer.objects.create(
+            first_name="Load", last_name="Test", email=f"loadtest-{time.time_ns()}@example.com",
+            income=Decimal("100000.00"), credit_score=800, address="Load test",
+        )
+        latencies, statuses = [], {}
+        lock = threading.Lock()
+
+        def worker(worker_id):
+            client = Client(HTTP_HOST="localhost")
+            try:
+                for i in range(per_thread):
+                    payload = {
+                        "customer": customer.id,
+                        # Unique per request so the constraint never rejects one
+                        "loan_amount": f"{1000 + worker_id * per_thread + i}.00",
+                        "interest_rate": "7.50",
+                        "term_months": 60,
+                    }
+                    start = time.perf_counter()
+                    try:
+                        status = client.post("/api/loanoffers/", payload, content_type="application/json").status_code
+                    except Exception as e:
+                        status = type(e).__name__
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[status] = statuses.get(status, 0) + 1
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        customer.delete()
+        latencies.sort()
+        total = len(latencies)
+        self.stdout.write(
+            f"{settings.DATABASES['default']['ENGINE']}  {threads} threads x {per_thread} requests\n"
+            f"  throughput {total / wall:8.1f} req/s  wall {wall:.2f}s\n"
+            f"  latency p50 {statistics.median(latencies) * 1000:.1f}ms  "
+            f"p95 {latencies[int(total * 0.95) - 1] * 1000:.1f}ms  max {latencies[-1] * 1000:.1f}ms\n"
+            f"  statuses {dict(sorted(statuses.items(), key=str))}"
+        )
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loans import repricing
+from loans.models import RepricingRun
+from loans.serializers import RepricingRuleSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Change the annual rate of matching loan offers and recompute their payments in chunked "
+        "UPDATEs, recording old -> new for each loan (e.g. --rate-change 0.5 --credit-score-below 650)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rate-change", required=True, help="Percentage points to add, e.g. 0.5 or -0.25")
+        parser.add_argument("--partner", dest="partner_ids", nargs="+", type=int)
+        parser.add_argument("--customer", dest="customer_ids", nargs="+", type=int)
+        parser.add_argument("--credit-score-below", dest="credit_score_lt", type=int)
+        parser.add_argument("--credit-score-at-least", dest="credit_score_gte", type=int)
+        parser.add_argument("--rate-at-least", dest="annual_rate_gte")
+        parser.add_argument("--rate-at-most", dest="annual_rate_lte")
+        parser.add_argument("--term", dest="term_months", nargs="+", type=int)
+        parser.add_argument("--chunk-size", type=int, default=repricing.CHUNK_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the matching offers")
+        parser.add_argument("--resume", type=int, metavar="RUN_ID", help="Finish an interrupted run")
+
+    def handle(self, *args, **options):
+        if options["resume"] is not None:
+            try:
+                run = RepricingRun.objects.get(pk=options["resume"])
+            except RepricingRun.DoesNotExist:
+                raise CommandError(f"Repricing run {options['resume']} does not exist")
+        else:
+            fields = RepricingRuleSerializer().fields
+            data = {name: options[name] for name in fields if options.get(name) is not None}
+            serializer = RepricingRuleSerializer(data=data)
+            if not serializer.is_valid():
+                raise CommandError(serializer.errors)
+            rule = serializer.to_rule()
+            if options["dry_run"]:
+                self.stdout.write(f"{repricing.matching_loans(rule).count()} offer(s) match {rule}")
+                return
+            run = RepricingRun.objects.create(rule=rule)
+
+        start = time.perf_counter()
+
+        def progress(run):
+            self.stdout.write(
+                f"  {run.updated + run.skipped}/{run.matched} repriced, {run.rows_per_second:,.0f} rows/s",
+                ending="\r",
+            )
+            self.stdout.flush()
+
+        run = repricing.reprice(run, chunk_size=options["chunk_size"], progress=progress)
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Run {run.pk}: {run.updated} repriced, {run.skipped} skipped "
+            f"({run.skip_reasons.get('unchanged', 0)} unchanged, "
+            f"{run.skip_reasons.get('duplicate', 0)} would duplicate an offer) "
+            f"of {run.matched} matched in {time.perf_counter() - start:.1f}s ({run.rows_per_second or 0:,.0f} rows/s)"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_created_at_id_index'),
+        ('loans', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['created_at', 'id'], name='loan_table_created_c70d2a_idx'),
+        ),
+    ]
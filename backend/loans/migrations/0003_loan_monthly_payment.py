@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0002_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='monthly_payment',
+            field=models.DecimalField(db_index=True, decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+    ]
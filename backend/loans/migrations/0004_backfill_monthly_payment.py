@@ -0,0 +1,40 @@
+from django.db import migrations
+
+from loans.amortization import batch_monthly_payments_rounded
+
+
+BATCH_SIZE = 5000
+
+
+def backfill_monthly_payment(apps, schema_editor):
+    Loan = apps.get_model('loans', 'Loan')
+    last_pk = 0
+    while True:
+        # Walk the primary key so every batch is an index range scan
+        batch = list(
+            Loan.objects.filter(pk__gt=last_pk, monthly_payment__isnull=True)
+            .order_by('pk')
+            .only('pk', 'loan_amount', 'annual_rate', 'term_months')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        payments = batch_monthly_payments_rounded(
+            [loan.loan_amount for loan in batch],
+            [loan.annual_rate for loan in batch],
+            [loan.term_months for loan in batch],
+        )
+        for loan, payment in zip(batch, payments):
+            loan.monthly_payment = payment
+        Loan.objects.bulk_update(batch, ['monthly_payment'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0003_loan_monthly_payment'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_monthly_payment, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 14:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0004_backfill_monthly_payment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepricingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule', models.JSONField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('matched', models.IntegerField(default=0)),
+                ('updated', models.IntegerField(default=0)),
+                ('skipped', models.IntegerField(default=0)),
+                ('rows_per_second', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Repricing run',
+                'db_table': 'repricing_run_table',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LoanRateChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_rate', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('new_rate', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('old_monthly_payment', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('new_monthly_payment', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('loan', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='rate_changes', to='loans.loan')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='loans.repricingrun')),
+            ],
+            options={
+                'verbose_name': 'Loan rate change',
+                'db_table': 'loan_rate_change_table',
+                'unique_together': {('run', 'loan')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_search'),
+        ('loans', '0005_repricing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('loan_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('annual_rate', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('term_months', models.IntegerField(null=True)),
+                ('monthly_payment', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('issue_date', models.DateField(null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('reason', models.CharField(choices=[('age', 'Older than the retention period'), ('superseded', 'Superseded by a newer offer')], max_length=10)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='customers.customer')),
+            ],
+            options={
+                'verbose_name': 'Archived loan',
+                'db_table': 'loan_archive_table',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['customer', 'created_at'], name='loan_archiv_custome_b153fa_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 18:05
+
+import importlib
+
+from django.db import migrations, models
+
+
+def backfill_monthly_payment(apps, schema_editor):
+    # Rows written without a payment since 0004 ran (raw SQL, update())
+    backfill = importlib.import_module('loans.migrations.0004_backfill_monthly_payment')
+    backfill.backfill_monthly_payment(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+    # PostgreSQL cannot ALTER a table with the backfill's updates still pending
+    # in the same transaction, so each operation commits on its own
+    atomic = False
+
+    dependencies = [
+        ('loans', '0006_loan_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_monthly_payment, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='loan',
+            name='monthly_payment',
+            field=models.DecimalField(db_index=True, decimal_places=2, editable=False, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0007_monthly_payment_not_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repricingrun',
+            name='skip_reasons',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -1,12 +1,75 @@
-from django.db import models, IntegrityError
-from customers.models import Customer
+from django.db import models, router, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.lookups import GreaterThanOrEqual
+from app.signals import bulk_write
+from customers.models import Customer, INCOME_TO_LOAN_MULTIPLE, MIN_CREDIT_SCORE
 from datetime import date
+from functools import partial
+from decimal import ROUND_HALF_EVEN
+from loans.amortization import CENT, batch_monthly_payments_rounded, monthly_payment
 
 
 
 # Create your LoanOffer models here.
 
 
+class LoanQuerySet(models.QuerySet):
+    def with_eligibility(self):
+        """
+        Annotate has_sufficient_income, has_good_credit and qualifies with the
+        qualify_for_loan rules as SQL expressions, joined to the customer in
+        the same query.
+        """
+        sufficient_income = GreaterThanOrEqual(
+            F('customer__income') * 12, F('loan_amount') * INCOME_TO_LOAN_MULTIPLE
+        )
+        good_credit = GreaterThanOrEqual(F('customer__credit_score'), MIN_CREDIT_SCORE)
+        return self.annotate(
+            has_sufficient_income=sufficient_income,
+            has_good_credit=good_credit,
+            qualifies=models.ExpressionWrapper(
+                models.Q(sufficient_income) & models.Q(good_credit), output_field=models.BooleanField()
+            ),
+        )
+
+    def qualified(self, qualifies=True):
+        return self.with_eligibility().filter(qualifies=qualifies)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        set_monthly_payments([loan for loan in objs if loan.monthly_payment is None])
+        return bulk_write(self, objs, True, partial(super().bulk_create, objs, *args, **kwargs))
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if PRICING_FIELDS.intersection(fields):
+            set_monthly_payments(objs)
+            fields = [*fields, 'monthly_payment'] if 'monthly_payment' not in fields else fields
+        return bulk_write(self, objs, False, partial(super().bulk_update, objs, fields, *args, **kwargs))
+
+    def update(self, **kwargs):
+        # An UPDATE statement cannot price rows, so it has to set monthly_payment too
+        if PRICING_FIELDS.intersection(kwargs) and 'monthly_payment' not in kwargs:
+            raise ValueError(
+                'update() of loan_amount, annual_rate or term_months must also set monthly_payment; '
+                'save() and bulk_update() recompute it.'
+            )
+        return super().update(**kwargs)
+
+
+# Changing any of these means monthly_payment has to be recomputed
+PRICING_FIELDS = frozenset({'loan_amount', 'annual_rate', 'term_months'})
+
+
+def set_monthly_payments(loans):
+    """Fill the stored monthly_payment of many loans from one amortization batch."""
+    payments = batch_monthly_payments_rounded(
+        [loan.loan_amount for loan in loans],
+        [loan.annual_rate for loan in loans],
+        [loan.term_months for loan in loans],
+    )
+    for loan, payment in zip(loans, payments):
+        loan.monthly_payment = payment
 
 
 class Loan(models.Model): 
@@ -14,11 +77,16 @@ class Loan(models.Model):
     loan_amount= models.DecimalField(max_digits=10, decimal_places=2, default=1000)
     annual_rate= models.DecimalField(max_digits=4, decimal_places=2, default=20)
     term_months= models.IntegerField(null=True, default=12) #total duration over which the loan must be repaid
-    #monthly_payments= models.DecimalField(max_digits=10,decimal_places=2) #amount the borrower needs to pay back each month during the loan term
+    # amount the borrower pays back each month, rounded to the cent; kept in sync
+    # by save(), bulk_create() and bulk_update() (update() must set it) so it can
+    # be filtered, sorted and cursor-paginated on
+    monthly_payment = models.DecimalField(max_digits=12, decimal_places=2, editable=False, db_index=True)
     issue_date = models.DateField(blank=True, null=True, default=date.today)
     created_at= models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = LoanQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         db_table = 'loan_table'  # Custom table name
@@ -26,18 +94,29 @@ class Loan(models.Model):
         unique_together = ('customer','loan_amount','annual_rate','term_months')  # Unique constraint
         indexes = [
             models.Index(fields=['customer',"created_at"]),
+            models.Index(fields=['created_at', 'id']),  # cursor pagination
         ]
         verbose_name_plural = 'Loans'
         
     def __str__(self): 
-        return f"Loan {self.customer.id} {self.loan_amount}"
+        return f"Loan {self.customer_id} {self.loan_amount}"
+
+    def save(self, *args, **kwargs):
+        self.monthly_payment = self.monthly_payments.quantize(CENT, rounding=ROUND_HALF_EVEN)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and PRICING_FIELDS.intersection(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'monthly_payment'}
+        # pre_save/post_save update the partner portfolios by difference (partners.signals)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
 
     # qualifying checks 
     
     def has_sufficient_income(self): 
         # is customers income x2 the loan amount? 
         try:
-            qualify = (self.customer.annual_income >= self.loan_amount * 2)
+            qualify = (self.customer.annual_income >= self.loan_amount * INCOME_TO_LOAN_MULTIPLE)
             return qualify
         except TypeError:
             print("there is a type error, please ensure input is valid")
@@ -46,7 +125,7 @@ class Loan(models.Model):
     # is customers creditscore good? 
     def has_good_credit(self): 
         try:
-            badCreditScore= self.customer.credit_score >= 500
+            badCreditScore= self.customer.credit_score >= MIN_CREDIT_SCORE
             return badCreditScore
         
         except (TypeError, AttributeError): 
@@ -63,24 +142,90 @@ class Loan(models.Model):
     @property
     def monthly_payments(self):
         """Calculate monthly payment using standard amortization formula."""
-        try:
-            from decimal import Decimal
-            P = Decimal(str(self.loan_amount))
-            r = Decimal(str(self.annual_rate)) / Decimal('12') / Decimal('100')
-            n = Decimal(str(self.term_months))
-            
-            if r == 0:
-                # If interest rate is 0, simply divide loan by term
-                return P / n
-            
-            # Standard amortization formula: M = P * (r * (1 + r)^n) / ((1 + r)^n - 1)
-            numerator = r * ((1 + r) ** n)
-            denominator = ((1 + r) ** n) - 1
-            M = P * (numerator / denominator)
-            
-            return M
-        except (ZeroDivisionError, ValueError, TypeError) as e:
-            return Decimal('0.00')
+        return monthly_payment(self.loan_amount, self.annual_rate, self.term_months)
+
+
+class ArchivedLoan(models.Model):
+    """
+    An offer moved out of loan_table by loans.archive, under the id it had
+    there so LoanRateChange rows still point at it. Not a Loan: nothing here
+    is priced, qualified or counted in partner portfolios.
+    """
+    AGE = 'age'
+    SUPERSEDED = 'superseded'
+    REASON_CHOICES = [(AGE, 'Older than the retention period'), (SUPERSEDED, 'Superseded by a newer offer')]
+
+    id = models.BigIntegerField(primary_key=True)  # Loan.id is a BigAutoField
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_loans')
+    loan_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    annual_rate = models.DecimalField(max_digits=4, decimal_places=2)
+    term_months = models.IntegerField(null=True)
+    monthly_payment = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    issue_date = models.DateField(null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+
+    class Meta:
+        ordering = ['-created_at']
+        db_table = 'loan_archive_table'
+        verbose_name = 'Archived loan'
+        indexes = [models.Index(fields=['customer', 'created_at'])]
+
+    def __str__(self):
+        return f"Archived loan {self.customer_id} {self.loan_amount}"
+
+
+class RepricingRun(models.Model):
+    """
+    One application of a rate-change rule (see loans.repricing). Its
+    LoanRateChange rows are the audit trail of every offer it changed.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (COMPLETED, 'Completed'), (FAILED, 'Failed')]
+
+    rule = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    matched = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)  # matched but not changed, see skip_reasons
+    # {'unchanged': clamped to the same rate, 'duplicate': would duplicate an existing offer}
+    skip_reasons = models.JSONField(default=dict, blank=True)
+    rows_per_second = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        db_table = 'repricing_run_table'
+        verbose_name = 'Repricing run'
+
+    def __str__(self):
+        return f"Repricing {self.pk} ({self.status})"
+
+
+class LoanRateChange(models.Model):
+    """Old and new pricing of one loan changed by a repricing run."""
+    run = models.ForeignKey(RepricingRun, on_delete=models.CASCADE, related_name='changes')
+    # History outlives the offer, so no database constraint
+    loan = models.ForeignKey(Loan, on_delete=models.DO_NOTHING, db_constraint=False, related_name='rate_changes')
+    old_rate = models.DecimalField(max_digits=4, decimal_places=2)
+    new_rate = models.DecimalField(max_digits=4, decimal_places=2)
+    old_monthly_payment = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    new_monthly_payment = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        db_table = 'loan_rate_change_table'
+        verbose_name = 'Loan rate change'
+        unique_together = ('run', 'loan')
+
+    def __str__(self):
+        return f"Loan {self.loan_id}: {self.old_rate} -> {self.new_rate}"
     
 
         
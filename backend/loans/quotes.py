@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+
+from customers.models import Customer
+from loans.amortization import batch_monthly_payments_rounded
+from loans.models import Loan
+
+
+class QuoteCache:
+    """Bounded LRU cache of monthly payments keyed on (amount, rate, term)."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(loan_amount, annual_rate, term_months):
+        # Normalize so 1000 and 1000.00 share an entry
+        return (Decimal(loan_amount).normalize(), Decimal(annual_rate).normalize(), int(term_months))
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+quote_cache = QuoteCache(maxsize=getattr(settings, 'LOAN_QUOTE_CACHE_SIZE', 4096))
+
+
+def quote_monthly_payments(terms):
+    """
+    Return the cent-rounded monthly payment for each (amount, rate, term)
+    tuple, pricing only the cache misses in a single batch.
+    """
+    keys = [QuoteCache.key(*t) for t in terms]
+    payments = [quote_cache.get(key) for key in keys]
+    missing = [i for i, payment in enumerate(payments) if payment is None]
+    if missing:
+        priced = batch_monthly_payments_rounded(
+            [terms[i][0] for i in missing],
+            [terms[i][1] for i in missing],
+            [terms[i][2] for i in missing],
+        )
+        for i, payment in zip(missing, priced):
+            quote_cache.put(keys[i], payment)
+            payments[i] = payment
+    return payments
+
+
+def build_quote(data, monthly_payment):
+    """
+    Assemble a quote response from validated LoanQuoteSerializer data.
+    Eligibility uses the Loan.qualify_for_loan rules on unsaved instances.
+    """
+    quote = {
+        'loan_amount': data['loan_amount'],
+        'annual_rate': data['annual_rate'],
+        'term_months': data['term_months'],
+        'monthly_payments': monthly_payment,
+    }
+    customer = data.get('customer')
+    if customer is None and 'income' in data and 'credit_score' in data:
+        customer = Customer(income=data['income'], credit_score=data['credit_score'])
+    if customer is not None:
+        loan = Loan(customer=customer, loan_amount=data['loan_amount'])
+        quote['has_sufficient_income'] = loan.has_sufficient_income()
+        quote['has_good_credit'] = loan.has_good_credit()
+        quote['qualifies'] = loan.qualify_for_loan()
+    return quote
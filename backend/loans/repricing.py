@@ -0,0 +1,196 @@
+import time
+from array import array
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from app import response_cache
+from loans.amortization import batch_monthly_payments_rounded
+from loans.models import Loan, LoanRateChange, RepricingRun
+from partners import portfolio
+
+
+# Rate-change repricing of existing offers.
+#
+# A rule is a JSON dict (validated by RepricingRuleSerializer):
+#
+#     {'rate_change': '0.50', 'partner_ids': [3], 'credit_score_lt': 650}
+#
+# The matching loan ids are read once. For each chunk the new payments come
+# from one amortization batch, the LoanRateChange audit rows are inserted with
+# bulk_create, and a single UPDATE copies the new rate and payment from them
+# onto the loans. Each chunk commits together with its audit rows and
+# portfolio deltas, so an interrupted run can be resumed: loans already
+# audited for the run are skipped.
+#
+# A new rate can collide with another offer of the same customer, amount and
+# term (Loan.unique_together). Loans are visited from the far end of the rate
+# range in the direction of the change, and within a chunk an offer moving
+# onto a rate that another offer is leaving waits for the next UPDATE, so
+# chains of offers moving together resolve. Loans whose new key is held by an
+# offer that is not moving are skipped, as are loans the rate floor or
+# ceiling leaves at their old rate, so matched == updated + skipped.
+
+CHUNK_SIZE = 5000
+RATE_FLOOR = Decimal('0.00')
+RATE_CEILING = Decimal('99.99')  # annual_rate has max_digits=4
+RATE_PLACES = Decimal('0.01')
+
+RULE_FILTERS = {
+    'partner_ids': 'customer__partners__in',
+    'customer_ids': 'customer_id__in',
+    'credit_score_lt': 'customer__credit_score__lt',
+    'credit_score_gte': 'customer__credit_score__gte',
+    'annual_rate_gte': 'annual_rate__gte',
+    'annual_rate_lte': 'annual_rate__lte',
+    'term_months': 'term_months__in',
+}
+
+
+def matching_loans(rule):
+    """The Loan queryset a rule applies to."""
+    loans = Loan.objects.all()
+    for name, lookup in RULE_FILTERS.items():
+        if rule.get(name) is not None:
+            loans = loans.filter(**{lookup: rule[name]})
+    if rule.get('partner_ids'):
+        loans = loans.distinct()  # a customer can belong to several of the partners
+    return loans
+
+
+def new_rate(rate, change):
+    return min(max(rate + change, RATE_FLOOR), RATE_CEILING).quantize(RATE_PLACES)
+
+
+def _snapshot(run, change):
+    """Ids of the loans still to reprice, ordered so collision chains resolve."""
+    loans = matching_loans(run.rule).exclude(rate_changes__run=run)
+    ordering = ('-annual_rate', '-id') if change > 0 else ('annual_rate', 'id')
+    return array('q', loans.order_by(*ordering).values_list('id', flat=True).iterator(chunk_size=CHUNK_SIZE))
+
+
+def _apply(run, rows, now):
+    """
+    Write the audit rows, then copy their new pricing onto the loans in one
+    UPDATE. Rows are (id, customer, amount, term, old rate, new rate, old
+    payment, new payment).
+    """
+    LoanRateChange.objects.bulk_create([
+        LoanRateChange(run=run, loan_id=row[0], old_rate=row[4], new_rate=row[5],
+                       old_monthly_payment=row[6], new_monthly_payment=row[7])
+        for row in rows
+    ])
+    change = LoanRateChange.objects.filter(run=run, loan_id=OuterRef('pk'))
+    Loan.objects.filter(pk__in=[row[0] for row in rows]).update(
+        annual_rate=Subquery(change.values('new_rate')[:1]),
+        monthly_payment=Subquery(change.values('new_monthly_payment')[:1]),
+        updated_at=now,
+    )
+
+
+def _target(row):
+    return row[1], row[2], row[3], row[5]
+
+
+def _occupied(rows):
+    """The (customer, amount, term, rate) keys of existing offers that rows would move onto."""
+    targets = {_target(row) for row in rows}
+    existing = Loan.objects.filter(
+        customer_id__in={row[1] for row in rows}, annual_rate__in={row[5] for row in rows}
+    ).values_list('customer_id', 'loan_amount', 'term_months', 'annual_rate')
+    return targets.intersection(existing)
+
+
+def _move(run, rows, now):
+    """Apply rows, leaving out the ones whose new key is taken. Returns the applied rows."""
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                _apply(run, rows, now)
+            return rows
+        except IntegrityError:
+            if attempt == 0:
+                taken = _occupied(rows)
+                rows = [row for row in rows if _target(row) not in taken]
+    # A concurrent write took a key in between; go one loan at a time
+    applied = []
+    for row in rows:
+        try:
+            with transaction.atomic():
+                _apply(run, [row], now)
+            applied.append(row)
+        except IntegrityError:
+            pass
+    return applied
+
+
+def _reprice_chunk(run, ids, change):
+    """Reprice one chunk of loan ids. Returns (updated, {skip reason: count})."""
+    loans = Loan.objects.filter(pk__in=ids).values_list(
+        'id', 'customer_id', 'loan_amount', 'term_months', 'annual_rate', 'monthly_payment')
+    loans = [(*loan, new_rate(loan[4], change)) for loan in loans]
+    unchanged = len(loans)
+    loans = [loan for loan in loans if loan[6] != loan[4]]
+    unchanged -= len(loans)
+    if not loans:
+        return 0, {'unchanged': unchanged, 'duplicate': 0}
+    payments = batch_monthly_payments_rounded(
+        [loan[2] for loan in loans], [loan[6] for loan in loans], [loan[3] for loan in loans])
+    pending = [(*loan[:5], loan[6], loan[5], payment) for loan, payment in zip(loans, payments)]
+    now = timezone.now()
+
+    applied = []
+    with transaction.atomic():
+        changed = Loan.objects.filter(pk__in=[row[0] for row in pending])
+        before = portfolio.loan_totals_by_partner(changed)
+        while pending:
+            # The database checks uniqueness row by row during an UPDATE, so an
+            # offer moving onto the rate another offer in the chunk is leaving
+            # waits for the next statement
+            leaving = {row[1:5] for row in pending}
+            ready = [row for row in pending if _target(row) not in leaving] or pending
+            applied.extend(_move(run, ready, now))
+            ready = {row[0] for row in ready}
+            pending = [row for row in pending if row[0] not in ready]
+        # Skipped loans are the same before and after, so they cancel out
+        portfolio.apply_deltas(portfolio.difference(portfolio.loan_totals_by_partner(changed), before))
+    response_cache.invalidate('customer-loanoffers', *{row[1] for row in applied})
+    return len(applied), {'unchanged': unchanged, 'duplicate': len(loans) - len(applied)}
+
+
+def reprice(run, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Apply run.rule, resuming if the run was interrupted. progress, if given,
+    is called with the run after every chunk. Returns the run.
+    """
+    change = Decimal(run.rule['rate_change'])
+    run.status = RepricingRun.RUNNING
+    run.save(update_fields=['status'])
+    start = time.perf_counter()
+    try:
+        ids = _snapshot(run, change)
+        # Loans skipped by an interrupted attempt are tried again
+        run.matched, run.skipped, run.skip_reasons = run.updated + len(ids), 0, {}
+        for offset in range(0, len(ids), chunk_size):
+            updated, skipped = _reprice_chunk(run, ids[offset:offset + chunk_size].tolist(), change)
+            run.updated += updated
+            run.skipped += sum(skipped.values())
+            for reason, count in skipped.items():
+                run.skip_reasons[reason] = run.skip_reasons.get(reason, 0) + count
+            run.rows_per_second = round(min(offset + chunk_size, len(ids)) / (time.perf_counter() - start), 1)
+            run.save(update_fields=['matched', 'updated', 'skipped', 'skip_reasons', 'rows_per_second'])
+            if progress is not None:
+                progress(run)
+    except Exception as exc:
+        run.status, run.error = RepricingRun.FAILED, str(exc)
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'error', 'finished_at'])
+        raise
+    elapsed = time.perf_counter() - start
+    run.status, run.error = RepricingRun.COMPLETED, ''
+    run.rows_per_second = round(len(ids) / elapsed, 1) if elapsed else None
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'error', 'rows_per_second', 'finished_at'])
+    return run
@@ -1,10 +1,61 @@
-from loans.models import Loan
+from decimal import Decimal
+
+from django.db import models
+from customers.models import Customer
+from customers.serializers import CustomerSerializer
+from loans.models import ArchivedLoan, Loan, LoanRateChange, RepricingRun
+from loans.affordability import PAYMENT_TO_INCOME
+from loans.amortization import batch_monthly_payments_rounded
 from rest_framework import serializers
+from app.serializers import FieldProjectionMixin
+
+
+class MonthlyPaymentField(serializers.DecimalField):
+    """
+    Read the stored Loan.monthly_payment, or the payment precomputed by
+    LoanListSerializer, before falling back to the monthly_payments property.
+    """
+
+    def get_attribute(self, instance):
+        batched = getattr(instance, '_batched_monthly_payment', None)
+        if batched is not None:
+            return batched
+        if instance.monthly_payment is not None:
+            return instance.monthly_payment
+        return super().get_attribute(instance)
+
+
+class LoanListSerializer(serializers.ListSerializer):
+    """Computes any payments that are not stored yet for the whole page in one batch."""
 
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        loans = list(iterable)
+        unpriced = [loan for loan in loans if loan.monthly_payment is None]
+        if not unpriced or 'monthly_payments' not in self.child.fields:
+            return super().to_representation(loans)
+        payments = batch_monthly_payments_rounded(
+            [loan.loan_amount for loan in unpriced],
+            [loan.annual_rate for loan in unpriced],
+            [loan.term_months for loan in unpriced],
+        )
+        for loan, payment in zip(unpriced, payments):
+            loan._batched_monthly_payment = payment
+        try:
+            return super().to_representation(loans)
+        finally:
+            for loan in unpriced:
+                del loan._batched_monthly_payment
 
-class LoanSerializer(serializers.ModelSerializer): 
-    monthly_payments = serializers.DecimalField(
-        max_digits=10, 
+
+def monthly_payments_for_rows(rows):
+    """The stored monthly_payment of each .values() row."""
+    return [row['monthly_payment'] for row in rows]
+
+
+class LoanSerializer(FieldProjectionMixin, serializers.ModelSerializer): 
+    monthly_payments = MonthlyPaymentField(
+        max_digits=12, 
         decimal_places=2, 
         read_only=True
     )
@@ -19,6 +70,7 @@ class LoanSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Loan
+        list_serializer_class = LoanListSerializer
         fields = (
             'id',
             'customer',
@@ -36,6 +88,13 @@ class LoanSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at'
             )
+
+    # Same values as MonthlyPaymentField, for .values() rows (app.fast_lists)
+    computed_values = {
+        'monthly_payments': (
+            ('monthly_payment',), monthly_payments_for_rows
+        ),
+    }
         
     def validate_loan_amount(self, value):
         if value <= 0:
@@ -52,4 +111,132 @@ class LoanSerializer(serializers.ModelSerializer):
     def validate_annual_rate(self, value):
         if value < 0 or value > 100:
             raise serializers.ValidationError("Annual rate must be between 0 and 100.")
-        return value
\ No newline at end of file
+        return value
+
+class LoanExportSerializer(LoanSerializer):
+    """LoanSerializer plus issue_date, for the streaming export."""
+
+    class Meta(LoanSerializer.Meta):
+        fields = (*LoanSerializer.Meta.fields, 'issue_date')
+
+
+class ArchivedLoanSerializer(LoanSerializer):
+    """An archived offer: the LoanSerializer fields plus when and why it was archived."""
+
+    class Meta(LoanSerializer.Meta):
+        model = ArchivedLoan
+        fields = (*LoanSerializer.Meta.fields, 'archived_at', 'reason')
+        read_only_fields = fields
+
+
+class LoanQuoteSerializer(serializers.Serializer):
+    """Validates a quote request; nothing is written to the database."""
+    loan_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    annual_rate = serializers.DecimalField(max_digits=4, decimal_places=2, required=False)
+    interest_rate = serializers.DecimalField(max_digits=4, decimal_places=2, required=False)
+    term_months = serializers.IntegerField(required=False, default=12)
+    # Optional applicant data for the eligibility check
+    customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all(), required=False)
+    income = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    credit_score = serializers.IntegerField(required=False)
+
+    validate_loan_amount = LoanSerializer.validate_loan_amount
+    validate_term_months = LoanSerializer.validate_term_months
+    validate_annual_rate = LoanSerializer.validate_annual_rate
+    validate_interest_rate = LoanSerializer.validate_annual_rate
+    validate_credit_score = CustomerSerializer.validate_credit_score
+
+    def validate(self, attrs):
+        # Same defaults as LoanOfferViewSet.create
+        interest_rate = attrs.pop('interest_rate', None)
+        if 'annual_rate' not in attrs:
+            attrs['annual_rate'] = interest_rate if interest_rate is not None else Decimal('20')
+        return attrs
+
+
+class LoanQuoteResultSerializer(serializers.Serializer):
+    loan_amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    annual_rate = serializers.DecimalField(max_digits=4, decimal_places=2, read_only=True)
+    term_months = serializers.IntegerField(read_only=True)
+    monthly_payments = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    has_sufficient_income = serializers.BooleanField(read_only=True)
+    has_good_credit = serializers.BooleanField(read_only=True)
+    qualifies = serializers.BooleanField(read_only=True)
+
+
+class AffordabilitySerializer(serializers.Serializer):
+    """Request body for the batch affordability endpoints (see loans.affordability)."""
+    customer_ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=10_000)
+    annual_rate = serializers.DecimalField(max_digits=4, decimal_places=2, default=Decimal('20'))
+    term_months = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=20, default=[12, 24, 36, 60, 120]
+    )
+    payment_to_income = serializers.DecimalField(
+        max_digits=4, decimal_places=3, min_value=Decimal('0.001'), max_value=1, default=PAYMENT_TO_INCOME
+    )
+    max_monthly_payment = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'),
+                                                   required=False)
+    loan_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+    validate_annual_rate = LoanSerializer.validate_annual_rate
+    validate_loan_amount = LoanSerializer.validate_loan_amount
+
+    def validate_term_months(self, value):
+        return sorted({LoanSerializer.validate_term_months(self, term) for term in value})
+
+
+class AffordabilityResultSerializer(serializers.Serializer):
+    customer = serializers.IntegerField(read_only=True)
+    max_monthly_payment = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    max_loan_amount = serializers.DictField(
+        child=serializers.DecimalField(max_digits=14, decimal_places=2), read_only=True
+    )  # by term_months
+    qualifies_up_to = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    min_term_months = serializers.IntegerField(read_only=True)  # only with loan_amount; null if no term fits
+
+
+class RepricingRuleSerializer(serializers.Serializer):
+    """A rate change and the offers it applies to (see loans.repricing)."""
+    rate_change = serializers.DecimalField(max_digits=5, decimal_places=2)  # percentage points, e.g. 0.50
+    partner_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    customer_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    credit_score_lt = serializers.IntegerField(required=False)
+    credit_score_gte = serializers.IntegerField(required=False)
+    annual_rate_gte = serializers.DecimalField(max_digits=4, decimal_places=2, required=False)
+    annual_rate_lte = serializers.DecimalField(max_digits=4, decimal_places=2, required=False)
+    term_months = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+
+    # How to run it, not part of the rule
+    dry_run = serializers.BooleanField(required=False, default=False)
+    background = serializers.BooleanField(required=False, default=False)
+
+    def validate_rate_change(self, value):
+        if not value:
+            raise serializers.ValidationError("Rate change must not be zero.")
+        if abs(value) > 100:
+            raise serializers.ValidationError("Rate change must be between -100 and 100.")
+        return value
+
+    def to_rule(self):
+        """validated_data as the JSON rule stored on the run."""
+        return {
+            name: str(value) if isinstance(value, Decimal) else value
+            for name, value in self.validated_data.items() if name not in ('dry_run', 'background')
+        }
+
+
+class RepricingRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RepricingRun
+        fields = ('id', 'rule', 'status', 'matched', 'updated', 'skipped', 'skip_reasons', 'rows_per_second', 'error',
+                  'created_at', 'finished_at')
+        read_only_fields = fields
+
+
+class LoanRateChangeSerializer(serializers.ModelSerializer):
+    changed_at = serializers.DateTimeField(source='run.created_at', read_only=True)
+
+    class Meta:
+        model = LoanRateChange
+        fields = ('run', 'old_rate', 'new_rate', 'old_monthly_payment', 'new_monthly_payment', 'changed_at')
+        read_only_fields = fields
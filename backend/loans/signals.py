@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from app import response_cache
+from app.signals import bulk_changed
+from loans.models import Loan
+
+
+@receiver(post_save, sender=Loan)
+@receiver(post_delete, sender=Loan)
+def invalidate_loan_responses(sender, instance, **kwargs):
+    response_cache.invalidate('customer-loanoffers', instance.customer_id)
+
+
+@receiver(bulk_changed, sender=Loan)
+def invalidate_bulk_loan_responses(sender, instances, **kwargs):
+    response_cache.invalidate('customer-loanoffers', *{loan.customer_id for loan in instances})
@@ -0,0 +1,194 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+from loans.amortization import batch_monthly_payments
+
+
+# Monte Carlo stress test of a book of loans.
+#
+# Each simulated path draws a systematic credit factor Z and a funding rate
+# shock. Loan i defaults over its life when
+#
+#     sqrt(rho) * Z + sqrt(1 - rho) * e_i < inverse_normal(lifetime PD_i)
+#
+# (a one-factor Gaussian copula), in a month drawn uniformly over its term,
+# after which a share (1 - lgd) of the outstanding balance is recovered.
+# Cash flows are valued at the loan's own rate plus the path's shock, so the
+# loss of a loan that neither defaults nor sees a shock is exactly zero. All
+# values have closed forms (annuity factors and amortized balances), so a path
+# costs a handful of array operations per loan instead of a month-by-month
+# schedule.
+#
+# Paths are simulated in fixed chunks of CHUNK_PATHS, each seeded from
+# SeedSequence(seed).spawn(), so the result for a seed does not depend on how
+# many processes run the chunks. Chunks share nothing but the portfolio
+# arrays, copied once per process; `manage.py benchmark_stress_test` times the
+# same run across process counts.
+
+CHUNK_PATHS = 250
+BLOCK_ELEMENTS = 1_000_000  # paths x loans per array pass, bounds memory use
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+# Annual probability of default by credit score: log-linear from 25% at 300
+# to 0.3% at 850, before the scenario's pd_multiplier
+PD_AT_300 = 0.25
+PD_SLOPE = math.log(0.003 / 0.25) / 550
+
+DEFAULT_SCENARIO = {
+    'pd_multiplier': 1.0,       # scales every loan's default probability
+    'correlation': 0.15,        # rho, exposure to the systematic factor
+    'lgd': 0.6,                 # share of the balance lost at default
+    'rate_shock_bps': 0.0,      # mean shift of the funding rate, basis points
+    'rate_shock_vol_bps': 0.0,  # standard deviation of that shift across paths
+}
+
+
+def annual_default_probability(credit_scores):
+    scores = np.clip(np.asarray(credit_scores, dtype=np.float64), 300, 850)
+    return PD_AT_300 * np.exp(PD_SLOPE * (scores - 300))
+
+
+def portfolio_arrays(loans):
+    """
+    Load a Loan queryset once into the float arrays the simulation needs:
+    principal, monthly rate, term, monthly payment and annual PD.
+    Loans without a positive term are left out.
+    """
+    rows = list(loans.filter(term_months__gt=0).values_list(
+        'loan_amount', 'annual_rate', 'term_months', 'customer__credit_score'))
+    count = len(rows)
+    principal = np.fromiter((row[0] for row in rows), dtype=np.float64, count=count)
+    annual_rate = np.fromiter((row[1] for row in rows), dtype=np.float64, count=count)
+    term = np.fromiter((row[2] for row in rows), dtype=np.float64, count=count)
+    return {
+        'principal': principal,
+        'rate': annual_rate / 1200.0,
+        'term': term,
+        # Unrounded, so an unshocked performing loan is worth exactly its principal
+        'payment': batch_monthly_payments(principal, annual_rate, term),
+        'pd': annual_default_probability([row[3] for row in rows]),
+    }
+
+
+def default_thresholds(portfolio, scenario):
+    """Latent-variable threshold per loan: inverse normal CDF of its lifetime PD."""
+    annual = np.clip(portfolio['pd'] * scenario['pd_multiplier'], 0.0, 0.999)
+    lifetime = 1.0 - np.power(1.0 - annual, portfolio['term'] / 12.0)
+    lifetime = np.clip(lifetime, 1e-12, 1 - 1e-12)
+    inverse = NormalDist().inv_cdf
+    return np.fromiter(map(inverse, lifetime.tolist()), dtype=np.float64, count=len(lifetime))
+
+
+def _annuity(months, log_growth, rate):
+    """Present value of 1 paid for `months` months at monthly `rate` (log_growth = log1p(rate))."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = -np.expm1(-months * log_growth) / rate
+    return np.where(np.abs(rate) < 1e-12, months, factor)
+
+
+def _balance(principal, rate, term, paid):
+    """Outstanding balance after `paid` of `term` level payments."""
+    log_growth = np.log1p(rate)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = principal * -np.expm1((paid - term) * log_growth) / -np.expm1(-term * log_growth)
+    return np.where(rate < 1e-12, principal * (1 - paid / term), balance)
+
+
+_portfolio = None
+
+
+def _load(portfolio):
+    global _portfolio
+    _portfolio = portfolio
+
+
+def simulate_chunk(paths, seed_sequence, scenario, thresholds, portfolio=None):
+    """Portfolio loss (currency) and number of defaults on each of `paths` paths."""
+    portfolio = _portfolio if portfolio is None else portfolio
+    rng = np.random.default_rng(seed_sequence)
+    principal, rate, term = portfolio['principal'], portfolio['rate'], portfolio['term']
+    payment = portfolio['payment']
+    loans = len(principal)
+    rho = scenario['correlation']
+
+    systematic = rng.standard_normal(paths)
+    shock = (scenario['rate_shock_bps'] + scenario['rate_shock_vol_bps'] * rng.standard_normal(paths)) / 120_000
+    losses = np.empty(paths)
+    defaults = np.empty(paths, dtype=np.int64)
+    block = max(1, BLOCK_ELEMENTS // max(loans, 1))
+    for start in range(0, paths, block):
+        stop = min(start + block, paths)
+        latent = rng.standard_normal((stop - start, loans))
+        latent *= math.sqrt(1 - rho)
+        latent += math.sqrt(rho) * systematic[start:stop, None]
+        defaulted = latent < thresholds
+
+        discount = rate + shock[start:stop, None]
+        log_growth = np.log1p(discount)
+        value = payment * _annuity(term, log_growth, discount)
+
+        path_index, loan_index = np.nonzero(defaulted)
+        if len(loan_index):
+            months = term[loan_index]
+            default_month = np.ceil(rng.random(len(loan_index)) * months)
+            paid = default_month - 1
+            d, g = discount[path_index, loan_index], log_growth[path_index, loan_index]
+            recovered = (1 - scenario['lgd']) * _balance(principal[loan_index], rate[loan_index], months, paid)
+            value[path_index, loan_index] = (
+                payment[loan_index] * _annuity(paid, g, d) + recovered * np.exp(-default_month * g)
+            )
+        losses[start:stop] = principal.sum() - value.sum(axis=1)
+        defaults[start:stop] = defaulted.sum(axis=1)
+    return losses, defaults
+
+
+def run_stress_test(portfolio, paths=10_000, seed=0, scenario=None, processes=None):
+    """
+    Simulate `paths` paths of the portfolio under scenario (see DEFAULT_SCENARIO)
+    on a process pool. Returns loss percentiles in currency and as a share of
+    principal, the expected loss and the 99% expected shortfall.
+    """
+    scenario = {**DEFAULT_SCENARIO, **(scenario or {})}
+    processes = processes or os.cpu_count() or 1
+    start = time.perf_counter()
+    total_principal = float(portfolio['principal'].sum())
+    chunks = [min(CHUNK_PATHS, paths - offset) for offset in range(0, paths, CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    if len(portfolio['principal']) == 0 or not chunks:
+        losses, defaults = np.zeros(paths), np.zeros(paths, dtype=np.int64)
+    else:
+        thresholds = default_thresholds(portfolio, scenario)
+        if processes == 1 or len(chunks) == 1:
+            results = [simulate_chunk(n, s, scenario, thresholds, portfolio) for n, s in zip(chunks, seeds)]
+        else:
+            with ProcessPoolExecutor(min(processes, len(chunks)), initializer=_load,
+                                     initargs=(portfolio,)) as pool:
+                results = list(pool.map(simulate_chunk, chunks, seeds, [scenario] * len(chunks),
+                                        [thresholds] * len(chunks)))
+        losses = np.concatenate([result[0] for result in results])
+        defaults = np.concatenate([result[1] for result in results])
+
+    tail = np.sort(losses)[-max(1, int(math.ceil(paths * 0.01))):]
+    share = (lambda amount: round(amount / total_principal, 6)) if total_principal else (lambda amount: 0.0)
+    percentiles = {str(p): round(float(np.percentile(losses, p)), 2) for p in PERCENTILES}
+    return {
+        'loans': len(portfolio['principal']),
+        'paths': paths,
+        'seed': seed,
+        'scenario': scenario,
+        'total_principal': round(total_principal, 2),
+        'expected_loss': round(float(losses.mean()), 2),
+        'loss_percentiles': percentiles,
+        'loss_percentiles_pct': {p: share(amount) for p, amount in percentiles.items()},
+        'expected_shortfall_99': round(float(tail.mean()), 2),
+        'mean_default_rate': round(float(defaults.mean()) / len(portfolio['principal']), 6)
+        if len(portfolio['principal']) else 0.0,
+        'processes': processes,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
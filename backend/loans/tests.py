@@ -1,3 +1,832 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from app import idempotency, response_cache
+from app.fast_lists import values_list_data
+from app.renderers import FastJSONRenderer
+from customers.models import Customer
+from loans.amortization import (
+    amortization_schedule, batch_monthly_payments, batch_monthly_payments_rounded, monthly_payment,
+)
+from loans.models import ArchivedLoan, Loan, LoanRateChange, RepricingRun
+from loans.quotes import QuoteCache, quote_cache
+from loans.repricing import reprice
+from loans import affordability, archive, simulation
+from loans.serializers import LoanExportSerializer, LoanSerializer
+
+
+def reference_monthly_payment(loan_amount, annual_rate, term_months):
+    """The original per-row formula from Loan.monthly_payments."""
+    P = Decimal(str(loan_amount))
+    r = Decimal(str(annual_rate)) / Decimal('12') / Decimal('100')
+    n = Decimal(str(term_months))
+    if r == 0:
+        return P / n
+    numerator = r * ((1 + r) ** n)
+    denominator = ((1 + r) ** n) - 1
+    return P * (numerator / denominator)
+
+
+class AmortizationTests(TestCase):
+    cases = [
+        (Decimal('1000.00'), Decimal('20.00'), 12),
+        (Decimal('25000.00'), Decimal('5.50'), 60),
+        (Decimal('99999999.99'), Decimal('99.99'), 600),
+        (Decimal('150.00'), Decimal('0.01'), 1),
+        (Decimal('12000.00'), Decimal('0.00'), 24),
+        (Decimal('1000.00'), Decimal('0.00'), 7),
+    ]
+
+    def test_monthly_payment_matches_original_formula(self):
+        for case in self.cases:
+            self.assertEqual(monthly_payment(*case), reference_monthly_payment(*case))
+
+    def test_zero_rate_divides_principal_by_term(self):
+        self.assertEqual(monthly_payment(Decimal('12000.00'), Decimal('0'), 24), Decimal('500'))
+        self.assertEqual(batch_monthly_payments([12000], [0], [24]).tolist(), [500.0])
+
+    def test_invalid_term_returns_zero(self):
+        self.assertEqual(monthly_payment(Decimal('1000'), Decimal('20'), 0), Decimal('0.00'))
+        self.assertEqual(monthly_payment(Decimal('1000'), Decimal('20'), None), Decimal('0.00'))
+        self.assertEqual(batch_monthly_payments_rounded([1000, 1000], [20, 0], [None, 0]), [Decimal('0.00')] * 2)
+
+    def test_batch_rounded_matches_exact_to_the_cent(self):
+        amounts, rates, terms = zip(*self.cases)
+        expected = [reference_monthly_payment(*case).quantize(Decimal('0.01')) for case in self.cases]
+        self.assertEqual(batch_monthly_payments_rounded(amounts, rates, terms), expected)
+
+    def test_batch_rounded_over_grid(self):
+        amounts, rates, terms = [], [], []
+        for amount in ('100.00', '1234.56', '50000.00', '777777.77'):
+            for rate in ('0.00', '0.25', '3.99', '12.50', '20.00', '49.99'):
+                for term in (1, 12, 37, 360, 600):
+                    amounts.append(Decimal(amount))
+                    rates.append(Decimal(rate))
+                    terms.append(term)
+        expected = [
+            reference_monthly_payment(a, r, t).quantize(Decimal('0.01'))
+            for a, r, t in zip(amounts, rates, terms)
+        ]
+        self.assertEqual(batch_monthly_payments_rounded(amounts, rates, terms), expected)
+
+    def test_half_cent_falls_back_to_decimal(self):
+        # 0.125 / 1 month at 0% is exactly half a cent: banker's rounding gives 0.12
+        self.assertEqual(batch_monthly_payments_rounded([Decimal('0.125')], [0], [1]), [Decimal('0.12')])
+
+
+class LoanSerializerTests(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com',
+            income=Decimal('5000.00'), credit_score=700, address='1 Analytical St',
+        )
+        for term in (12, 36, 600):
+            Loan.objects.create(customer=self.customer, loan_amount=Decimal('10000.00'),
+                                annual_rate=Decimal('7.25'), term_months=term)
+        Loan.objects.create(customer=self.customer, loan_amount=Decimal('2400.00'),
+                            annual_rate=Decimal('0.00'), term_months=24)
+
+    def test_many_matches_single_serialization(self):
+        loans = Loan.objects.all()
+        batched = LoanSerializer(loans, many=True).data
+        single = [LoanSerializer(loan).data for loan in loans]
+        self.assertEqual(batched, single)
+
+    def test_customer_loanoffers_endpoint(self):
+        response = self.client.get(f'/api/customers/{self.customer.id}/loanoffers/')
+        self.assertEqual(response.status_code, 200)
+        payments = {row['term_months']: row['monthly_payments'] for row in response.json()}
+        self.assertEqual(payments[24], '100.00')
+        self.assertEqual(payments[12], '866.42')
+
+
+class AmortizationScheduleTests(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name='Grace', last_name='Hopper', email='grace@example.com',
+            income=Decimal('8000.00'), credit_score=780, address='2 Compiler Rd',
+        )
+
+    def test_schedule_pays_off_principal_exactly(self):
+        for rate, term in ((Decimal('7.25'), 36), (Decimal('0.00'), 7), (Decimal('99.99'), 600)):
+            rows = list(amortization_schedule(Decimal('10000.00'), rate, term))
+            self.assertEqual(len(rows), term)
+            self.assertEqual(sum(row['principal'] for row in rows), Decimal('10000.00'))
+            self.assertEqual(rows[-1]['balance'], Decimal('0.00'))
+            payment = monthly_payment(Decimal('10000.00'), rate, term).quantize(Decimal('0.01'))
+            self.assertTrue(all(row['payment'] == payment for row in rows[:-1]))
+
+    def test_schedule_endpoint_streams_ndjson(self):
+        loan = Loan.objects.create(customer=self.customer, loan_amount=Decimal('1200.00'),
+                                   annual_rate=Decimal('12.00'), term_months=12)
+        response = self.client.get(f'/api/loanoffers/{loan.id}/schedule/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0], {'month': 1, 'payment': '106.62', 'principal': '94.62',
+                                   'interest': '12.00', 'balance': '1105.38'})
+        self.assertEqual(rows[-1]['balance'], '0.00')
+
+
+class LoanQuoteTests(APITestCase):
+    def setUp(self):
+        quote_cache.clear()
+        self.customer = Customer.objects.create(
+            first_name='Alan', last_name='Turing', email='alan@example.com',
+            income=Decimal('1000.00'), credit_score=650, address='3 Enigma Way',
+        )
+
+    def test_quote_matches_saved_offer_and_writes_nothing(self):
+        payload = {'loan_amount': '10000.00', 'interest_rate': '7.25', 'term_months': 12}
+        response = self.client.post('/api/loanoffers/quote/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['monthly_payments'], '866.42')
+        self.assertNotIn('qualifies', response.json())
+        self.assertEqual(Loan.objects.count(), 0)
+
+    def test_quote_eligibility_uses_loan_rules(self):
+        # Annual income 12000 covers a 6000 loan but not 6000.01
+        payload = {'loan_amount': '6000.00', 'term_months': 12, 'customer': self.customer.id}
+        self.assertTrue(self.client.post('/api/loanoffers/quote/', payload, format='json').json()['qualifies'])
+        payload = {'loan_amount': '6000.01', 'term_months': 12, 'income': '1000.00', 'credit_score': 650}
+        result = self.client.post('/api/loanoffers/quote/', payload, format='json').json()
+        self.assertFalse(result['has_sufficient_income'])
+        self.assertTrue(result['has_good_credit'])
+        self.assertFalse(result['qualifies'])
+
+    def test_quote_validation(self):
+        payload = {'loan_amount': '-1', 'term_months': 601}
+        response = self.client.post('/api/loanoffers/quote/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('loan_amount', response.json())
+        self.assertIn('term_months', response.json())
+
+    def test_repeated_quotes_hit_cache(self):
+        payload = [{'loan_amount': '5000', 'annual_rate': '10', 'term_months': 24}] * 3
+        response = self.client.post('/api/loanoffers/quote/batch/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len({row['monthly_payments'] for row in response.json()}), 1)
+        self.client.post('/api/loanoffers/quote/', {'loan_amount': '5000.00', 'annual_rate': '10.00',
+                                                    'term_months': 24}, format='json')
+        stats = self.client.get('/api/loanoffers/quote/stats/').json()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 3, 1))
+
+    def test_cache_is_bounded(self):
+        cache = QuoteCache(maxsize=2)
+        for term in (12, 24, 36):
+            cache.put(QuoteCache.key(1000, 5, term), Decimal('1'))
+        self.assertIsNone(cache.get(QuoteCache.key(1000, 5, 12)))
+        self.assertEqual(cache.stats()['size'], 2)
+
+
+class LoanEligibilityTests(APITestCase):
+    def setUp(self):
+        customers = Customer.objects.bulk_create([
+            Customer(first_name='Rich', last_name='Good', email='rich@example.com',
+                     income=Decimal('1000.00'), credit_score=500, address='1 Rule Rd'),
+            Customer(first_name='Rich', last_name='Bad', email='bad@example.com',
+                     income=Decimal('1000.00'), credit_score=499, address='2 Rule Rd'),
+        ])
+        self.loans = []
+        for customer in customers:
+            # 6000 is exactly the income limit (12000 / 2); 6000.01 is just over it
+            for amount in ('100.00', '6000.00', '6000.01'):
+                self.loans.append(Loan.objects.create(customer=customer, loan_amount=Decimal(amount)))
+
+    def test_sql_annotations_match_python_rules(self):
+        with self.assertNumQueries(1):
+            annotated = list(Loan.objects.with_eligibility())
+        self.assertEqual(len(annotated), 6)
+        for loan in annotated:
+            fresh = Loan.objects.get(pk=loan.pk)
+            self.assertEqual(loan.has_sufficient_income, fresh.has_sufficient_income())
+            self.assertEqual(loan.has_good_credit, fresh.has_good_credit())
+            self.assertEqual(loan.qualifies, fresh.qualify_for_loan())
+        self.assertEqual(Loan.objects.qualified().count(), 2)
+
+    def test_customer_eligible_for(self):
+        self.assertEqual(list(Customer.objects.eligible_for(Decimal('6000.00')).values_list('last_name', flat=True)),
+                         ['Good'])
+        self.assertFalse(Customer.objects.eligible_for(Decimal('6000.01')).exists())
+        self.assertEqual(Customer.objects.eligible_for().count(), 1)
+
+    def test_qualified_filters(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/loanoffers/?qualified=true')
+        self.assertEqual(len(response.json()['results']), 2)
+        response = self.client.get('/api/loanoffers/?qualified=false')
+        self.assertEqual(len(response.json()['results']), 4)
+        response = self.client.get('/api/customers/?qualified=true&loan_amount=6000.01')
+        self.assertEqual(response.json()['results'], [])
+        response = self.client.get('/api/customers/?qualified=false')
+        self.assertEqual([row['last_name'] for row in response.json()['results']], ['Bad'])
+        self.assertEqual(self.client.get('/api/customers/?qualified=maybe').status_code, 400)
+        for amount in ('abc', 'NaN', 'Infinity', '-inf'):
+            response = self.client.get(f'/api/customers/?qualified=true&loan_amount={amount}')
+            self.assertEqual(response.status_code, 400, amount)
+            self.assertIn('loan_amount', response.json())
+
+
+class StoredMonthlyPaymentTests(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name='Katherine', last_name='Johnson', email='kj@example.com',
+            income=Decimal('9000.00'), credit_score=800, address='4 Orbit Ln',
+        )
+
+    def make_loan(self, amount, rate='7.25', term=12):
+        return Loan(customer=self.customer, loan_amount=Decimal(amount),
+                    annual_rate=Decimal(rate), term_months=term)
+
+    def expected(self, loan):
+        return loan.monthly_payments.quantize(Decimal('0.01'))
+
+    def test_save_keeps_column_in_sync(self):
+        loan = self.make_loan('10000.00')
+        loan.save()
+        self.assertEqual(Loan.objects.get(pk=loan.pk).monthly_payment, Decimal('866.42'))
+        loan.term_months = 24
+        loan.save(update_fields=['term_months'])
+        self.assertEqual(Loan.objects.get(pk=loan.pk).monthly_payment, self.expected(loan))
+
+    def test_bulk_writes_keep_column_in_sync(self):
+        loans = Loan.objects.bulk_create([self.make_loan(amount) for amount in ('1000.00', '2000.00', '3000.00')])
+        for loan in Loan.objects.all():
+            self.assertEqual(loan.monthly_payment, self.expected(loan))
+        for loan in loans:
+            loan.annual_rate = Decimal('0.00')
+        Loan.objects.bulk_update(loans, ['annual_rate'])
+        self.assertEqual(sorted(Loan.objects.values_list('monthly_payment', flat=True)),
+                         [Decimal('83.33'), Decimal('166.67'), Decimal('250.00')])
+
+    def test_update_must_set_monthly_payment(self):
+        loan = Loan.objects.bulk_create([self.make_loan('10000.00')])[0]
+        with self.assertRaisesMessage(ValueError, 'must also set monthly_payment'):
+            Loan.objects.filter(pk=loan.pk).update(annual_rate=Decimal('0.00'))
+        Loan.objects.filter(pk=loan.pk).update(annual_rate=Decimal('0.00'), monthly_payment=Decimal('833.33'))
+        Loan.objects.filter(pk=loan.pk).update(issue_date=date(2025, 1, 1))
+        self.assertEqual(Loan.objects.values_list('annual_rate', 'monthly_payment').get(),
+                         (Decimal('0.00'), Decimal('833.33')))
+
+    def test_range_filter_and_ordering(self):
+        Loan.objects.bulk_create([self.make_loan(amount) for amount in ('1000.00', '5000.00', '9000.00')])
+        response = self.client.get('/api/loanoffers/?monthly_payment__lte=500&ordering=-monthly_payment')
+        self.assertEqual([row['monthly_payments'] for row in response.json()['results']], ['433.21', '86.64'])
+        response = self.client.get('/api/loanoffers/?ordering=monthly_payment&page_size=2')
+        first_page = response.json()
+        self.assertEqual([row['monthly_payments'] for row in first_page['results']], ['86.64', '433.21'])
+        second_page = self.client.get(first_page['next']).json()
+        self.assertEqual([row['monthly_payments'] for row in second_page['results']], ['779.78'])
+        self.assertEqual(self.client.get('/api/loanoffers/?monthly_payment__gt=abc').status_code, 400)
+
+
+
+class MonthlyPaymentMigrationTests(TransactionTestCase):
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_unpriced_rows_are_backfilled_before_not_null(self):
+        apps = self.migrate([('loans', '0006_loan_archive')])
+        customer = apps.get_model('customers', 'Customer').objects.create(
+            first_name='Katherine', last_name='Johnson', email='kj@example.com',
+            income=Decimal('9000.00'), credit_score=800,
+        )
+        apps.get_model('loans', 'Loan').objects.bulk_create([
+            apps.get_model('loans', 'Loan')(customer_id=customer.pk, loan_amount=Decimal(amount),
+                                            annual_rate=Decimal('7.25'), term_months=term, monthly_payment=None)
+            for amount in ('500.00', '7500.00') for term in (6, 600)
+        ])
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        for loan in Loan.objects.all():
+            self.assertEqual(loan.monthly_payment, loan.monthly_payments.quantize(Decimal('0.01')))
+        self.assertFalse(Loan._meta.get_field('monthly_payment').null)
+
+class LoanOfferResponseCacheTests(APITestCase):
+    def setUp(self):
+        response_cache.clear()
+        self.customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                                income=Decimal('4000.00'), credit_score=300)
+        self.url = f'/api/customers/{self.customer.id}/loanoffers/'
+        Loan.objects.create(customer=self.customer, loan_amount=Decimal('1000.00'),
+                            annual_rate=Decimal('5.00'), term_months=12)
+
+    def test_repeat_reads_are_served_from_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+        stats = self.client.get('/api/cache/stats/').json()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_new_loan_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Loan.objects.create(customer=self.customer, loan_amount=Decimal('2000.00'),
+                                annual_rate=Decimal('5.00'), term_months=24)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_bulk_update_invalidates(self):
+        self.client.get(self.url)
+        loans = list(Loan.objects.filter(customer=self.customer))
+        for loan in loans:
+            loan.term_months = 36
+        Loan.objects.bulk_update(loans, ['term_months'])
+        self.assertEqual(self.client.get(self.url).json()[0]['term_months'], 36)
+
+    def test_customer_delete_invalidates(self):
+        self.client.get(self.url)
+        self.customer.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+
+class FastListParityTests(APITestCase):
+    """The .values() list path must produce the same bytes as LoanSerializer."""
+
+    def setUp(self):
+        customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                           income=Decimal('5000.00'), credit_score=700)
+        Loan.objects.bulk_create([
+            Loan(customer=customer, loan_amount=Decimal(amount), annual_rate=Decimal(rate), term_months=term)
+            for amount, rate, term in [
+                ('1000.00', '0.00', 12), ('2500.50', '7.25', 36), ('99999999.99', '99.99', 600),
+                ('0.01', '20.00', 1), ('15000.00', '5.00', 60),
+            ]
+        ])
+
+    def test_rows_render_identically(self):
+        queryset = Loan.objects.all()
+        expected = JSONRenderer().render(LoanSerializer(queryset, many=True).data)
+        fast = values_list_data(LoanSerializer(), queryset)
+        self.assertEqual(FastJSONRenderer().render(fast), expected)
+
+    def test_list_endpoint_matches_serializer(self):
+        for query, ordering in [('', ('-created_at', '-id')), ('&ordering=monthly_payment', ('monthly_payment', 'id')),
+                                ('&ordering=-loan_amount&fields=id,monthly_payments', ('-loan_amount', '-id'))]:
+            seen = []
+            url = f'/api/loanoffers/?page_size=2{query}'
+            while url:
+                page = self.client.get(url).json()
+                seen.extend(page['results'])
+                url = page['next']
+            expected = LoanSerializer(Loan.objects.order_by(*ordering), many=True).data
+            if 'fields' in query:
+                expected = [{'id': row['id'], 'monthly_payments': row['monthly_payments']} for row in expected]
+            self.assertEqual(json.dumps(seen), json.dumps(expected), query)
+
+
+class LoanOfferPaginationTests(APITestCase):
+    def setUp(self):
+        customers = Customer.objects.bulk_create([
+            Customer(first_name='Grid', last_name=str(i), email=f'grid{i}@example.com',
+                     income=Decimal('5000.00'), credit_score=700)
+            for i in range(3)
+        ])
+        # One rate grid per customer, all stamped with the same created_at
+        Loan.objects.bulk_create([
+            Loan(customer=customer, loan_amount=Decimal('1000.00'), annual_rate=rate, term_months=term)
+            for customer in customers for rate in (Decimal('5.00'), Decimal('6.00')) for term in (12, 24)
+        ])
+        Loan.objects.update(created_at=timezone.now())
+
+    def walk(self, query=''):
+        seen = []
+        url = f'/api/loanoffers/?page_size=5{query}'
+        while url:
+            page = self.client.get(url).json()
+            seen.extend(row['id'] for row in page['results'])
+            url = page['next']
+        return seen
+
+    def test_ties_are_broken_by_id(self):
+        for query, ordering in [('', ('-created_at', '-id')), ('&ordering=monthly_payment', ('monthly_payment', 'id')),
+                                ('&ordering=-monthly_payment', ('-monthly_payment', '-id')),
+                                ('&ordering=-term_months', ('-term_months', '-id'))]:
+            seen = self.walk(query)
+            self.assertEqual(seen, list(Loan.objects.order_by(*ordering).values_list('id', flat=True)), query)
+
+class LoanExportTests(APITestCase):
+    def setUp(self):
+        customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                           income=Decimal('5000.00'), credit_score=700)
+        self.loans = Loan.objects.bulk_create([
+            Loan(customer=customer, loan_amount=Decimal(amount), annual_rate=Decimal('7.25'), term_months=36,
+                 issue_date=date(2025, 1, day))
+            for amount, day in [('1000.00', 1), ('2500.50', 15), ('15000.00', 31)]
+        ])
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/loanoffers/export/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_rows_in_id_order(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="loanoffers.csv"')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([int(row['id']) for row in rows], sorted(loan.pk for loan in self.loans))
+        self.assertEqual(rows[1]['loan_amount'], '2500.50')
+        self.assertEqual(rows[1]['issue_date'], '2025-01-15')
+
+    def test_ndjson_matches_serializer(self):
+        response, body = self.export('?format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        expected = LoanExportSerializer(Loan.objects.order_by('pk'), many=True).data
+        self.assertEqual([json.loads(line) for line in body.splitlines()], json.loads(json.dumps(expected)))
+
+    def test_date_filters_and_fields(self):
+        _, body = self.export('?format=ndjson&issue_date__gte=2025-01-10&issue_date__lt=2025-01-31&fields=id')
+        self.assertEqual([json.loads(line) for line in body.splitlines()], [{'id': self.loans[1].pk}])
+
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        _, body = self.export(f'?created_at__gte={tomorrow}')
+        self.assertEqual(body.splitlines(), [body.splitlines()[0]])  # header only
+        _, body = self.export('?format=ndjson&created_at__lt=2999-01-01T00:00:00Z')
+        self.assertEqual(len(body.splitlines()), 3)
+
+    def test_bad_parameters_are_json_errors(self):
+        response = self.client.get('/api/loanoffers/export/?format=xml')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('format must be one of', response.json()['error'])
+
+        response = self.client.get('/api/loanoffers/export/?issue_date__gte=yesterday')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('issue_date__gte', response.json())
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        idempotency.clear()
+        self.customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                                income=Decimal('5000.00'), credit_score=700)
+        self.payload = {'customer': self.customer.pk, 'loan_amount': '1000.00', 'annual_rate': '7.25',
+                        'term_months': 12}
+
+    def post(self, key, payload=None):
+        return self.client.post('/api/loanoffers/', payload or self.payload, format='json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.post('abc')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(0):
+            retry = self.post('abc')
+        self.assertEqual((retry.status_code, retry.json()), (201, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Loan.objects.count(), 1)
+
+    def test_key_reused_for_other_request(self):
+        self.post('abc')
+        response = self.post('abc', {**self.payload, 'term_months': 24})
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('error', response.json())
+
+    def test_without_key_duplicates_are_still_rejected(self):
+        self.assertEqual(self.client.post('/api/loanoffers/', self.payload, format='json').status_code, 201)
+        self.assertEqual(self.client.post('/api/loanoffers/', self.payload, format='json').status_code, 400)
+
+    def test_server_errors_release_the_key(self):
+        with mock.patch('loans.views.LoanSerializer.save', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.post('abc')
+        self.assertEqual(self.post('abc').status_code, 201)
+
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0.2)
+    def test_claim_outlives_lock_timeout_while_request_runs(self):
+        save = LoanSerializer.save
+        retries = []
+
+        def slow_save(serializer, *args, **kwargs):
+            if patched.call_count == 1:
+                time.sleep(0.5)
+                retries.append(self.post('abc'))  # arrives while the first request still runs
+            return save(serializer, *args, **kwargs)
+
+        with mock.patch.object(LoanSerializer, 'save', autospec=True, side_effect=slow_save) as patched:
+            first = self.post('abc')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retries[0].status_code, 409)
+        self.assertEqual(self.post('abc').json(), first.json())
+        self.assertEqual(Loan.objects.count(), 1)
+
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    def test_concurrent_retries_create_one_row(self):
+        idempotency.clear()
+        customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                           income=Decimal('5000.00'), credit_score=700)
+        payload = json.dumps({'customer': customer.pk, 'loan_amount': '1000.00', 'annual_rate': '7.25',
+                              'term_months': 12})
+        start = threading.Barrier(12)
+        responses = []
+
+        def post():
+            client = self.client_class()
+            start.wait()
+            try:
+                response = client.post('/api/loanoffers/', payload, content_type='application/json',
+                                       HTTP_IDEMPOTENCY_KEY='retry-storm')
+                responses.append((response.status_code, response.content))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Loan.objects.count(), 1)
+        self.assertEqual(len(responses), 12)
+        self.assertEqual(set(responses), {responses[0]})
+        self.assertEqual(responses[0][0], 201)
+
+
+class RepricingTests(APITestCase):
+    def setUp(self):
+        from partners.models import Partner
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        self.risky = Customer.objects.create(first_name='Risky', last_name='R', email='risky@example.com',
+                                             income=Decimal('9000.00'), credit_score=600)
+        self.safe = Customer.objects.create(first_name='Safe', last_name='S', email='safe@example.com',
+                                            income=Decimal('9000.00'), credit_score=760)
+        self.outside = Customer.objects.create(first_name='Other', last_name='O', email='other@example.com',
+                                               income=Decimal('9000.00'), credit_score=600)
+        self.partner.customers.add(self.risky, self.safe)
+        self.loans = Loan.objects.bulk_create([
+            Loan(customer=customer, loan_amount=Decimal('10000.00'), annual_rate=Decimal(rate), term_months=36)
+            for customer, rate in [(self.risky, '5.00'), (self.risky, '5.50'), (self.safe, '5.00'),
+                                   (self.outside, '5.00')]
+        ])
+        self.rule = {'rate_change': '0.50', 'partner_ids': [self.partner.pk], 'credit_score_lt': 650}
+
+    def rates(self):
+        return {loan.pk: str(loan.annual_rate) for loan in Loan.objects.all()}
+
+    def test_rule_reprices_matching_offers_with_audit(self):
+        before = Loan.objects.get(pk=self.loans[0].pk)
+        run = reprice(RepricingRun.objects.create(rule=self.rule))
+        self.assertEqual((run.status, run.matched, run.updated, run.skipped), ('completed', 2, 2, 0))
+        self.assertIsNotNone(run.rows_per_second)
+        # 5.50 moved first, so 5.00 -> 5.50 does not collide with it
+        self.assertEqual(self.rates(), {self.loans[0].pk: '5.50', self.loans[1].pk: '6.00',
+                                        self.loans[2].pk: '5.00', self.loans[3].pk: '5.00'})
+        for loan in Loan.objects.all():
+            self.assertEqual(loan.monthly_payment, loan.monthly_payments.quantize(Decimal('0.01')))
+
+        change = LoanRateChange.objects.get(loan=self.loans[0])
+        after = Loan.objects.get(pk=self.loans[0].pk)
+        self.assertEqual((change.old_rate, change.new_rate), (Decimal('5.00'), Decimal('5.50')))
+        self.assertEqual((change.old_monthly_payment, change.new_monthly_payment),
+                         (before.monthly_payment, after.monthly_payment))
+        self.assertGreater(after.updated_at, before.updated_at)
+
+    def test_offers_blocked_by_an_existing_offer_are_skipped(self):
+        run = reprice(RepricingRun.objects.create(rule={**self.rule, 'annual_rate_lte': '5.00'}))
+        self.assertEqual((run.updated, run.skipped), (0, 1))
+        self.assertEqual(run.skip_reasons, {'unchanged': 0, 'duplicate': 1})
+        self.assertFalse(LoanRateChange.objects.exists())
+
+    def test_rates_are_clamped(self):
+        run = reprice(RepricingRun.objects.create(rule={'rate_change': '-7.00', 'customer_ids': [self.safe.pk]}))
+        self.assertEqual(run.updated, 1)
+        self.assertEqual(Loan.objects.get(pk=self.loans[2].pk).annual_rate, Decimal('0.00'))
+
+        # Already at the floor: matched, but skipped as unchanged
+        run = reprice(RepricingRun.objects.create(rule={'rate_change': '-1.00', 'customer_ids': [self.safe.pk]}))
+        self.assertEqual((run.matched, run.updated, run.skipped), (1, 0, 1))
+        self.assertEqual(run.skip_reasons, {'unchanged': 1, 'duplicate': 0})
+        self.assertFalse(LoanRateChange.objects.filter(run=run).exists())
+
+    def test_rerun_resumes_without_applying_twice(self):
+        run = reprice(RepricingRun.objects.create(rule=self.rule))
+        reprice(run)
+        self.assertEqual(self.rates()[self.loans[1].pk], '6.00')
+        self.assertEqual(LoanRateChange.objects.count(), 2)
+
+    def test_portfolio_stays_in_sync(self):
+        from partners.models import PartnerPortfolio
+        from partners.portfolio import TOTAL_FIELDS, rebuild_portfolios
+        reprice(RepricingRun.objects.create(rule=self.rule))
+        incremental = PartnerPortfolio.objects.filter(partner=self.partner).values(*TOTAL_FIELDS).get()
+        rebuild_portfolios([self.partner.pk])
+        self.assertEqual(incremental, PartnerPortfolio.objects.filter(partner=self.partner).values(*TOTAL_FIELDS).get())
+
+    def test_reprice_endpoint(self):
+        url = '/api/loanoffers/reprice/'
+        self.assertEqual(self.client.post(url, {**self.rule, 'dry_run': True}, format='json').json()['matched'], 2)
+        self.assertEqual(self.client.post(url, {'rate_change': '0'}, format='json').status_code, 400)
+        self.assertFalse(RepricingRun.objects.exists())
+
+        response = self.client.post(url, self.rule, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 2)
+
+        history = self.client.get(f'/api/loanoffers/{self.loans[0].pk}/rate-changes/').json()
+        self.assertEqual([(row['old_rate'], row['new_rate']) for row in history], [('5.00', '5.50')])
+
+    def test_background_run(self):
+        from jobs.worker import Worker
+        response = self.client.post('/api/loanoffers/reprice/', {**self.rule, 'background': True}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(RepricingRun.objects.get().status, 'queued')
+        Worker(processes=0).run(burst=True)
+        self.assertEqual(RepricingRun.objects.get().status, 'completed')
+        self.assertEqual(self.client.get(response['Location']).json()['result']['updated'], 2)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('reprice_loans', '--rate-change', '0.5', '--credit-score-below', '650',
+                     '--partner', str(self.partner.pk), stdout=out)
+        self.assertIn('2 repriced, 0 skipped', out.getvalue())
+        self.assertEqual(self.rates()[self.loans[3].pk], '5.00')
+
+        with self.assertRaisesMessage(CommandError, '--rate-change'):
+            call_command('reprice_loans', '--partner', str(self.partner.pk), stdout=io.StringIO())
+
+
+class LoanArchiveTests(APITestCase):
+    def setUp(self):
+        from partners.models import Partner
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        self.customer = Customer.objects.create(first_name='Ada', last_name='L', email='ada@example.com',
+                                                income=Decimal('9000.00'), credit_score=720)
+        self.partner.customers.add(self.customer)
+        now = timezone.now()
+        # (amount, rate, age in days): the first is old, the second requoted by the third a week later
+        self.loans = []
+        for amount, rate, days in [('5000.00', '5.00', 400), ('10000.00', '6.00', 30),
+                                   ('10000.00', '5.50', 23), ('10000.00', '7.00', 30), ('8000.00', '6.00', 2)]:
+            loan = Loan.objects.create(customer=self.customer, loan_amount=Decimal(amount),
+                                       annual_rate=Decimal(rate), term_months=36)
+            Loan.objects.filter(pk=loan.pk).update(created_at=now - timedelta(days=days))
+            self.loans.append(loan)
+        self.url = f'/api/customers/{self.customer.pk}/loanoffers/'
+
+    def test_moves_old_and_superseded_offers(self):
+        result = archive.archive(older_than_days=365, superseded=True, chunk_size=1)
+        self.assertEqual((result['age'], result['superseded'], result['archived']), (1, 2, 3))
+        archived = {loan.pk: loan.reason for loan in ArchivedLoan.objects.all()}
+        self.assertEqual(archived, {self.loans[0].pk: 'age', self.loans[1].pk: 'superseded',
+                                    self.loans[3].pk: 'superseded'})
+        self.assertEqual(set(Loan.objects.values_list('pk', flat=True)), {self.loans[2].pk, self.loans[4].pk})
+        copy = ArchivedLoan.objects.get(pk=self.loans[1].pk)
+        self.assertEqual((copy.loan_amount, copy.annual_rate, copy.monthly_payment),
+                         (Decimal('10000.00'), Decimal('6.00'), self.loans[1].monthly_payment))
+
+    def test_keeps_64_bit_ids(self):
+        big = Loan.objects.create(id=2**31 + 7, customer=self.customer, loan_amount=Decimal('5000.00'),
+                                  annual_rate=Decimal('9.00'), term_months=36)
+        Loan.objects.filter(pk=big.pk).update(created_at=timezone.now() - timedelta(days=400))
+        archive.archive(older_than_days=365)
+        self.assertEqual(ArchivedLoan.objects.get(pk=2**31 + 7).reason, 'age')
+        self.assertFalse(Loan.objects.filter(pk=big.pk).exists())
+
+    def test_offers_of_one_grid_do_not_supersede_each_other(self):
+        self.assertFalse(archive.candidates(superseded=True).filter(pk=self.loans[2].pk).exists())
+        self.assertFalse(archive.candidates().exists())
+
+    def test_portfolio_stays_in_sync(self):
+        from partners.models import PartnerPortfolio
+        from partners.portfolio import TOTAL_FIELDS, rebuild_portfolios
+        archive.archive(older_than_days=365, superseded=True)
+        incremental = PartnerPortfolio.objects.filter(partner=self.partner).values(*TOTAL_FIELDS).get()
+        self.assertEqual(incremental['loan_count'], 2)
+        rebuild_portfolios([self.partner.pk])
+        self.assertEqual(incremental, PartnerPortfolio.objects.filter(partner=self.partner).values(*TOTAL_FIELDS).get())
+
+    def test_loan_offers_read_through(self):
+        hot = self.client.get(self.url).json()
+        self.assertEqual(len(hot), 5)
+        archive.archive(older_than_days=365, superseded=True)
+        self.assertEqual([row['id'] for row in self.client.get(self.url).json()],
+                         [self.loans[4].pk, self.loans[2].pk])
+
+        response = self.client.get(self.url, {'include_archived': 'true'})
+        self.assertEqual(response.status_code, 200)
+        rows = response.json()
+        self.assertEqual([row['id'] for row in rows], [row['id'] for row in hot])
+        by_id = {row['id']: row for row in rows}
+        self.assertEqual(by_id[self.loans[0].pk]['reason'], 'age')
+        self.assertNotIn('reason', by_id[self.loans[4].pk])
+        for before in hot:
+            self.assertEqual({key: by_id[before['id']][key] for key in before}, before)
+        self.assertEqual(self.client.get(self.url, {'include_archived': 'maybe'}).status_code, 400)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('archive_loans', '--older-than-days', '365', '--superseded', '--dry-run', stdout=out)
+        self.assertIn('3 offer(s) to archive: 1 by age, 2 superseded', out.getvalue())
+        self.assertEqual(Loan.objects.count(), 5)
+        call_command('archive_loans', '--no-age', '--superseded', '--chunk-size', '1', stdout=out)
+        self.assertIn('Archived 2 offer(s): 0 by age, 2 superseded', out.getvalue())
+        call_command('archive_loans', stdout=out)
+        self.assertIn('Archived 1 offer(s): 1 by age', out.getvalue())
+        self.assertEqual(Loan.objects.count(), 2)
+
+
+class StressTestSimulationTests(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                           income=Decimal('9000.00'), credit_score=580)
+        Loan.objects.bulk_create([
+            Loan(customer=customer, loan_amount=Decimal(amount), annual_rate=Decimal(rate), term_months=term)
+            for amount, rate, term in [('10000.00', '7.25', 36), ('2500.00', '0.00', 12), ('40000.00', '12.00', 120)]
+        ])
+        self.portfolio = simulation.portfolio_arrays(Loan.objects.all())
+
+    def test_no_defaults_and_no_shock_lose_nothing(self):
+        result = simulation.run_stress_test(self.portfolio, paths=300, processes=1,
+                                            scenario={'pd_multiplier': 0})
+        self.assertEqual(result['loans'], 3)
+        self.assertEqual(set(result['loss_percentiles'].values()), {0.0})
+
+    def test_balance_matches_amortization_schedule(self):
+        schedule = list(amortization_schedule(Decimal('10000.00'), Decimal('7.25'), 36))
+        balance = simulation._balance(np.array([10000.0]), np.array([7.25 / 1200]), np.array([36.0]),
+                                      np.array([12.0]))
+        self.assertAlmostEqual(float(balance[0]), float(schedule[11]['balance']), delta=0.05)
+
+    def test_same_seed_same_result_on_any_number_of_processes(self):
+        kwargs = dict(paths=600, seed=11, scenario={'rate_shock_vol_bps': 50})
+        one = simulation.run_stress_test(self.portfolio, processes=1, **kwargs)
+        two = simulation.run_stress_test(self.portfolio, processes=2, **kwargs)
+        self.assertEqual(one['loss_percentiles'], two['loss_percentiles'])
+        self.assertNotEqual(one['loss_percentiles'],
+                            simulation.run_stress_test(self.portfolio, processes=1, **{**kwargs, 'seed': 12})
+                            ['loss_percentiles'])
+
+    def test_stress_raises_losses(self):
+        base = simulation.run_stress_test(self.portfolio, paths=1000, seed=3, processes=1)
+        recession = simulation.run_stress_test(self.portfolio, paths=1000, seed=3, processes=1,
+                                               scenario={'pd_multiplier': 3, 'correlation': 0.4})
+        shock = simulation.run_stress_test(self.portfolio, paths=1000, seed=3, processes=1,
+                                           scenario={'pd_multiplier': 0, 'rate_shock_bps': 300})
+        self.assertGreater(recession['expected_loss'], base['expected_loss'])
+        self.assertGreater(shock['loss_percentiles']['50'], 0)
+        percentiles = list(base['loss_percentiles'].values())
+        self.assertEqual(percentiles, sorted(percentiles))
+        self.assertGreaterEqual(base['expected_shortfall_99'], base['loss_percentiles']['99'])
+
+
+class AffordabilityTests(TestCase):
+    def test_max_principal_pays_back_at_the_ceiling(self):
+        for rate in ('0.00', '0.01', '7.25', '35.50', '99.99'):
+            [[principal_12, principal_600]] = affordability.max_principals([1500], Decimal(rate), [12, 600])
+            for principal, term in ((principal_12, 12), (principal_600, 600)):
+                payment = monthly_payment(Decimal(str(principal)), Decimal(rate), term)
+                self.assertAlmostEqual(float(payment), 1500, places=6)
+
+    def test_min_terms_match_a_search_of_the_table(self):
+        rng = np.random.default_rng(7)
+        principals, payments = rng.uniform(100, 100_000, 5000), rng.uniform(10, 3000, 5000)
+        for rate in ('0.00', '4.99', '24.00', '100.00'):
+            factors = affordability.annuity_factors()[int(Decimal(rate) * 100)]
+            expected = np.searchsorted(factors, principals / payments) + 1
+            expected[expected > affordability.MAX_TERM] = 0
+            np.testing.assert_array_equal(affordability.min_terms(principals, payments, Decimal(rate)), expected)
+
+    def test_batch_results(self):
+        rows = [(1, Decimal('4000.00'), 700), (2, Decimal('4000.00'), 450), (3, Decimal('10.00'), 800)]
+        results = affordability.affordability(rows, Decimal('0.00'), [12, 24], loan_amount=Decimal('14000.00'))
+        self.assertEqual(results[0], {
+            'customer': 1,
+            'max_monthly_payment': Decimal('1400.00'),
+            'max_loan_amount': {'12': Decimal('16800.00'), '24': Decimal('33600.00')},
+            'qualifies_up_to': Decimal('24000.00'),  # capped by the income rule
+            'min_term_months': 10,
+        })
+        self.assertEqual(results[1]['qualifies_up_to'], Decimal('0.00'))  # bad credit
+        self.assertEqual(results[2]['max_monthly_payment'], Decimal('3.50'))
+        self.assertIsNone(results[2]['min_term_months'])  # 600 x 3.50 < 14000
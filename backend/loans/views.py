@@ -1,12 +1,32 @@
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from .models import Loan
-from .serializers import LoanSerializer
+from app.exports import ExportMixin
+from app.fast_lists import ValuesListMixin
+from app.idempotency import idempotent
+from app.pagination import TieBreakingOrderingFilter
+from app.query_params import boolean_param
+from .amortization import amortization_schedule
+from .models import Loan, RepricingRun
+from .quotes import build_quote, quote_cache, quote_monthly_payments
+from . import repricing
+from .serializers import (
+    LoanExportSerializer, LoanQuoteResultSerializer, LoanQuoteSerializer, LoanRateChangeSerializer, LoanSerializer,
+    RepricingRuleSerializer, RepricingRunSerializer,
+)
 from customers.models import Customer
+from jobs.queue import enqueue
+from jobs.views import accepted
 from django.shortcuts import get_object_or_404
 
 
-class LoanOfferViewSet(viewsets.ModelViewSet):
+class LoanOfferViewSet(ExportMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing loan offers.
     Provides standard CRUD operations.
@@ -14,12 +34,38 @@ class LoanOfferViewSet(viewsets.ModelViewSet):
     """
     serializer_class = LoanSerializer
     queryset = Loan.objects.all() # get all loans
+    filter_backends = [TieBreakingOrderingFilter]
+    ordering_fields = ['monthly_payment', 'loan_amount', 'annual_rate', 'term_months', 'created_at']
+    ordering = ('-created_at', '-id')  # as CreatedAtCursorPagination
+    # ?monthly_payment__lte=500 etc., served by the monthly_payment index
+    range_filters = ('monthly_payment__lt', 'monthly_payment__lte', 'monthly_payment__gt', 'monthly_payment__gte')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for lookup in self.range_filters:
+            value = self.request.query_params.get(lookup)
+            if value is None:
+                continue
+            try:
+                value = Decimal(value)
+            except InvalidOperation:
+                value = None
+            if value is None or not value.is_finite():
+                raise ValidationError({lookup: ['A valid number is required.']})
+            queryset = queryset.filter(**{lookup: value})
+        qualified = boolean_param(self.request, 'qualified')
+        if qualified is not None:
+            # Eligibility evaluated in SQL, so the filter costs no extra queries
+            queryset = queryset.qualified(qualified)
+        return queryset
 
+    @idempotent('loanoffer-create')
     def create(self, request, *args, **kwargs):
         """
         Create a new loan offer.
         Endpoint: POST /loanoffers
         Expected data: customer_id (or customer), loan_amount, interest_rate (or annual_rate), term_months
+        Send an Idempotency-Key header to make retries return the first response.
         """
         data = request.data.copy()
         
@@ -43,3 +89,106 @@ class LoanOfferViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'], url_path='schedule')
+    def schedule(self, request, pk=None):
+        """
+        Stream the month-by-month amortization schedule as NDJSON.
+        Endpoint: GET /loanoffers/{id}/schedule
+        """
+        loan = self.get_object()
+        if not loan.term_months or loan.term_months <= 0:
+            return Response(
+                {'error': 'Loan has no valid term'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        def rows():
+            for row in amortization_schedule(loan.loan_amount, loan.annual_rate, loan.term_months):
+                yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+        return StreamingHttpResponse(rows(), content_type='application/x-ndjson')
+
+    @action(detail=False, methods=['get'], url_path='export', streaming_export=True)
+    def export(self, request, *args, **kwargs):
+        """
+        Stream every loan offer as CSV (default) or NDJSON, in id order.
+        Endpoint: GET /loanoffers/export?format=csv|ndjson
+        Filters: created_at__gte/__lte/__gt/__lt, issue_date__gte/..., plus
+        the list filters (qualified, monthly_payment ranges) and ?fields=
+        """
+        return self.export_response(
+            self.get_queryset(), LoanExportSerializer(context=self.get_serializer_context()),
+            'loanoffers', date_fields=('created_at', 'issue_date'),
+        )
+
+    @action(detail=False, methods=['post'], url_path='reprice')
+    def reprice(self, request):
+        """
+        Apply a rate change to every matching offer, recording old -> new.
+        Endpoint: POST /loanoffers/reprice
+        Expected data: rate_change and optional partner_ids, customer_ids,
+        credit_score_lt/_gte, annual_rate_gte/_lte, term_months;
+        dry_run=true only counts the matches, background=true queues a job (202)
+        """
+        serializer = RepricingRuleSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        rule = serializer.to_rule()
+        if serializer.validated_data['dry_run']:
+            return Response({'rule': rule, 'matched': repricing.matching_loans(rule).count()})
+
+        run = RepricingRun.objects.create(rule=rule)
+        if serializer.validated_data['background']:
+            return accepted(enqueue('loans.reprice', run_id=run.pk), request)
+        return Response(RepricingRunSerializer(repricing.reprice(run)).data)
+
+    @action(detail=True, methods=['get'], url_path='rate-changes')
+    def rate_changes(self, request, pk=None):
+        """
+        Audit trail of the repricing runs that changed this offer, newest first.
+        Endpoint: GET /loanoffers/{id}/rate-changes
+        """
+        loan = self.get_object()
+        changes = loan.rate_changes.select_related('run').order_by('-run__created_at', '-id')
+        return Response(LoanRateChangeSerializer(changes, many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='quote')
+    def quote(self, request):
+        """
+        Price a loan and check eligibility without saving anything.
+        Endpoint: POST /loanoffers/quote
+        (the frontend uses the async POST /async/loanoffers/quote)
+        Expected data: loan_amount, interest_rate (or annual_rate), term_months,
+        and optionally customer or income + credit_score
+        """
+        serializer = LoanQuoteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        [payment] = quote_monthly_payments([(data['loan_amount'], data['annual_rate'], data['term_months'])])
+        return Response(LoanQuoteResultSerializer(build_quote(data, payment)).data)
+
+    @action(detail=False, methods=['post'], url_path='quote/batch')
+    def quote_batch(self, request):
+        """
+        Price a list of loans in one call.
+        Endpoint: POST /loanoffers/quote/batch
+        """
+        serializer = LoanQuoteSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        quotes = serializer.validated_data
+        payments = quote_monthly_payments(
+            [(data['loan_amount'], data['annual_rate'], data['term_months']) for data in quotes]
+        )
+        results = [build_quote(data, payment) for data, payment in zip(quotes, payments)]
+        return Response(LoanQuoteResultSerializer(results, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='quote/stats')
+    def quote_stats(self, request):
+        """
+        Hit/miss counters for the quote cache.
+        Endpoint: GET /loanoffers/quote/stats
+        """
+        return Response(quote_cache.stats())
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PartnersConfig(AppConfig):
     name = 'partners'
+
+    def ready(self):
+        from partners import jobs, signals  # noqa: F401  (registers the job handlers, connects the receivers)
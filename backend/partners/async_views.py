@@ -0,0 +1,23 @@
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_GET
+
+from app.streaming import stream_json_array
+from customers.models import Customer
+from customers.serializers import CustomerSerializer
+from partners.models import Partner
+
+
+@require_GET
+async def partner_customers(request, pk):
+    """
+    Async, streamed version of GET on PartnerViewSet.create_customer.
+    Endpoint: GET /async/partners/{id}/customers
+    """
+    partner = await aget_object_or_404(Partner.objects.only('id'), pk=pk)
+    customers = Customer.objects.filter(partners=partner).aiterator(chunk_size=500)
+    serializer = CustomerSerializer()
+    return StreamingHttpResponse(
+        stream_json_array(customers, serializer.to_representation),
+        content_type='application/json',
+    )
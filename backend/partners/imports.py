@@ -0,0 +1,92 @@
+import csv
+
+from rest_framework import serializers
+
+from app.parsers import read_csv_rows
+from customers.models import Customer
+from customers.serializers import CustomerSerializer
+
+
+# Chunk size for the IN (...) lookups; stays below SQLite's variable limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+class CustomerImportSerializer(CustomerSerializer):
+    """
+    CustomerSerializer without the per-row uniqueness queries; duplicates are
+    checked for the whole import at once in validate_customer_rows().
+    """
+    email = serializers.EmailField(max_length=254)
+
+    class Meta(CustomerSerializer.Meta):
+        validators = []
+
+
+def rows_from_request(request):
+    """Return import rows from a JSON array, a CSV body or an uploaded CSV file."""
+    upload = request.FILES.get('file')
+    if upload is not None:
+        try:
+            return read_csv_rows(upload)
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise serializers.ValidationError({'file': [f'CSV parse error - {exc}']})
+    rows = request.data
+    if not isinstance(rows, list):
+        raise serializers.ValidationError({'non_field_errors': ['Expected a list of customers or a CSV file.']})
+    return rows
+
+
+def _chunks(items, size=LOOKUP_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def validate_customer_rows(rows):
+    """
+    Validate import rows with the CustomerSerializer rules and reject
+    duplicates on email and (first_name, last_name, address), both within
+    the import and against existing customers.
+    Returns (unsaved Customer instances, [{'row': index, 'errors': {...}}]).
+    """
+    # One serializer for every row: building the fields dominates is_valid()
+    serializer = CustomerImportSerializer()
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, serializer.run_validation(row)))
+        except serializers.ValidationError as exc:
+            errors.append({'row': index, 'errors': serializers.as_serializer_error(exc)})
+
+    emails = [data['email'] for _, data in valid]
+    taken_emails = set()
+    for chunk in _chunks(emails):
+        taken_emails.update(Customer.objects.filter(email__in=chunk).values_list('email', flat=True))
+
+    # NULL addresses never collide in the database, so only full triples are checked
+    last_names = sorted({data['last_name'] for _, data in valid if data.get('address') is not None})
+    taken_names = set()
+    for chunk in _chunks(last_names):
+        taken_names.update(
+            Customer.objects.filter(last_name__in=chunk, address__isnull=False)
+            .values_list('first_name', 'last_name', 'address')
+        )
+
+    customers = []
+    for index, data in valid:
+        name_key = (data['first_name'], data['last_name'], data.get('address'))
+        row_errors = {}
+        if data['email'] in taken_emails:
+            row_errors['email'] = ['customer with this email already exists.']
+        if name_key[2] is not None and name_key in taken_names:
+            row_errors['non_field_errors'] = [
+                'The fields first_name, last_name, address must make a unique set.'
+            ]
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+            continue
+        taken_emails.add(data['email'])
+        taken_names.add(name_key)
+        customers.append(Customer(**data))
+
+    errors.sort(key=lambda error: error['row'])
+    return customers, errors
@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+from django.conf import settings
+
+from jobs.queue import register
+from jobs.worker import cpu_share
+from loans.models import Loan, set_monthly_payments
+from loans.simulation import portfolio_arrays, run_stress_test
+from partners.models import Partner
+
+
+# Background handlers for partner-wide work (see jobs.queue). Jobs can run
+# more than once, so each handler leaves the same end state when rerun.
+
+
+@register('partners.requote_loans')
+def requote_loans(partner_id, batch_size=2000):
+    """
+    Re-price the stored monthly payment of every loan held by the partner's
+    customers, batch_size loans per UPDATE. Only changed rows are written.
+    """
+    loans = Loan.objects.filter(customer__partners=partner_id).order_by('pk').only(
+        'id', 'customer_id', 'loan_amount', 'annual_rate', 'term_months', 'monthly_payment'
+    )
+    seen = updated = 0
+    last_pk = 0
+    while chunk := list(loans.filter(pk__gt=last_pk)[:batch_size]):
+        last_pk = chunk[-1].pk
+        stored = [loan.monthly_payment for loan in chunk]
+        set_monthly_payments(chunk)
+        changed = [loan for loan, payment in zip(chunk, stored) if loan.monthly_payment != payment]
+        if changed:
+            Loan.objects.bulk_update(changed, ['monthly_payment'], batch_size=batch_size)
+        seen += len(chunk)
+        updated += len(changed)
+    return {'loans': seen, 'updated': updated}
+
+
+@register('partners.generate_loan_offers')
+def generate_loan_offers(partner_id, annual_rates, term_months, customer_ids=None, loan_amount=None):
+    """The rate x term grid of PartnerViewSet.generate_loan_offers, run off the request thread."""
+    partner = Partner.objects.get(pk=partner_id)
+    customers = partner.customers.all()
+    if customer_ids is not None:
+        customers = customers.filter(id__in=customer_ids)
+
+    offers = created = 0
+    for chunk_created, chunk in partner.generate_loan_offers(
+        customers.iterator(chunk_size=2000), [Decimal(rate) for rate in annual_rates], term_months,
+        loan_amount=Decimal(loan_amount) if loan_amount is not None else None,
+    ):
+        offers += len(chunk)
+        created += chunk_created
+    return {'offers': offers, 'created': created}
+
+
+@register('partners.stress_test')
+def stress_test(partner_id, paths, seed, scenario):
+    """Loss distribution of the partner's book under a default / rate-shock scenario."""
+    portfolio = portfolio_arrays(Loan.objects.filter(customer__partners=partner_id))
+    return {
+        'partner': partner_id,
+        **run_stress_test(portfolio, paths=paths, seed=seed, scenario=scenario,
+                          processes=getattr(settings, 'STRESS_TEST_PROCESSES', None) or cpu_share()),
+    }
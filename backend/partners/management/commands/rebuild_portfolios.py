@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from partners.portfolio import rebuild_portfolios
+
+
+class Command(BaseCommand):
+    help = "Recompute PartnerPortfolio totals from the loan table (backfills and drift repair)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--partner", dest="partner_ids", nargs="+", type=int,
+                            help="Only rebuild these partners (default: all)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            count = rebuild_portfolios(options["partner_ids"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {count} portfolio(s) in {time.perf_counter() - start:.2f}s"
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartnerPortfolio',
+            fields=[
+                ('partner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='portfolio', serialize=False, to='partners.partner')),
+                ('loan_count', models.IntegerField(default=0)),
+                ('qualified_count', models.IntegerField(default=0)),
+                ('total_principal', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('rate_weighted_principal', models.DecimalField(decimal_places=4, default=0, max_digits=20)),
+                ('term_months_total', models.BigIntegerField(default=0)),
+                ('monthly_payment_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Partner portfolio',
+                'verbose_name_plural': 'Partner portfolios',
+                'db_table': 'partner_portfolio_table',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_search'),
+        ('partners', '0002_partnerportfolio'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='partner',
+            name='partner_tab_created_53cc6e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='partner',
+            index=models.Index(fields=['created_at', 'id'], name='partner_tab_created_ac79de_idx'),
+        ),
+    ]
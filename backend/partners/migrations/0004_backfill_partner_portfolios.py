@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 19:55
+
+from django.db import migrations
+
+
+def build_missing_portfolios(apps, schema_editor):
+    # Partners created before 0002 or by bulk_create had no row; the portfolio
+    # endpoint no longer builds one on read. Totals come from the current
+    # partners.portfolio code, which only aggregates long-standing columns.
+    from partners.portfolio import rebuild_portfolios
+
+    Partner = apps.get_model('partners', 'Partner')
+    missing = Partner.objects.using(schema_editor.connection.alias).filter(portfolio__isnull=True)
+    rebuild_portfolios(missing.values_list('pk', flat=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0008_repricingrun_skip_reasons'),
+        ('partners', '0003_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_missing_portfolios, migrations.RunPython.noop),
+    ]
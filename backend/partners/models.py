@@ -1,9 +1,19 @@
-from django.db import models, IntegrityError  
+from django.db import models, transaction, IntegrityError  
+from django.db.models.signals import m2m_changed
+from functools import partial
+from app.signals import bulk_write
 from customers.models import Customer
-from loans.models import Loan
+from loans.models import Loan, set_monthly_payments
+from decimal import Decimal
 
 # Create your models here.
 
+class PartnerQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        return bulk_write(self, objs, True, partial(super().bulk_create, objs, *args, **kwargs))
+
+
 class Partner(models.Model):
     company_name = models.CharField(max_length=100)
     address =models.TextField()
@@ -11,6 +21,8 @@ class Partner(models.Model):
     customers = models.ManyToManyField(Customer, related_name="partners", blank=True)
     #updated_at= models.DateTimeField(auto_now=True)
 
+    objects = PartnerQuerySet.as_manager()
+
  
     class Meta:
         ordering = ['-created_at'] # Default ordering by last name
@@ -18,7 +30,7 @@ class Partner(models.Model):
         verbose_name = 'Partner'  # Human-readable name
         unique_together = ('company_name','address')  # Unique constraint
         indexes = [
-            models.Index(fields=["created_at"]),
+            models.Index(fields=['created_at', 'id']),  # cursor pagination
         ]
 
     def __str__(self):
@@ -38,30 +50,137 @@ class Partner(models.Model):
         except Exception as e: 
             return f"there was an error {e}"
 
+    def import_customers(self, customers, batch_size=1000):
+        """
+        Bulk insert unsaved Customer instances and link them to this partner,
+        all in one transaction. Returns the saved customers.
+        """
+        Membership = Partner.customers.through
+        created = []
+        with transaction.atomic():
+            for start in range(0, len(customers), batch_size):
+                chunk = Customer.objects.bulk_create(customers[start:start + batch_size])
+                Membership.objects.bulk_create(
+                    [Membership(partner_id=self.id, customer_id=customer.id) for customer in chunk]
+                )
+                created.extend(chunk)
+            # bulk_create skips m2m_changed; send it like customers.add() would
+            m2m_changed.send(
+                sender=Membership, instance=self, action='post_add', reverse=False,
+                model=Customer, pk_set={customer.id for customer in created}, using=self._state.db,
+            )
+        return created
+
     #create select_loan_issue_date() function 
 
     def create_customer_loan(self, customer_instance, loan_amount=None, annual_rate=20, term_months=12): 
         """ 
         Create a loan for a customer.
         If loan_amount is not provided, uses customer's max_loan_amount.
+        An offer with the same terms that already exists (e.g. from a retried
+        request) is returned instead of raising.
         """
         if loan_amount is None:
             loan_amount = customer_instance.max_loan_amount
         
         if not loan_amount > 100:
             return f"customer does not qualify for a loan"
+        terms = dict(customer=customer_instance, loan_amount=Decimal(loan_amount).quantize(Decimal('0.01')),
+                     annual_rate=Decimal(annual_rate).quantize(Decimal('0.01')), term_months=term_months)
         try:
-            loan = Loan.objects.create(
-                customer=customer_instance,
-                loan_amount=loan_amount,
-                annual_rate=annual_rate, 
-                term_months=term_months,
-            )
-            return loan
+            with transaction.atomic():
+                return Loan.objects.create(**terms)
         except IntegrityError as e:
-            raise IntegrityError(f"there was an issue creating a customer loan {e}")
-        except Exception as e:
-            raise Exception(f"there was an error creating a customer loan {e}")
+            existing = Loan.objects.filter(**terms).first()
+            if existing is None:
+                raise IntegrityError(f"there was an issue creating a customer loan {e}") from e
+            return existing
+
+    def generate_loan_offers(self, customers, annual_rates, term_months, loan_amount=None, chunk_size=500):
+        """
+        Create one offer per customer for every (rate, term) pair in the grid.
+        Customers failing has_sufficient_income/has_good_credit are skipped,
+        as are offers of 100 or less (see create_customer_loan). Offers that
+        already exist are left alone by the unique constraint.
+        Prices and inserts chunk_size customers at a time, so only one
+        chunk's grid is in memory, and yields (created, offers) per chunk:
+        how many offers the insert added and the chunk's unsaved offers with
+        their monthly_payment set.
+        """
+        chunk = []
+        for customer in customers:
+            chunk.append(customer)
+            if len(chunk) == chunk_size:
+                yield self._generate_chunk(chunk, annual_rates, term_months, loan_amount)
+                chunk = []
+        if chunk:
+            yield self._generate_chunk(chunk, annual_rates, term_months, loan_amount)
+
+    def _generate_chunk(self, customers, annual_rates, term_months, loan_amount):
+        offers = []
+        for customer in customers:
+            amount = loan_amount if loan_amount is not None else customer.max_loan_amount
+            amount = Decimal(amount).quantize(Decimal('0.01'))
+            if not amount > 100:
+                continue
+            probe = Loan(customer=customer, loan_amount=amount)
+            if not probe.qualify_for_loan():
+                continue
+            for rate in annual_rates:
+                for term in term_months:
+                    offers.append(Loan(customer=customer, loan_amount=amount,
+                                       annual_rate=rate, term_months=term))
+        if not offers:
+            return 0, offers
+
+        set_monthly_payments(offers)
+        # ignore_conflicts does not report what it inserted: count the chunk's
+        # customers' offers around the insert, in its transaction
+        chunk_loans = Loan.objects.filter(customer_id__in={offer.customer_id for offer in offers})
+        with transaction.atomic(savepoint=False):
+            existing = chunk_loans.count()
+            Loan.objects.bulk_create(offers, batch_size=1000, ignore_conflicts=True)
+            return chunk_loans.count() - existing, offers
+
+
+class PartnerPortfolio(models.Model):
+    """
+    Running loan totals for one partner's customers, kept current by the
+    receivers in partners.signals (see partners.portfolio) so dashboards read
+    one row instead of aggregating every loan.
+    """
+    partner = models.OneToOneField(Partner, on_delete=models.CASCADE, primary_key=True, related_name='portfolio')
+    loan_count = models.IntegerField(default=0)
+    qualified_count = models.IntegerField(default=0)
+    total_principal = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    rate_weighted_principal = models.DecimalField(max_digits=20, decimal_places=4, default=0)  # sum of amount x rate
+    term_months_total = models.BigIntegerField(default=0)
+    monthly_payment_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'partner_portfolio_table'
+        verbose_name = 'Partner portfolio'
+        verbose_name_plural = 'Partner portfolios'
+
+    def __str__(self):
+        return f"Portfolio {self.partner_id}"
+
+    @property
+    def weighted_average_rate(self):
+        if not self.total_principal:
+            return Decimal('0.00')
+        return (Decimal(self.rate_weighted_principal) / Decimal(self.total_principal)).quantize(Decimal('0.01'))
+
+    @property
+    def average_term_months(self):
+        if not self.loan_count:
+            return Decimal('0.00')
+        return (Decimal(self.term_months_total) / self.loan_count).quantize(Decimal('0.01'))
+
+    @property
+    def eligibility_ratio(self):
+        return round(self.qualified_count / self.loan_count, 4) if self.loan_count else 0.0
 
  
 """ def get_all_customers(self):
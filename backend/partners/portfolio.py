@@ -0,0 +1,184 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from loans.models import Loan
+from partners.models import Partner, PartnerPortfolio
+
+
+# Incremental maintenance of PartnerPortfolio.
+#
+# Every change is applied as a delta: the totals of the affected loans after
+# the change minus their totals before it, added with F() expressions to the
+# portfolio of each partner the loans' customer belongs to. Single-row
+# writes therefore cost one small aggregate plus one UPDATE per partner, and
+# bulk writes aggregate over the written rows only, never a partner's whole
+# book. bulk_create(ignore_conflicts=True) cannot say which rows went in, so
+# it is measured over the rows that may hold the new offers' unique keys
+# (customer, amount, rate, term) before and after the insert.
+# rebuild_portfolios recomputes partners in full, for repairs.
+
+TOTAL_FIELDS = (
+    'loan_count', 'qualified_count', 'total_principal',
+    'rate_weighted_principal', 'term_months_total', 'monthly_payment_total',
+)
+CUSTOMER_CHUNK_SIZE = 500
+
+
+def _zero(field):
+    return Coalesce(field, Value(0), output_field=DecimalField())
+
+
+TOTALS = {
+    'loan_count': Count('id'),
+    'qualified_count': Count('id', filter=Q(qualifies=True)),
+    'total_principal': _zero(Sum('loan_amount')),
+    'rate_weighted_principal': _zero(Sum(F('loan_amount') * F('annual_rate'), output_field=DecimalField())),
+    'term_months_total': Coalesce(Sum('term_months'), Value(0)),
+    'monthly_payment_total': _zero(Sum('monthly_payment')),
+}
+
+
+def loan_totals(loans):
+    """Portfolio totals of a Loan queryset as one dict."""
+    return loans.with_eligibility().aggregate(**TOTALS)
+
+
+def loan_totals_by_partner(loans, partner_ids=None):
+    """
+    Portfolio totals of a Loan queryset for each partner of the loans'
+    customers, or only for the given partners.
+    """
+    if partner_ids is None:
+        membership = Q(customer__partners__isnull=False)
+    else:
+        membership = Q(customer__partners__in=partner_ids)
+    rows = (
+        loans.filter(membership)
+        .with_eligibility()
+        .values(partner_key=F('customer__partners'))
+        .annotate(**TOTALS)
+        .order_by()
+    )
+    return {row.pop('partner_key'): row for row in rows}
+
+
+def _add_by_partner(totals, more):
+    for partner_id, row in more.items():
+        into = totals.setdefault(partner_id, dict.fromkeys(TOTAL_FIELDS, 0))
+        for field in TOTAL_FIELDS:
+            into[field] += row[field]
+    return totals
+
+
+def loan_totals_by_partner_of(loan_ids=(), customer_ids=()):
+    """loan_totals_by_partner() of these loans, or of these customers' loans, in chunks."""
+    totals = {}
+    for lookup, ids in (('pk__in', list(loan_ids)), ('customer_id__in', list(customer_ids))):
+        for start in range(0, len(ids), CUSTOMER_CHUNK_SIZE):
+            chunk = Loan.objects.filter(**{lookup: ids[start:start + CUSTOMER_CHUNK_SIZE]})
+            _add_by_partner(totals, loan_totals_by_partner(chunk))
+    return totals
+
+
+def loan_totals_by_partner_with_keys(loans):
+    """
+    loan_totals_by_partner() of the stored loans that may hold the unique
+    keys (customer, amount, rate, term) of these Loan instances, stored or
+    not. Per chunk of customers it takes every combination of the chunk's
+    amounts, rates and terms, so it also counts some other offers of those
+    customers; they are the same on both sides of a before/after difference.
+    """
+    by_customer = {}
+    for loan in loans:
+        by_customer.setdefault(loan.customer_id, []).append(loan)
+    customer_ids = list(by_customer)
+    totals = {}
+    for start in range(0, len(customer_ids), CUSTOMER_CHUNK_SIZE):
+        chunk = [loan for pk in customer_ids[start:start + CUSTOMER_CHUNK_SIZE] for loan in by_customer[pk]]
+        _add_by_partner(totals, loan_totals_by_partner(Loan.objects.filter(
+            customer_id__in=customer_ids[start:start + CUSTOMER_CHUNK_SIZE],
+            loan_amount__in={loan.loan_amount for loan in chunk},
+            annual_rate__in={loan.annual_rate for loan in chunk},
+            term_months__in={loan.term_months for loan in chunk},
+        )))
+    return totals
+
+
+def customer_loan_totals(customer_ids):
+    """loan_totals() of many customers, in chunks to stay under the SQL parameter limit."""
+    customer_ids = list(customer_ids)
+    totals = dict.fromkeys(TOTAL_FIELDS, 0)
+    for start in range(0, len(customer_ids), CUSTOMER_CHUNK_SIZE):
+        chunk = loan_totals(Loan.objects.filter(customer_id__in=customer_ids[start:start + CUSTOMER_CHUNK_SIZE]))
+        for field in TOTAL_FIELDS:
+            totals[field] += chunk[field]
+    return totals
+
+
+def difference(after, before):
+    """Per-partner after - before, leaving out partners whose totals did not move."""
+    deltas = {}
+    for partner_id in after.keys() | before.keys():
+        new, old = after.get(partner_id, {}), before.get(partner_id, {})
+        delta = {field: new.get(field, 0) - old.get(field, 0) for field in TOTAL_FIELDS}
+        if any(delta.values()):
+            deltas[partner_id] = delta
+    return deltas
+
+
+def apply_deltas(deltas, sign=1):
+    """
+    Add {partner_id: totals} to the stored portfolios (subtract with sign=-1).
+    Partners receiving the same delta, e.g. every partner of one loan's
+    customer, share a single UPDATE.
+    """
+    groups = {}
+    for partner_id, delta in deltas.items():
+        groups.setdefault(tuple(delta[field] for field in TOTAL_FIELDS), []).append(partner_id)
+
+    missing = []
+    for values, partner_ids in groups.items():
+        changes = {field: F(field) + sign * value for field, value in zip(TOTAL_FIELDS, values) if value}
+        if not changes:
+            continue
+        portfolios = PartnerPortfolio.objects.filter(partner_id__in=partner_ids)
+        if portfolios.update(**changes, updated_at=timezone.now()) < len(partner_ids):
+            missing.extend(set(partner_ids) - set(portfolios.values_list('partner_id', flat=True)))
+    if missing:
+        # No row yet (e.g. a partner from bulk_create): compute it in full
+        rebuild_portfolios(missing)
+
+
+def rebuild_portfolios(partner_ids=None, batch_size=1000):
+    """
+    Recompute portfolios from the loan table, for the given partners or all
+    of them. Returns the number of portfolios written.
+    """
+    partners = Partner.objects.order_by('pk')
+    if partner_ids is not None:
+        partner_ids = list(partner_ids)
+        if not partner_ids:
+            return 0
+        partners = partners.filter(pk__in=partner_ids)
+
+    # One transaction, so the totals are read from the database they are
+    # written to (app.db_router keeps reads in a transaction on default)
+    with transaction.atomic(savepoint=False):
+        totals = loan_totals_by_partner(Loan.objects.all(), partner_ids)
+        now = timezone.now()
+        portfolios = []
+        for partner_id in partners.values_list('pk', flat=True).iterator():
+            row = totals.get(partner_id, {})
+            portfolios.append(PartnerPortfolio(
+                partner_id=partner_id, updated_at=now,
+                **{field: row.get(field, 0) for field in TOTAL_FIELDS},
+            ))
+        PartnerPortfolio.objects.bulk_create(
+            portfolios, batch_size=batch_size, update_conflicts=True,
+            unique_fields=['partner'], update_fields=[*TOTAL_FIELDS, 'updated_at'],
+        )
+    return len(portfolios)
@@ -1,7 +1,9 @@
 from rest_framework import serializers
-from partners.models import Partner
+from partners.models import Partner, PartnerPortfolio
+from loans.serializers import LoanSerializer
+from app.serializers import FieldProjectionMixin
 
-class PartnerSerializer(serializers.ModelSerializer):
+class PartnerSerializer(FieldProjectionMixin, serializers.ModelSerializer):
 
 
     def get_customers(self, obj):
@@ -20,3 +22,52 @@ class PartnerSerializer(serializers.ModelSerializer):
     
 
 
+class LoanOfferGridSerializer(serializers.Serializer):
+    """Request body for generating offers over a rate x term grid."""
+    customer_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    annual_rates = serializers.ListField(
+        child=serializers.DecimalField(max_digits=4, decimal_places=2), allow_empty=False, max_length=20
+    )
+    term_months = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=20
+    )
+    loan_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    background = serializers.BooleanField(required=False, default=False)  # queue a job instead
+
+    def validate_annual_rates(self, value):
+        return sorted({LoanSerializer.validate_annual_rate(self, rate) for rate in value})
+
+    def validate_term_months(self, value):
+        return sorted({LoanSerializer.validate_term_months(self, term) for term in value})
+
+    def validate_loan_amount(self, value):
+        return LoanSerializer.validate_loan_amount(self, value)
+
+
+class PartnerPortfolioSerializer(serializers.ModelSerializer):
+    """Dashboard totals for a partner; principal outstanding is the sum of loan_amount."""
+    total_principal_outstanding = serializers.DecimalField(source='total_principal', max_digits=16, decimal_places=2)
+    weighted_average_rate = serializers.DecimalField(max_digits=6, decimal_places=2)
+    average_term_months = serializers.DecimalField(max_digits=8, decimal_places=2)
+    total_monthly_payment = serializers.DecimalField(source='monthly_payment_total', max_digits=16, decimal_places=2)
+    eligibility_ratio = serializers.FloatField()
+
+    class Meta:
+        model = PartnerPortfolio
+        fields = (
+            'partner', 'loan_count', 'qualified_count', 'total_principal_outstanding',
+            'weighted_average_rate', 'average_term_months', 'total_monthly_payment',
+            'eligibility_ratio', 'updated_at',
+        )
+        read_only_fields = fields
+
+
+class StressTestSerializer(serializers.Serializer):
+    """Request body for a Monte Carlo stress test (see loans.simulation)."""
+    paths = serializers.IntegerField(min_value=1, max_value=100_000, default=10_000)
+    seed = serializers.IntegerField(min_value=0, default=0)
+    pd_multiplier = serializers.FloatField(min_value=0, max_value=50, default=1.0)
+    correlation = serializers.FloatField(min_value=0, max_value=0.99, default=0.15)
+    lgd = serializers.FloatField(min_value=0, max_value=1, default=0.6)
+    rate_shock_bps = serializers.FloatField(min_value=-1000, max_value=2000, default=0.0)
+    rate_shock_vol_bps = serializers.FloatField(min_value=0, max_value=1000, default=0.0)
@@ -0,0 +1,150 @@
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from app import response_cache
+from app.signals import bulk_changed, bulk_changing
+from customers.models import Customer
+from loans.models import Loan
+from partners import portfolio
+from partners.models import Partner, PartnerPortfolio
+
+
+def lock_rows(queryset):
+    """
+    Hold these rows until the save's transaction ends (Loan.save and
+    Customer.save open one), so concurrent saves take their before-totals in
+    turn. SQLite needs no row lock: its IMMEDIATE transactions take the
+    database's write lock on BEGIN.
+    """
+    if connections[queryset.db].features.has_select_for_update:
+        list(queryset.select_for_update().values_list('pk'))
+
+
+@receiver(post_save, sender=Partner)
+@receiver(post_delete, sender=Partner)
+def invalidate_partner_responses(sender, instance, **kwargs):
+    response_cache.invalidate('partner-customers', instance.pk)
+
+
+@receiver(m2m_changed, sender=Partner.customers.through)
+def invalidate_membership_responses(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        response_cache.invalidate('partner-customers', instance.pk)
+    elif action == 'pre_clear':
+        # customer.partners.clear(): pk_set is not provided, so look it up first
+        response_cache.invalidate('partner-customers', *instance.partners.values_list('pk', flat=True))
+    else:
+        response_cache.invalidate('partner-customers', *pk_set)
+
+
+# Portfolio totals (partners.portfolio)
+
+@receiver(post_save, sender=Partner)
+def create_partner_portfolio(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        PartnerPortfolio.objects.get_or_create(partner=instance)
+
+
+@receiver(bulk_changed, sender=Partner)
+def create_bulk_partner_portfolios(sender, instances, created, **kwargs):
+    # New partners have no customers yet, so their totals start at zero.
+    # ignore_conflicts leaves the pk of rows it skipped unset
+    if created:
+        PartnerPortfolio.objects.bulk_create(
+            [PartnerPortfolio(partner_id=partner.pk) for partner in instances if partner.pk is not None],
+            ignore_conflicts=True,
+        )
+
+
+@receiver(pre_save, sender=Loan)
+def capture_loan_totals(sender, instance, raw=False, **kwargs):
+    if instance.pk is not None and not instance._state.adding and not raw:
+        loan = Loan.objects.filter(pk=instance.pk)
+        lock_rows(loan)
+        instance._portfolio_before = portfolio.loan_totals_by_partner(loan)
+
+
+@receiver(post_save, sender=Loan)
+def update_loan_totals(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = instance.__dict__.pop('_portfolio_before', {})
+    after = portfolio.loan_totals_by_partner(Loan.objects.filter(pk=instance.pk))
+    portfolio.apply_deltas(portfolio.difference(after, before))
+
+
+@receiver(pre_delete, sender=Loan)  # while the customer's memberships still exist
+def remove_loan_totals(sender, instance, **kwargs):
+    portfolio.apply_deltas(portfolio.loan_totals_by_partner(Loan.objects.filter(pk=instance.pk)), sign=-1)
+
+
+@receiver(pre_save, sender=Customer)
+def capture_customer_totals(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Only income and credit_score feed into the totals (through eligibility)
+    if instance.pk is None or instance._state.adding or raw:
+        return
+    if update_fields is not None and not {'income', 'credit_score'}.intersection(update_fields):
+        return
+    lock_rows(Customer.objects.filter(pk=instance.pk))
+    instance._portfolio_before = portfolio.loan_totals_by_partner(Loan.objects.filter(customer_id=instance.pk))
+
+
+@receiver(post_save, sender=Customer)
+def update_customer_totals(sender, instance, **kwargs):
+    before = instance.__dict__.pop('_portfolio_before', None)
+    if before is None:
+        return
+    after = portfolio.loan_totals_by_partner(Loan.objects.filter(customer_id=instance.pk))
+    portfolio.apply_deltas(portfolio.difference(after, before))
+
+
+@receiver(bulk_changing, sender=Loan)
+def capture_bulk_loan_totals(sender, instances, created, state, **kwargs):
+    if created:
+        # The rows ignore_conflicts leaves alone are on both sides of the difference
+        state['portfolio_before'] = portfolio.loan_totals_by_partner_with_keys(instances)
+    else:
+        state['portfolio_before'] = portfolio.loan_totals_by_partner_of(loan.pk for loan in instances)
+
+
+@receiver(bulk_changed, sender=Loan)
+def update_bulk_loan_totals(sender, instances, created, state, **kwargs):
+    if created:
+        after = portfolio.loan_totals_by_partner_with_keys(instances)
+    else:
+        after = portfolio.loan_totals_by_partner_of(loan.pk for loan in instances)
+    portfolio.apply_deltas(portfolio.difference(after, state.pop('portfolio_before')))
+
+
+@receiver(bulk_changing, sender=Customer)
+def capture_bulk_customer_totals(sender, instances, created, state, **kwargs):
+    if not created:  # new customers have no loans yet
+        state['portfolio_before'] = portfolio.loan_totals_by_partner_of(
+            customer_ids={customer.pk for customer in instances})
+
+
+@receiver(bulk_changed, sender=Customer)
+def update_bulk_customer_totals(sender, instances, created, state, **kwargs):
+    if not created:
+        after = portfolio.loan_totals_by_partner_of(customer_ids={customer.pk for customer in instances})
+        portfolio.apply_deltas(portfolio.difference(after, state.pop('portfolio_before')))
+
+
+@receiver(m2m_changed, sender=Partner.customers.through)
+def update_membership_totals(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        sign = 1 if action == 'post_add' else -1
+        if reverse:
+            # customer.partners.add(...): the customer's loans join each partner
+            totals = portfolio.customer_loan_totals([instance.pk])
+            portfolio.apply_deltas(dict.fromkeys(pk_set, totals), sign)
+        else:
+            portfolio.apply_deltas({instance.pk: portfolio.customer_loan_totals(pk_set)}, sign)
+    elif action == 'pre_clear' and reverse:
+        totals = portfolio.customer_loan_totals([instance.pk])
+        portfolio.apply_deltas(dict.fromkeys(instance.partners.values_list('pk', flat=True), totals), -1)
+    elif action == 'post_clear' and not reverse:
+        portfolio.rebuild_portfolios([instance.pk])
@@ -1,3 +1,626 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APITestCase
+
+from app import idempotency, response_cache
+from customers.models import Customer
+from loans.amortization import monthly_payment
+from loans.models import Loan
+from loans.serializers import LoanSerializer
+from partners.models import Partner, PartnerPortfolio
+from partners.portfolio import TOTAL_FIELDS, rebuild_portfolios
+
+
+class PartnerQueryCountTests(APITestCase):
+    """Query budgets per endpoint; a new N+1 shows up as a failure here."""
+
+    def setUp(self):
+        self.partners = Partner.objects.bulk_create([
+            Partner(company_name=f'Installer {i}', address=f'{i} Solar Ave') for i in range(5)
+        ])
+        self.partner = self.partners[0]
+        self.customers = Customer.objects.bulk_create([
+            Customer(first_name=f'First{i}', last_name=f'Last{i}', email=f'c{i}@example.com',
+                     income=Decimal('5000.00'), credit_score=700, address=f'{i} Main St')
+            for i in range(10)
+        ])
+        for partner in self.partners:
+            partner.customers.add(*self.customers)
+        self.customer = self.customers[0]
+        for term in (12, 24, 36):
+            Loan.objects.create(customer=self.customer, loan_amount=Decimal('1000.00'),
+                                annual_rate=Decimal('5.00'), term_months=term)
+        self.base = f'/api/partners/{self.partner.id}/customers/{self.customer.id}/'
+
+    def test_list_partners(self):
+        # partners page + prefetched customer pks
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/partners/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertEqual(len(response.json()['results'][0]['customers']), 10)
+
+    def test_partner_customers(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/partners/{self.partner.id}/customers/')
+        self.assertEqual(len(response.json()), 10)
+
+    def test_get_customer_by_id(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.base)
+        self.assertEqual(response.json()['id'], self.customer.id)
+
+    def test_list_loan_offers(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{self.base}loanoffers/')
+        self.assertEqual(len(response.json()), 3)
+
+    def test_update_customer(self):
+        # membership check + UPDATE (partial update skips the unique validators)
+        # + the customer's partners, whose cached customer lists are invalidated
+        # + the loan totals before and after, for the partner portfolios
+        # + refreshing its customer_search row
+        with self.assertNumQueries(6):
+            response = self.client.patch(self.base, {'credit_score': 720}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['credit_score'], 720)
+
+    def test_create_loan_offer(self):
+        # membership, customer pk lookup, unique_together check, INSERT,
+        # the new loan's totals, one UPDATE for all five partner portfolios
+        with self.assertNumQueries(6):
+            response = self.client.post(f'{self.base}loanoffers/', {
+                'loan_amount': '2500.00', 'annual_rate': '6.50', 'term_months': 48,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_customer_of_another_partner_is_not_found(self):
+        outsider = Partner.objects.create(company_name='Other', address='Elsewhere')
+        response = self.client.get(f'/api/partners/{outsider.id}/customers/{self.customer.id}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Customer not found for this partner'})
+
+    def test_missing_partner_is_not_found(self):
+        response = self.client.get(f'/api/partners/999999/customers/{self.customer.id}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('error', response.json())
+
+    def test_loan_str_does_not_query(self):
+        loan = Loan.objects.first()
+        with self.assertNumQueries(0):
+            str(loan)
+
+
+class BulkCustomerImportTests(APITestCase):
+    def setUp(self):
+        self.partner = Partner.objects.create(company_name='Bulk Solar', address='1 Import Rd')
+        self.url = f'/api/partners/{self.partner.id}/customers/bulk/'
+        Customer.objects.create(first_name='Existing', last_name='Person', email='taken@example.com',
+                                income=Decimal('3000.00'), credit_score=600, address='9 Old St')
+
+    def row(self, i, **overrides):
+        row = {'first_name': f'First{i}', 'last_name': f'Last{i}', 'email': f'Bulk{i}@Example.com',
+               'income': '4200.00', 'credit_score': 650, 'address': f'{i} New St'}
+        row.update(overrides)
+        return row
+
+    def test_json_import_links_customers_to_partner(self):
+        rows = [self.row(i) for i in range(2500)]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 2500, 'errors': []})
+        self.assertEqual(self.partner.customers.count(), 2500)
+        self.assertTrue(Customer.objects.filter(email='bulk0@example.com').exists())
+
+    def test_import_query_count_does_not_grow_per_row(self):
+        rows = [self.row(i) for i in range(300)]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, rows, format='json')
+        # partner, email lookup, name lookup, then batched INSERTs (SQLite caps
+        # the rows per INSERT by its variable limit)
+        self.assertLess(len(queries), 15)
+
+    def test_per_row_errors(self):
+        rows = [
+            self.row(0),
+            self.row(1, credit_score=900),
+            self.row(2, email='TAKEN@example.com'),
+            self.row(3, email='bulk0@example.com'),
+            self.row(4, first_name='Existing', last_name='Person', address='9 Old St'),
+            self.row(5, first_name='First0', last_name='Last0', address='0 New St'),
+        ]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['created'], 1)
+        self.assertEqual([error['row'] for error in body['errors']], [1, 2, 3, 4, 5])
+        self.assertIn('credit_score', body['errors'][0]['errors'])
+        self.assertIn('email', body['errors'][1]['errors'])
+        self.assertIn('non_field_errors', body['errors'][3]['errors'])
+
+    def test_csv_body_and_upload(self):
+        header = 'first_name,last_name,email,income,credit_score,address\n'
+        body = header + 'Csv,One,csv1@example.com,3500.00,700,1 Csv Rd\n'
+        response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.json(), {'created': 1, 'errors': []})
+
+        upload = SimpleUploadedFile('customers.csv', (header + 'Csv,Two,csv2@example.com,3500.00,700,2 Csv Rd\n').encode())
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.json(), {'created': 1, 'errors': []})
+        self.assertEqual(self.partner.customers.count(), 2)
+
+    def test_rejects_non_list_payload(self):
+        response = self.client.post(self.url, self.row(0), format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class LoanOfferGridTests(APITestCase):
+    def setUp(self):
+        self.partner = Partner.objects.create(company_name='Grid Solar', address='5 Grid Rd')
+        self.url = f'/api/partners/{self.partner.id}/loanoffers/generate/'
+        self.good, self.bad_credit, self.low_income = Customer.objects.bulk_create([
+            Customer(first_name='Good', last_name='Credit', email='good@example.com',
+                     income=Decimal('5000.00'), credit_score=720, address='1 Grid Rd'),
+            Customer(first_name='Bad', last_name='Credit', email='bad@example.com',
+                     income=Decimal('5000.00'), credit_score=450, address='2 Grid Rd'),
+            Customer(first_name='Low', last_name='Income', email='low@example.com',
+                     income=Decimal('10.00'), credit_score=800, address='3 Grid Rd'),
+        ])
+        self.partner.customers.add(self.good, self.bad_credit, self.low_income)
+        self.grid = {'annual_rates': ['4.99', '7.50', '9.90'], 'term_months': [12, 24, 36, 60, 120]}
+
+    def test_generates_grid_for_eligible_customers(self):
+        response = self.client.post(self.url, self.grid, format='json')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['created'], 15)
+        self.assertEqual({offer['customer'] for offer in body['offers']}, {self.good.id})
+        # Defaults to max_loan_amount, i.e. half the annual income
+        self.assertEqual({offer['loan_amount'] for offer in body['offers']}, {'30000.00'})
+        saved = LoanSerializer(Loan.objects.filter(customer=self.good), many=True).data
+        expected = {(row['annual_rate'], row['term_months']): row['monthly_payments'] for row in saved}
+        for offer in body['offers']:
+            self.assertEqual(expected[(offer['annual_rate'], offer['term_months'])], offer['monthly_payments'])
+
+    def test_regenerating_skips_existing_offers(self):
+        self.client.post(self.url, self.grid, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, dict(self.grid, term_months=[12, 24, 36, 60, 120, 240]),
+                                        format='json')
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual(Loan.objects.count(), 18)
+        self.assertLess(len(queries), 10)
+
+    def test_chunks_count_what_they_insert(self):
+        more = Customer.objects.bulk_create([
+            Customer(first_name='More', last_name=str(i), email=f'more{i}@example.com',
+                     income=Decimal('5000.00'), credit_score=700, address=f'{i} Grid Rd')
+            for i in range(4)
+        ])
+        self.partner.customers.add(*more)
+        # Already offered, so not created again
+        Loan.objects.create(customer=more[0], loan_amount=Decimal('30000.00'),
+                            annual_rate=Decimal('4.99'), term_months=12)
+        chunks = list(self.partner.generate_loan_offers(
+            Customer.objects.filter(partners=self.partner).order_by('pk'),
+            [Decimal('4.99'), Decimal('7.50')], [12, 24], chunk_size=3,
+        ))
+        # Only good qualifies in the first chunk
+        self.assertEqual([len(offers) for _, offers in chunks], [4, 12, 4])
+        self.assertEqual([created for created, _ in chunks], [4, 11, 4])
+        self.assertEqual(Loan.objects.count(), 20)
+        self.assertEqual(list(self.partner.generate_loan_offers(Customer.objects.none(), [], [])), [])
+
+    def test_explicit_customers_and_amount(self):
+        grid = dict(self.grid, customer_ids=[self.good.id, self.bad_credit.id], loan_amount='1000.00')
+        body = self.client.post(self.url, grid, format='json').json()
+        self.assertEqual(body['created'], 15)
+        self.assertEqual({offer['loan_amount'] for offer in body['offers']}, {'1000.00'})
+
+    def test_invalid_grid(self):
+        response = self.client.post(self.url, {'annual_rates': ['101'], 'term_months': [0]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'annual_rates', 'term_months'})
+
+
+class PartnerCustomersResponseCacheTests(APITestCase):
+    def setUp(self):
+        response_cache.clear()
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        self.customer = Customer.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com',
+            income=Decimal('5000.00'), credit_score=700, address='1 Main St')
+        self.partner.customers.add(self.customer)
+        self.url = f'/api/partners/{self.partner.id}/customers/'
+
+    def emails(self):
+        return sorted(row['email'] for row in self.client.get(self.url).json())
+
+    def test_repeat_reads_are_served_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+
+    def test_customer_update_invalidates(self):
+        self.client.get(self.url)
+        self.client.patch(f'{self.url}{self.customer.id}/', {'credit_score': 720}, format='json')
+        self.assertEqual(self.client.get(self.url).json()[0]['credit_score'], 720)
+
+    def test_membership_changes_invalidate(self):
+        other = Customer.objects.create(
+            first_name='Alan', last_name='Turing', email='alan@example.com',
+            income=Decimal('5000.00'), credit_score=700, address='2 Main St')
+        self.assertEqual(self.emails(), ['ada@example.com'])
+        other.partners.add(self.partner)
+        self.assertEqual(self.emails(), ['ada@example.com', 'alan@example.com'])
+        self.partner.customers.remove(self.customer)
+        self.assertEqual(self.emails(), ['alan@example.com'])
+        other.partners.clear()
+        self.assertEqual(self.emails(), [])
+
+    def test_post_and_bulk_import_invalidate(self):
+        self.client.get(self.url)
+        self.client.post(self.url, {
+            'first_name': 'Alan', 'last_name': 'Turing', 'email': 'alan@example.com',
+            'income': '5000.00', 'credit_score': 700, 'address': '2 Main St',
+        }, format='json')
+        self.assertEqual(self.emails(), ['ada@example.com', 'alan@example.com'])
+        self.partner.import_customers([Customer(
+            first_name='Grace', last_name='Hopper', email='grace@example.com',
+            income=Decimal('5000.00'), credit_score=700, address='3 Main St')])
+        self.assertEqual(self.emails(), ['ada@example.com', 'alan@example.com', 'grace@example.com'])
+
+    def test_other_partners_stay_cached(self):
+        other = Partner.objects.create(company_name='Other', address='Elsewhere')
+        other_url = f'/api/partners/{other.id}/customers/'
+        self.client.get(other_url)
+        self.client.patch(f'{self.url}{self.customer.id}/', {'credit_score': 720}, format='json')
+        with self.assertNumQueries(0):
+            self.client.get(other_url)
+
+
+class PartnerPortfolioTests(APITestCase):
+    def setUp(self):
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        self.other = Partner.objects.create(company_name='Other', address='Elsewhere')
+        self.customers = Customer.objects.bulk_create([
+            Customer(first_name=f'First{i}', last_name=f'Last{i}', email=f'c{i}@example.com',
+                     income=Decimal('5000.00'), credit_score=700, address=f'{i} Main St')
+            for i in range(3)
+        ])
+        self.partner.customers.add(*self.customers)
+        self.other.customers.add(self.customers[0])
+        self.url = f'/api/partners/{self.partner.id}/portfolio/'
+
+    def stored(self):
+        return list(PartnerPortfolio.objects.order_by('pk').values('pk', *TOTAL_FIELDS))
+
+    def assertMatchesRebuild(self):
+        incremental = self.stored()
+        rebuild_portfolios()
+        self.assertEqual(incremental, self.stored())
+
+    def test_portfolio_totals(self):
+        first = Loan.objects.create(customer=self.customers[0], loan_amount=Decimal('1000.00'),
+                                    annual_rate=Decimal('5.00'), term_months=12)
+        second = Loan.objects.create(customer=self.customers[1], loan_amount=Decimal('100000.00'),
+                                     annual_rate=Decimal('10.00'), term_months=24)
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['loan_count'], 2)
+        self.assertEqual(data['total_principal_outstanding'], '101000.00')
+        self.assertEqual(data['weighted_average_rate'], '9.95')
+        self.assertEqual(data['average_term_months'], '18.00')
+        self.assertEqual(data['total_monthly_payment'], str(first.monthly_payment + second.monthly_payment))
+        # 5000 x 12 covers 2 x 1000 but not 2 x 100000
+        self.assertEqual((data['qualified_count'], data['eligibility_ratio']), (1, 0.5))
+        self.assertEqual(self.client.get(f'/api/partners/{self.other.id}/portfolio/').json()['loan_count'], 1)
+
+    def test_read_is_one_query(self):
+        Loan.objects.bulk_create([
+            Loan(customer=customer, loan_amount=Decimal('1000.00'), annual_rate=Decimal('5.00'), term_months=term)
+            for customer in self.customers for term in range(12, 60)
+        ])
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['loan_count'], 3 * 48)
+
+    def test_incremental_updates_match_rebuild(self):
+        loan = Loan.objects.create(customer=self.customers[0], loan_amount=Decimal('1000.00'),
+                                   annual_rate=Decimal('5.00'), term_months=12)
+        Loan.objects.create(customer=self.customers[1], loan_amount=Decimal('2000.00'),
+                            annual_rate=Decimal('7.50'), term_months=36)
+        self.assertMatchesRebuild()
+
+        loan.loan_amount, loan.term_months = Decimal('40000.00'), 48
+        loan.save()
+        self.assertMatchesRebuild()
+
+        customer = self.customers[1]
+        customer.credit_score = 450
+        customer.save()
+        self.assertMatchesRebuild()
+
+        self.other.customers.add(customer)
+        self.assertMatchesRebuild()
+        customer.partners.remove(self.partner)
+        self.assertMatchesRebuild()
+        self.customers[0].partners.clear()
+        self.assertMatchesRebuild()
+        self.partner.customers.add(*self.customers)
+        self.assertMatchesRebuild()
+
+        list(self.partner.generate_loan_offers(self.customers, [Decimal('5.00'), Decimal('6.00')], [12, 24],
+                                               loan_amount=Decimal('500.00')))
+        self.assertMatchesRebuild()
+
+        loan.delete()
+        self.assertMatchesRebuild()
+        self.customers[2].delete()
+        self.assertMatchesRebuild()
+        self.other.customers.clear()
+        self.assertMatchesRebuild()
+        self.assertEqual(PartnerPortfolio.objects.get(partner=self.other).loan_count, 0)
+
+    def test_bulk_writes_apply_deltas(self):
+        loans = Loan.objects.bulk_create([
+            Loan(customer=customer, loan_amount=amount, annual_rate=Decimal('5.00'), term_months=12)
+            for customer in self.customers for amount in (Decimal('1000.00'), Decimal('2000.00'))
+        ])
+        self.assertMatchesRebuild()
+        # Only the written rows are aggregated, never a partner's whole book
+        with mock.patch('partners.portfolio.rebuild_portfolios', side_effect=AssertionError):
+            loans = list(Loan.objects.filter(customer=self.customers[0]))
+            for loan in loans:
+                loan.loan_amount *= 20
+            Loan.objects.bulk_update(loans, ['loan_amount'])
+            self.assertMatchesRebuild()
+
+            # Half already exist, and 2000 x 6.00 x 24 mixes keys of both
+            Loan.objects.bulk_create([
+                Loan(customer=customer, loan_amount=amount, annual_rate=rate, term_months=term)
+                for customer in self.customers[1:]
+                for amount, rate, term in ((Decimal('1000.00'), Decimal('5.00'), 12),
+                                           (Decimal('2000.00'), Decimal('6.00'), 24))
+            ], ignore_conflicts=True)
+            self.assertEqual(Loan.objects.count(), 8)
+            self.assertMatchesRebuild()
+
+            for customer in self.customers:
+                customer.income = Decimal('100.00')
+            Customer.objects.bulk_update(self.customers, ['income'])
+            self.assertMatchesRebuild()
+
+    def test_rebuild_command_and_missing_rows(self):
+        Loan.objects.create(customer=self.customers[0], loan_amount=Decimal('1000.00'),
+                            annual_rate=Decimal('5.00'), term_months=12)
+        expected = self.stored()
+        PartnerPortfolio.objects.all().delete()
+
+        # Reads never build the row
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertFalse(PartnerPortfolio.objects.exists())
+        call_command('rebuild_portfolios', stdout=StringIO())
+        self.assertEqual(self.stored(), expected)
+        self.assertEqual(self.client.get(self.url).json()['loan_count'], 1)
+        self.assertEqual(self.client.get('/api/partners/999999/portfolio/').status_code, 404)
+
+    def test_bulk_created_partners_get_a_portfolio(self):
+        partners = Partner.objects.bulk_create([Partner(company_name=f'Bulk{i}', address='x') for i in range(2)])
+        for partner in partners:
+            self.assertEqual(self.client.get(f'/api/partners/{partner.pk}/portfolio/').json()['loan_count'], 0)
+        partners[0].customers.add(self.customers[0])
+        Loan.objects.create(customer=self.customers[0], loan_amount=Decimal('1000.00'),
+                            annual_rate=Decimal('5.00'), term_months=12)
+        self.assertMatchesRebuild()
+
+
+class CustomerExportTests(APITestCase):
+    def setUp(self):
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        self.customers = Customer.objects.bulk_create([
+            Customer(first_name=f'First{i}', last_name=f'Last, {i}', email=f'c{i}@example.com',
+                     income=Decimal('4000.00'), credit_score=650 + i)
+            for i in range(4)
+        ])
+        self.partner.customers.add(*self.customers[:2])
+
+    def test_customer_export(self):
+        response = self.client.get('/api/customers/export/')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="customers.csv"')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([int(row['id']) for row in rows], [customer.pk for customer in self.customers])
+        self.assertEqual(rows[0]['last_name'], 'Last, 0')  # quoted, not split
+
+    def test_partner_export_is_scoped(self):
+        response = self.client.get(f'/api/partners/{self.partner.pk}/customers/export/?format=ndjson&fields=id,email')
+        self.assertEqual(response['Content-Disposition'],
+                         f'attachment; filename="partner-{self.partner.pk}-customers.ndjson"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [{'id': customer.pk, 'email': customer.email} for customer in self.customers[:2]])
+
+        response = self.client.get('/api/partners/999999/customers/export/')
+        self.assertEqual(response.status_code, 404)
+
+
+class IdempotentLoanOfferTests(APITestCase):
+    def setUp(self):
+        idempotency.clear()
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        self.customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                                income=Decimal('5000.00'), credit_score=700)
+        self.partner.customers.add(self.customer)
+
+    def test_partner_offer_retry_is_replayed(self):
+        url = f'/api/partners/{self.partner.pk}/customers/{self.customer.pk}/loanoffers/'
+        payload = {'loan_amount': '1000.00', 'annual_rate': '7.25', 'term_months': 12}
+        first = self.client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        retry = self.client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(first.json(), retry.json())
+        # The same key on another customer's endpoint is a separate request
+        other = Customer.objects.create(first_name='Bo', last_name='B', email='bo@example.com',
+                                        income=Decimal('5000.00'), credit_score=700)
+        self.partner.customers.add(other)
+        url = f'/api/partners/{self.partner.pk}/customers/{other.pk}/loanoffers/'
+        self.assertEqual(self.client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='k1').status_code, 201)
+        self.assertEqual(Loan.objects.count(), 2)
+
+    def test_create_customer_loan_returns_existing_offer(self):
+        first = self.partner.create_customer_loan(self.customer, loan_amount=1000, annual_rate=7.25)
+        again = self.partner.create_customer_loan(self.customer, loan_amount=Decimal('1000.00'), annual_rate='7.25')
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(Loan.objects.count(), 1)
+
+
+class StressTestEndpointTests(APITestCase):
+    def test_stress_test_job(self):
+        from jobs.worker import Worker
+        partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com',
+                                           income=Decimal('9000.00'), credit_score=640)
+        partner.customers.add(customer)
+        Loan.objects.create(customer=customer, loan_amount=Decimal('10000.00'), annual_rate=Decimal('7.25'),
+                            term_months=36)
+        url = f'/api/partners/{partner.pk}/stress-test/'
+        self.assertEqual(self.client.post(url, {'lgd': 2}, format='json').status_code, 400)
+
+        with override_settings(STRESS_TEST_PROCESSES=1):
+            response = self.client.post(url, {'paths': 500, 'seed': 4, 'rate_shock_bps': 100}, format='json')
+            self.assertEqual(response.status_code, 202)
+            Worker(processes=0).run(burst=True)
+        job = self.client.get(response['Location']).json()
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual((job['result']['partner'], job['result']['loans'], job['result']['paths']),
+                         (partner.pk, 1, 500))
+        self.assertEqual(set(job['result']['loss_percentiles']), {'50', '90', '95', '99', '99.9'})
+
+
+class CustomerAffordabilityTests(APITestCase):
+    def setUp(self):
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        self.customers = Customer.objects.bulk_create([
+            Customer(first_name=f'First{i}', last_name='Last', email=f'c{i}@example.com',
+                     income=Decimal('3000.00') + i, credit_score=700, address=f'{i} Main St')
+            for i in range(300)
+        ])
+        self.partner.customers.add(*self.customers[:250])
+
+    def test_partner_customers_in_one_batch(self):
+        url = f'/api/partners/{self.partner.pk}/customers/affordability/'
+        with self.assertNumQueries(2):
+            response = self.client.post(url, {'annual_rate': '6.00', 'term_months': [60, 36, 60],
+                                              'loan_amount': '30000.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([row['customer'] for row in results], [customer.pk for customer in self.customers[:250]])
+        first = results[0]
+        self.assertEqual(first['max_monthly_payment'], '1050.00')
+        self.assertEqual(set(first['max_loan_amount']), {'36', '60'})
+        self.assertLessEqual(monthly_payment(Decimal(first['max_loan_amount']['60']), Decimal('6.00'), 60),
+                             Decimal('1050.00'))
+        term = first['min_term_months']
+        self.assertLessEqual(monthly_payment(Decimal('30000.00'), Decimal('6.00'), term), Decimal('1050.00'))
+        self.assertGreater(monthly_payment(Decimal('30000.00'), Decimal('6.00'), term - 1), Decimal('1050.00'))
+
+        picked = self.client.post(url, {'customer_ids': [self.customers[0].pk, self.customers[299].pk],
+                                        'max_monthly_payment': '500.00'}, format='json').json()
+        self.assertEqual([(row['customer'], row['max_monthly_payment']) for row in picked],
+                         [(self.customers[0].pk, '500.00')])
+        self.assertNotIn('min_term_months', picked[0])
+
+    def test_customer_endpoint_and_validation(self):
+        response = self.client.post('/api/customers/affordability/',
+                                    {'customer_ids': [self.customers[299].pk], 'payment_to_income': '0.5'},
+                                    format='json')
+        self.assertEqual(response.json()[0]['max_monthly_payment'], '1649.50')
+        self.assertEqual(self.client.post('/api/customers/affordability/', {}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/customers/affordability/',
+                                          {'customer_ids': [1], 'term_months': [601]},
+                                          format='json').status_code, 400)
+
+
+class PartnerCustomerSearchTests(APITestCase):
+    def setUp(self):
+        response_cache.clear()
+        self.partner = Partner.objects.create(company_name='Installer', address='1 Solar Ave')
+        other = Partner.objects.create(company_name='Other', address='2 Solar Ave')
+        people = [
+            ('Ada', 'Lovelace', 'ada@analytical.org', '+1 555-010-0100', '12 Engine Row', 720, '5200.00'),
+            ('Adam', 'Smith', 'adam.smith@gmail.com', '+1 555-010-0200', '3 Market St', 640, '3100.00'),
+            ('Grace', 'Hopper', 'grace@navy.mil', '+1 555-020-0300', '9 Harbor Rd', 780, '6100.00'),
+            ('Alan', 'Turing', 'alan@bletchley.uk', None, '1 Park Lane', 550, '2800.00'),
+        ]
+        self.customers = {}
+        for first, last, email, phone, address, score, income in people:
+            self.customers[first] = Customer.objects.create(
+                first_name=first, last_name=last, email=email, phone_number=phone, address=address,
+                credit_score=score, income=Decimal(income))
+        self.partner.customers.add(*list(self.customers.values())[:3])
+        other.customers.add(self.customers['Alan'])
+        self.url = f'/api/partners/{self.partner.pk}/customers/'
+
+    def names(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [row['first_name'] for row in response.json()]
+
+    def test_prefix_search_over_every_field(self):
+        self.assertEqual(self.names(q='ada'), ['Adam', 'Ada'])  # newest first
+        self.assertEqual(self.names(q='ada lov'), ['Ada'])
+        self.assertEqual(self.names(q='LOVELACE'), ['Ada'])
+        self.assertEqual(self.names(q='adam.smith@gmail.com'), ['Adam'])
+        self.assertEqual(self.names(q='ada@gmail.com'), [])
+        self.assertEqual(self.names(q='555 0300'), ['Grace'])
+        self.assertEqual(self.names(q='harbor'), ['Grace'])
+        self.assertEqual(self.names(q='turing'), [])  # another partner's customer
+        self.assertEqual(self.names(q='ada*) "'), ['Adam', 'Ada'])  # not read as FTS syntax
+        self.assertEqual(self.names(q='  '), [])
+
+    def test_range_filters_and_limit(self):
+        self.assertEqual(self.names(credit_score__gte=700), ['Grace', 'Ada'])
+        self.assertEqual(self.names(q='ada', income__lt='5000'), ['Adam'])
+        self.assertEqual(self.names(q='555', limit=2), ['Grace', 'Adam'])
+        for params in ({'credit_score__gte': 'high'}, {'income__lt': 'NaN'}, {'q': 'ada', 'limit': 0},
+                       {'q': 'ada', 'limit': 'all'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_index_follows_writes(self):
+        grace = self.customers['Grace']
+        grace.last_name = 'Brewster'
+        grace.save()
+        self.assertEqual(self.names(q='brewster'), ['Grace'])
+        self.assertEqual(self.names(q='hopper'), [])
+
+        self.customers['Ada'].delete()
+        self.assertEqual(self.names(q='ada'), ['Adam'])
+
+        [new] = Customer.objects.bulk_create([Customer(
+            first_name='Katherine', last_name='Johnson', email='kj@nasa.gov', address='4 Orbit Way',
+            credit_score=800, income=Decimal('7000.00'))])
+        self.partner.customers.add(new)
+        self.assertEqual(self.names(q='kath'), ['Katherine'])
+        new.email = 'katherine@langley.gov'
+        Customer.objects.bulk_update([new], ['email'])
+        self.assertEqual(self.names(q='langley'), ['Katherine'])
+
+        # Writes that bypass the signals are picked up by a rebuild
+        Customer.objects.filter(pk=new.pk).update(last_name='Goble')
+        self.assertEqual(self.names(q='goble'), [])
+        call_command('rebuild_customer_search', stdout=StringIO())
+        response_cache.clear()  # update() skipped the invalidation too
+        self.assertEqual(self.names(q='goble'), ['Katherine'])
@@ -1,38 +1,105 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
-from .models import Partner 
-from .serializers import PartnerSerializer
+from .imports import rows_from_request, validate_customer_rows
+from .models import Partner, PartnerPortfolio
+from .serializers import LoanOfferGridSerializer, PartnerPortfolioSerializer, PartnerSerializer, StressTestSerializer
+from customers import search
 from customers.models import Customer
 from customers.serializers import CustomerSerializer
+from app.exports import ExportMixin
+from app.fast_lists import values_list_data
+from app.idempotency import idempotent
+from app.parsers import CSVParser
+from app.query_params import range_filter
+from app.response_cache import cached_response
+from jobs.queue import enqueue
+from jobs.views import accepted
+from loans import affordability
 from loans.models import Loan
-from loans.serializers import LoanSerializer
+from loans.serializers import AffordabilityResultSerializer, AffordabilitySerializer, LoanSerializer
+from django.db import IntegrityError
+from django.db.models import Prefetch
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 
 
 
 
-class PartnerViewSet(viewsets.ModelViewSet): 
+# Rows returned for a ?q= search of a partner's customers
+SEARCH_LIMIT = 100
+MAX_SEARCH_LIMIT = 1000
+
+
+class PartnerViewSet(ExportMixin, viewsets.ModelViewSet): 
     """ViewSet for managing partners"""
     serializer_class = PartnerSerializer
     queryset = Partner.objects.all()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # PartnerSerializer only needs the customer pks
+            queryset = queryset.prefetch_related(
+                Prefetch('customers', queryset=Customer.objects.only('id'))
+            )
+        return queryset
+
+    def get_partner_customer(self, customer_id):
+        """
+        Fetch one of this partner's customers in a single query.
+        Returns None if the customer does not belong to the partner and
+        raises Http404 if the partner itself does not exist.
+        """
+        partner_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            return Customer.objects.get(id=customer_id, partners__id=partner_id)
+        except (ValueError, TypeError):
+            raise Http404
+        except Customer.DoesNotExist:
+            get_object_or_404(Partner, pk=partner_id)
+            return None
+
 
  
 
 
         
+    def search_customers(self, request, customers):
+        """Apply the ?q=, ?limit= and range filters of the partner customer list."""
+        customers = range_filter(request, customers, ('credit_score', 'income'))
+        query = request.query_params.get('q')
+        if query is None:
+            return customers
+        limit = request.query_params.get('limit', SEARCH_LIMIT)
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError({'limit': ['A valid integer is required.']})
+        if not 1 <= limit <= MAX_SEARCH_LIMIT:
+            raise ValidationError({'limit': [f'Must be between 1 and {MAX_SEARCH_LIMIT}.']})
+        return search.search(customers, query, limit)
+
     @action(detail=True, methods=['get','post'], url_path='customers')
+    @cached_response('partner-customers')
     def create_customer(self, request, *args, **kwargs):
 
         if request.method == 'GET':
-            """Get all customers for a partner"""
+            """
+            Get all customers for a partner (the frontend reads the async,
+            streamed GET /async/partners/{id}/customers).
+            Filters: ?q= (indexed search over name, email, phone and address; at
+            most ?limit= rows, default 100), credit_score__gte/__gt/__lte/__lt,
+            income__gte/__gt/__lte/__lt
+            """
             try: 
                 partner = self.get_object()
-                customers = partner.customers.all()
-                serializer = CustomerSerializer(customers, many=True)
-                return Response(serializer.data)
+                customers = self.search_customers(request, partner.customers.all())
+                return Response(values_list_data(CustomerSerializer(), customers))
+            except ValidationError:
+                raise
             except Partner.DoesNotExist:
                 return Response(
                     {'error': 'Partner not found'}, 
@@ -60,58 +127,212 @@ class PartnerViewSet(viewsets.ModelViewSet):
                     {'error': str(e)}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
+
+    @action(detail=True, methods=['get'], url_path='customers/export', streaming_export=True)
+    def export_customers(self, request, *args, **kwargs):
+        """
+        Stream the partner's customers as CSV (default) or NDJSON, in id order.
+        Endpoint: GET /partners/{id}/customers/export?format=csv|ndjson
+        Filters: created_at__gte/__lte/__gt/__lt, ?fields=
+        """
+        partner = self.get_object()
+        return self.export_response(
+            partner.customers.all(), CustomerSerializer(context=self.get_serializer_context()),
+            f'partner-{partner.pk}-customers',
+        )
+
+    @action(detail=True, methods=['post'], url_path='customers/affordability')
+    def customer_affordability(self, request, *args, **kwargs):
+        """
+        Largest affordable loan per term for the partner's customers (all of
+        them, or customer_ids), in one batch.
+        Endpoint: POST /partners/{id}/customers/affordability
+        Expected data (all optional): customer_ids, annual_rate, term_months,
+        payment_to_income, max_monthly_payment, loan_amount
+        """
+        partner = self.get_object()
+        serializer = AffordabilitySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        results = affordability.for_customers(partner.customers.all(), serializer.validated_data)
+        return Response(AffordabilityResultSerializer(results, many=True).data)
+
+    @action(detail=True, methods=['post'], url_path='customers/bulk',
+            parser_classes=[JSONParser, CSVParser, MultiPartParser])
+    def bulk_create_customers(self, request, *args, **kwargs):
+        """
+        Import many customers for a partner from a JSON array or CSV.
+        Valid rows are inserted; invalid or duplicate rows are reported by index.
+        Endpoint: POST /partners/{id}/customers/bulk
+        """
+        partner = self.get_object()
+        try:
+            rows = rows_from_request(request)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        customers, errors = validate_customer_rows(rows)
+        try:
+            created = partner.import_customers(customers)
+        except IntegrityError as e:
+            # A concurrent write took one of the emails/names after validation
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        return Response(
+            {'created': len(created), 'errors': errors},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=True, methods=['post'], url_path='loanoffers/generate')
+    def generate_loan_offers(self, request, *args, **kwargs):
+        """
+        Generate offers for the partner's customers over a rate x term grid.
+        Endpoint: POST /partners/{id}/loanoffers/generate
+        Expected data: annual_rates, term_months, optional customer_ids and loan_amount;
+        background=true queues a job and answers 202 with its /jobs/{id} status URL
+        """
+        partner = self.get_object()
+        serializer = LoanOfferGridSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        grid = serializer.validated_data
+        if grid.pop('background'):
+            job = enqueue(
+                'partners.generate_loan_offers', partner_id=partner.pk,
+                annual_rates=[str(rate) for rate in grid['annual_rates']], term_months=grid['term_months'],
+                customer_ids=grid.get('customer_ids'),
+                loan_amount=str(grid['loan_amount']) if 'loan_amount' in grid else None,
+            )
+            return accepted(job, request)
+
+        customers = partner.customers.all()
+        if 'customer_ids' in grid:
+            customers = customers.filter(id__in=grid['customer_ids'])
+
+        created, offers = 0, []
+        for chunk_created, chunk in partner.generate_loan_offers(
+            customers.iterator(chunk_size=2000), grid['annual_rates'], grid['term_months'],
+            loan_amount=grid.get('loan_amount'),
+        ):
+            created += chunk_created
+            offers.extend(
+                {
+                    'customer': offer.customer_id,
+                    'loan_amount': str(offer.loan_amount),
+                    'annual_rate': str(offer.annual_rate),
+                    'term_months': offer.term_months,
+                    'monthly_payments': str(offer.monthly_payment),
+                }
+                for offer in chunk
+            )
+        return Response({'created': created, 'offers': offers}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], url_path='loanoffers/requote')
+    def requote_loan_offers(self, request, *args, **kwargs):
+        """
+        Queue a re-quote of the stored monthly payment of every loan held by
+        the partner's customers. Answers 202 with the job's status URL.
+        Endpoint: POST /partners/{id}/loanoffers/requote
+        """
+        partner = self.get_object()
+        return accepted(enqueue('partners.requote_loans', partner_id=partner.pk), request)
+
+    @action(detail=True, methods=['post'], url_path='stress-test')
+    def stress_test(self, request, *args, **kwargs):
+        """
+        Queue a Monte Carlo stress test of the partner's loans; the job result
+        holds loss percentiles. Answers 202 with the job's status URL.
+        Endpoint: POST /partners/{id}/stress-test
+        Expected data (all optional): paths, seed, pd_multiplier, correlation, lgd,
+        rate_shock_bps, rate_shock_vol_bps
+        """
+        partner = self.get_object()
+        serializer = StressTestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        scenario = dict(serializer.validated_data)
+        job = enqueue('partners.stress_test', partner_id=partner.pk, paths=scenario.pop('paths'),
+                      seed=scenario.pop('seed'), scenario=scenario)
+        return accepted(job, request)
+
+    @action(detail=True, methods=['get'], url_path='portfolio')
+    def portfolio(self, request, pk=None):
+        """
+        Loan totals across the partner's customers, read from the
+        incrementally maintained summary row (created with the partner).
+        Endpoint: GET /partners/{id}/portfolio
+        """
+        try:
+            summary = PartnerPortfolio.objects.get(partner_id=pk)
+        except (PartnerPortfolio.DoesNotExist, ValueError):
+            self.get_object()  # 404 for an unknown partner
+            # A read never builds it: that write would move the request off the
+            # replica, and concurrent first reads would each rebuild
+            return Response(
+                {'error': 'Portfolio not built for this partner; run manage.py rebuild_portfolios'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(PartnerPortfolioSerializer(summary).data)
+
     @action(detail=True, methods=['get'], url_path='customers/(?P<customer_id>[0-9]+)')
     def get_customer_by_id(self, request, customer_id=None, *args, **kwargs):
         """Retrieve a specific customer for a partner"""
-        partner = self.get_object()
-        try:
-            customer = partner.customers.get(id=customer_id)
-            return Response(CustomerSerializer(customer).data)
-        except Customer.DoesNotExist:
+        customer = self.get_partner_customer(customer_id)
+        if customer is None:
             return Response(
                 {'error': 'Customer not found for this partner'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response(CustomerSerializer(customer).data)
 
-    @action(detail=True, methods=['put', 'patch'], url_path='customers/(?P<customer_id>[0-9]+)')
+    @get_customer_by_id.mapping.put
+    @get_customer_by_id.mapping.patch
     def update_customer(self, request, customer_id=None, *args, **kwargs):
         """Update a customer for a partner"""
-        partner = self.get_object()
-        try:
-            customer = partner.customers.get(id=customer_id)
-        except Customer.DoesNotExist:
+        customer = self.get_partner_customer(customer_id)
+        if customer is None:
             return Response(
                 {'error': 'Customer not found for this partner'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        serializer = CustomerSerializer(customer, data=request.data, partial=kwargs.get('partial', False))
+        serializer = CustomerSerializer(customer, data=request.data, partial=request.method == 'PATCH')
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    @action(detail=True, methods=['delete'], url_path='customers/(?P<customer_id>[0-9]+)')
+    @get_customer_by_id.mapping.delete
     def delete_customer(self, request, customer_id=None, *args, **kwargs):
         """Delete a customer for a partner"""
-        partner = self.get_object()
-        try:
-            customer = partner.customers.get(id=customer_id)
-            customer.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        except Customer.DoesNotExist:
+        customer = self.get_partner_customer(customer_id)
+        if customer is None:
             return Response(
                 {'error': 'Customer not found for this partner'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        customer.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=True, methods=['post'], url_path='customers/(?P<customer_id>[0-9]+)/loanoffers')
+    @action(detail=True, methods=['get'], url_path='customers/(?P<customer_id>[0-9]+)/loanoffers')
+    def list_loan_offers(self, request, customer_id=None, *args, **kwargs):
+        """Get all loan offers for a customer"""
+        customer = self.get_partner_customer(customer_id)
+        if customer is None:
+            return Response(
+                {'error': 'Customer not found for this partner'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        loans = Loan.objects.filter(customer=customer)
+        return Response(values_list_data(LoanSerializer(), loans))
+
+    @list_loan_offers.mapping.post
+    @idempotent('partner-loanoffer-create')
     def create_loan_offer(self, request, customer_id=None, *args, **kwargs):
-        """Create a loan offer for a customer"""
-        partner = self.get_object()
-        try:
-            customer = partner.customers.get(id=customer_id)
-        except Customer.DoesNotExist:
+        """Create a loan offer for a customer (honours Idempotency-Key)"""
+        customer = self.get_partner_customer(customer_id)
+        if customer is None:
             return Response(
                 {'error': 'Customer not found for this partner'}, 
                 status=status.HTTP_404_NOT_FOUND
@@ -128,19 +349,3 @@ class PartnerViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    @action(detail=True, methods=['get'], url_path='customers/(?P<customer_id>[0-9]+)/loanoffers')
-    def list_loan_offers(self, request, customer_id=None, *args, **kwargs):
-        """Get all loan offers for a customer"""
-        partner = self.get_object()
-        try:
-            customer = partner.customers.get(id=customer_id)
-        except Customer.DoesNotExist:
-            return Response(
-                {'error': 'Customer not found for this partner'}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        loans = Loan.objects.filter(customer=customer)
-        serializer = LoanSerializer(loans, many=True)
-        return Response(serializer.data)
\ No newline at end of file
@@ -11,6 +11,51 @@ const apiClient = axios.create({
   },
 });
 
+// Read-your-writes with read replicas: the API answers every write with an
+// X-DB-Pin header (when our reads must stay on the primary database until)
+// and honours it on the requests that send it back (backend/app/db_router.py)
+let dbPin = null;
+
+function rememberDbPin(response) {
+  const pin = response?.headers?.['x-db-pin'];
+  if (pin) {
+    dbPin = pin;
+  }
+}
+
+apiClient.interceptors.request.use((config) => {
+  if (dbPin && Number(dbPin) * 1000 > Date.now()) {
+    config.headers['X-DB-Pin'] = dbPin;
+  }
+  return config;
+});
+
+apiClient.interceptors.response.use(
+  (response) => {
+    rememberDbPin(response);
+    return response;
+  },
+  (error) => {
+    rememberDbPin(error.response);
+    return Promise.reject(error);
+  },
+);
+
+/**
+ * Every row of a cursor-paginated list: follows `next` until it is null,
+ * asking for the largest page the API serves (app/pagination.py).
+ */
+async function getAllPages(path) {
+  const rows = [];
+  let url = `${path}?page_size=1000`;
+  while (url) {
+    const response = await apiClient.get(url);
+    rows.push(...response.data.results);
+    url = response.data.next;
+  }
+  return rows;
+}
+
 // ============================================
 // PARTNER API FUNCTIONS
 // ============================================
@@ -18,17 +63,16 @@ const apiClient = axios.create({
 /**Get all partners */
 export async function getPartners() {
   try {
-    const response = await apiClient.get('/partners/');
-    return response.data;
+    return await getAllPages('/partners/');
   } catch (error) {
     throw new Error(error.response?.data?.detail || 'Failed to fetch partners');
   }
 }
 
-/** Get customers for a specific partner */
+/** Get customers for a specific partner (streamed by the async route) */
 export async function getPartnerCustomers(partnerId) {
   try {
-    const response = await apiClient.get(`/partners/${partnerId}/customers/`);
+    const response = await apiClient.get(`/async/partners/${partnerId}/customers/`);
     return response.data;
   } catch (error) {
     throw new Error(error.response?.data?.detail || 'Failed to fetch customers');
@@ -56,8 +100,7 @@ export async function createPartnerCustomer(partnerId, customerData) {
  * Get all customers */
 export async function getCustomers() {
   try {
-    const response = await apiClient.get('/customers/');
-    return response.data;
+    return await getAllPages('/customers/');
   } catch (error) {
     throw new Error(error.response?.data?.detail || 'Failed to fetch customers');
   }
@@ -81,13 +124,13 @@ export async function createCustomer(customerData) {
 }
 
 /**
- * Get loan offers for a customer
+ * Get loan offers for a customer (streamed by the async route)
  * @param {number} customerId - Customer ID
  * @returns {Promise} List of loan offers
  */
 export async function getCustomerLoanOffers(customerId) {
   try {
-    const response = await apiClient.get(`/customers/${customerId}/loanoffers/`);
+    const response = await apiClient.get(`/async/customers/${customerId}/loanoffers/`);
     return response.data;
   } catch (error) {
     throw new Error(error.response?.data?.detail || 'Failed to fetch loan offers');
@@ -104,8 +147,7 @@ export async function getCustomerLoanOffers(customerId) {
  */
 export async function getLoanOffers() {
   try {
-    const response = await apiClient.get('/loanoffers/');
-    return response.data;
+    return await getAllPages('/loanoffers/');
   } catch (error) {
     throw new Error(error.response?.data?.detail || 'Failed to fetch loan offers');
   }
@@ -125,3 +167,20 @@ export async function createLoanOffer(loanData) {
     throw new Error(errorMessage);
   }
 }
+
+/**
+  Quote a loan offer without saving it (monthly payment + eligibility)
+  @param {Object} loanData - Loan data (customer, loan_amount, interest_rate, term_months)
+  @returns {Promise} Quote object
+ */
+export async function quoteLoanOffer(loanData) {
+  try {
+    const response = await apiClient.post('/async/loanoffers/quote/', loanData);
+    return response.data;
+  } catch (error) {
+    const errorMessage = error.response?.data?.detail ||
+                        Object.values(error.response?.data || {}).flat().join(', ') ||
+                        'Failed to quote loan offer';
+    throw new Error(errorMessage);
+  }
+}